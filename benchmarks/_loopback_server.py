@@ -0,0 +1,18 @@
+# coding: utf-8
+"""
+Loopback-сервер legacy-протокола speedtest.net для бенчмарков: LocalSpeedtestServer
+(core/local_server.py) на 127.0.0.1 со случайным портом.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.local_server import LocalSpeedtestServer  # noqa: E402
+
+
+class LoopbackServer(LocalSpeedtestServer):
+    """Запуск сервера в фоновом потоке на 127.0.0.1 со случайным портом."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        super().__init__(host, port)
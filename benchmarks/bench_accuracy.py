@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Бенчмарк точности движков на имитированных каналах: локальный сервер (core/local_server.py)
+с профилем канала (core/shaping.py) и UDP echo в отдельном процессе, клиенты приложения
+направлены на него настройками `custom_server_url` и `udp_endpoint`.
+
+Для каждого профиля и движка печатается измеренное против заданного: скорость (ошибка к `rate`),
+ping против `delay`, UDP-потери против `loss`, а также время одного теста. Движок ookla
+пропускается: официальный CLI не умеет работать с серверами legacy-протокола.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_accuracy.py --duration 5 --engines python,async --profiles cable-100,dsl-20
+"""
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from core.local_server import LocalSpeedtestServer  # noqa: E402
+from core.settings import _DEFAULTS  # noqa: E402
+from core.shaping import ShapingProfile  # noqa: E402
+from core.udp_probe import UdpEchoServer  # noqa: E402
+from core.worker import create_client  # noqa: E402
+
+PROFILES = {
+    'lan-1g': 'rate=1000',
+    'fiber-300': 'rate=300,delay=5',
+    'cable-100': 'rate=100,delay=15,jitter=3',
+    'dsl-20': 'rate=20,delay=30,jitter=5',
+    'lossy-50': 'rate=50,delay=20,jitter=5,loss=0.5',
+}
+ENGINES = ('python', 'async', 'multiprocess', 'ookla')
+
+
+def _serve(spec: str, duration: int, url_queue, stop_event) -> None:
+    profile = ShapingProfile.parse(spec)
+    with LocalSpeedtestServer('127.0.0.1', 0, test_length=duration, profile=profile) as server:
+        with UdpEchoServer('127.0.0.1', server.httpd.server_address[1], profile) as udp:
+            url_queue.put((server.base_url, udp.endpoint))
+            stop_event.wait()
+
+
+def _error_pct(measured: float, truth: float) -> float | None:
+    return round(100.0 * (measured - truth) / truth, 2) if truth else None
+
+
+def run_engine(engine: str, base_url: str, udp_endpoint: str, duration: int, processes: int) -> dict:
+    client = create_client(engine)
+    client.settings = dict(_DEFAULTS, engine=engine, custom_server_url=base_url, udp_endpoint=udp_endpoint,
+                           async_duration=duration, mp_processes=processes, cache_enabled=False)
+    t0 = time.perf_counter()
+    result = client.perform_test()
+    result['wall_s'] = time.perf_counter() - t0
+    return result
+
+
+def run_profile(name: str, spec: str, engines: list[str], duration: int, processes: int) -> list[dict]:
+    profile = ShapingProfile.parse(spec)
+    rows = []
+    url_queue, stop_event = mp.Queue(), mp.Event()
+    server = mp.Process(target=_serve, args=(spec, duration, url_queue, stop_event), daemon=True)
+    server.start()
+    try:
+        base_url, udp_endpoint = url_queue.get(timeout=30)
+        for engine in engines:
+            row = {'profile': name, 'spec': profile.describe(), 'engine': engine, 'truth_mbps': profile.rate or None}
+            if engine == 'ookla':
+                row['skipped'] = 'speedtest CLI не работает с серверами legacy-протокола'
+                rows.append(row)
+                continue
+            try:
+                result = run_engine(engine, base_url, udp_endpoint, duration, processes)
+            except Exception as e:
+                row['error'] = str(e)
+                rows.append(row)
+                continue
+            down, up = result['download_bps'] / 1e6, result['upload_bps'] / 1e6
+            row.update({
+                'download_mbps': round(down, 2),
+                'upload_mbps': round(up, 2),
+                'download_error_pct': _error_pct(down, profile.rate),
+                'upload_error_pct': _error_pct(up, profile.rate),
+                'ping_ms': round(result['ping_ms'], 2),
+                'delay_ms': profile.delay,
+                'jitter_ms': result.get('jitter_ms'),
+                'packet_loss_pct': result.get('packet_loss_pct'),
+                'loss_pct': profile.loss,
+                'wall_s': round(result['wall_s'], 2),
+            })
+            rows.append(row)
+    finally:
+        stop_event.set()
+        server.join(timeout=10)
+    return rows
+
+
+def _fmt(value, spec: str) -> str:
+    return '—' if value is None else format(value, spec)
+
+
+def print_table(rows: list[dict]) -> None:
+    print(f"{'Профиль':<11}{'Движок':<14}{'rate':>7}{'Down':>9}{'ош.%':>8}{'Up':>9}{'ош.%':>8}"
+          f"{'ping/delay':>13}{'loss UDP':>14}{'Время, с':>10}")
+    for row in rows:
+        head = f"{row['profile']:<11}{row['engine']:<14}{_fmt(row['truth_mbps'], '.0f'):>7}"
+        if 'skipped' in row or 'error' in row:
+            print(f"{head}  {'пропущен' if 'skipped' in row else 'ошибка'}: {row.get('skipped') or row.get('error')}")
+            continue
+        ping = f"{row['ping_ms']:.1f}/{row['delay_ms']:g}"
+        loss = f"{_fmt(row['packet_loss_pct'], '.2f')}/{row['loss_pct']:g}"
+        print(f"{head}{row['download_mbps']:>9.1f}{_fmt(row['download_error_pct'], '+.1f'):>8}"
+              f"{row['upload_mbps']:>9.1f}{_fmt(row['upload_error_pct'], '+.1f'):>8}"
+              f"{ping:>13}{loss:>14}{row['wall_s']:>10.1f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Точность движков на имитированных каналах')
+    parser.add_argument('--duration', type=int, default=10, help='Длительность каждой фазы, сек')
+    parser.add_argument('--engines', default=','.join(ENGINES), help='Движки через запятую')
+    parser.add_argument('--profiles', default=','.join(PROFILES),
+                        help='Профили через запятую (имена из PROFILES) или через «;» строки вида rate=100,delay=20')
+    parser.add_argument('--processes', type=int, default=0, help='Процессов движка multiprocess (0 — по числу ядер)')
+    parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    engines = [e.strip() for e in args.engines.split(',') if e.strip()]
+    unknown = [e for e in engines if e not in ENGINES]
+    if unknown:
+        parser.error(f'Неизвестные движки: {", ".join(unknown)}')
+    profiles = []
+    for item in args.profiles.split(';' if '=' in args.profiles else ','):
+        item = item.strip()
+        if item:
+            try:
+                profiles.append((item, ShapingProfile.parse(PROFILES.get(item, item)).describe()))
+            except ValueError as e:
+                parser.error(str(e))
+
+    if not args.json:
+        print('=' * 60)
+        print('🚀 Точность движков на имитированных каналах')
+        print('=' * 60)
+    rows = []
+    for name, spec in profiles:
+        rows.extend(run_profile(name if name in PROFILES else 'custom', spec, engines, args.duration,
+                                args.processes))
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    else:
+        print_table(rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Микробенчмарк приёмного пути download: байты на секунду CPU клиента для
+speedtest.HTTPDownloader (read(10240) в новые bytes) и SinkDownloader (readinto в буферы пула).
+
+Loopback-сервер работает в отдельном процессе, поэтому time.process_time() учитывает
+только CPU клиента.
+
+Запуск из корня репозитория:
+    python benchmarks/download_sink.py --duration 10
+"""
+import argparse
+import multiprocessing as mp
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from _loopback_server import LoopbackServer  # noqa: E402
+from loopback_engines import _OfflineSpeedtest  # noqa: E402
+from core.speedtest_client import _NextGenSpeedtest  # noqa: E402
+
+VARIANTS = ('speedtest-cli', 'readinto')
+
+
+class _OfflineNextGen(_OfflineSpeedtest, _NextGenSpeedtest):
+    # Конфигурация _OfflineSpeedtest, download — из _NextGenSpeedtest
+    pass
+
+
+def _serve(url_queue, stop_event) -> None:
+    with LoopbackServer() as server:
+        url_queue.put(server.upload_url)
+        stop_event.wait()
+
+
+def run_variant(variant: str, url: str, duration: int) -> tuple[float, float, float]:
+    st = _OfflineNextGen(duration, sink=(variant == 'readinto'))
+    st._best = {'url': url}
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    d_bps = st.download()
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - t0
+    return d_bps, st.results.bytes_received / max(cpu, 1e-9), cpu / wall
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Микробенчмарк приёмного пути download')
+    parser.add_argument('--duration', type=int, default=10, help='Длительность download-фазы, сек')
+    args = parser.parse_args()
+
+    url_queue, stop_event = mp.Queue(), mp.Event()
+    server = mp.Process(target=_serve, args=(url_queue, stop_event), daemon=True)
+    server.start()
+    try:
+        url = url_queue.get(timeout=10)
+        print('=' * 60)
+        print('🚀 Приёмный путь download: read(10240) против readinto')
+        print('=' * 60)
+        print(f"{'Вариант':<16}{'Мбит/с':>10}{'МБ на CPU-сек':>16}{'Загрузка CPU':>14}")
+        for variant in VARIANTS:
+            d_bps, per_cpu, load = run_variant(variant, url, args.duration)
+            print(f'{variant:<16}{d_bps / 1e6:>10.0f}{per_cpu / 1e6:>16.0f}{load:>14.2f}')
+    finally:
+        stop_event.set()
+        server.join(timeout=5)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
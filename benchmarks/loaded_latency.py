@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Loopback-бенчмарк замера задержки под нагрузкой: скорость asyncio-движка без LatencyMonitor
+и с ним, а также распределения задержки по фазам. Разница скоростей показывает цену замера.
+
+Запуск из корня репозитория:
+    python benchmarks/loaded_latency.py --duration 10 --streams 8 --interval 200
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from _loopback_server import LoopbackServer  # noqa: E402
+from core.async_engine import AsyncTransferEngine  # noqa: E402
+from core.loaded_latency import LatencyMonitor  # noqa: E402
+
+
+def run(url: str, duration: int, streams: int, monitor: LatencyMonitor | None) -> tuple[float, float]:
+    engine = AsyncTransferEngine(url, streams=streams, duration=duration)
+    rates = []
+    for phase in ('download', 'upload'):
+        if monitor is not None:
+            monitor.set_phase(phase)
+        rates.append(asyncio.run(engine.download() if phase == 'download' else engine.upload()))
+        if monitor is not None:
+            monitor.set_phase(None)
+    return rates[0], rates[1]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Loopback-бенчмарк задержки под нагрузкой')
+    parser.add_argument('--duration', type=int, default=10, help='Длительность каждой фазы, сек')
+    parser.add_argument('--streams', type=int, default=8, help='Количество потоков asyncio-движка')
+    parser.add_argument('--interval', type=int, default=200, help='Период замеров задержки, мс')
+    args = parser.parse_args()
+
+    print('=' * 60)
+    print('🚀 Задержка под нагрузкой: цена замера')
+    print('=' * 60)
+    with LoopbackServer() as server:
+        base = run(server.upload_url, args.duration, args.streams, None)
+        with LatencyMonitor({'url': server.upload_url}, interval_ms=args.interval) as monitor:
+            monitor.measure_idle()
+            probed = run(server.upload_url, args.duration, args.streams, monitor)
+
+    print(f"{'Вариант':<18}{'Download, Mbps':>16}{'Upload, Mbps':>16}")
+    for name, (d_bps, u_bps) in (('без замера', base), ('с замером', probed)):
+        print(f'{name:<18}{d_bps / 1e6:>16.1f}{u_bps / 1e6:>16.1f}')
+    print(json.dumps(monitor.to_result(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Loopback-бенчмарк движков измерения: speedtest-cli (Speedtest.download/upload), asyncio-движок
+(AsyncTransferEngine) и он же, разложенный по процессам (MultiProcessTransferEngine), на одном и том же
+локальном сервере.
+
+Запуск из корня репозитория:
+    python benchmarks/loopback_engines.py --duration 10 --streams 8 --processes 0
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import speedtest  # noqa: E402
+
+from _loopback_server import LoopbackServer  # noqa: E402
+from core.async_engine import AsyncTransferEngine  # noqa: E402
+from core.mp_engine import MultiProcessTransferEngine, default_processes  # noqa: E402
+from core.sampling import ThroughputSampler  # noqa: E402
+
+
+class _OfflineSpeedtest(speedtest.Speedtest):
+    # Speedtest без обращения к speedtest.net: конфигурация как у типичного ответа speedtest-config.php
+
+    def __init__(self, duration: int, **kwargs):
+        self._bench_duration = duration
+        super().__init__(**kwargs)
+
+    def get_config(self):
+        up_sizes = [524288, 1048576, 7340032]
+        self.config.update({
+            'client': {'ip': '127.0.0.1', 'isp': 'loopback', 'lat': '0', 'lon': '0', 'country': ''},
+            'ignore_servers': [],
+            'sizes': {
+                'upload': up_sizes,
+                'download': [350, 500, 750, 1000, 1500, 2000, 2500, 3000, 3500, 4000],
+            },
+            'counts': {'upload': 17, 'download': 4},
+            'threads': {'upload': 2, 'download': 8},
+            'length': {'upload': self._bench_duration, 'download': self._bench_duration},
+            'upload_max': 17 * len(up_sizes),
+        })
+        self.lat_lon = (0.0, 0.0)
+        return self.config
+
+
+def bench_speedtest_cli(url: str, duration: int) -> tuple[float, float, float]:
+    st = _OfflineSpeedtest(duration)
+    st._best = {'url': url, 'id': 0, 'sponsor': 'loopback', 'name': 'loopback', 'country': '', 'host': ''}
+    t0 = time.perf_counter()
+    d_bps = st.download()
+    u_bps = st.upload()
+    return d_bps, u_bps, time.perf_counter() - t0
+
+
+def bench_async(url: str, duration: int, streams: int) -> tuple[float, float, float]:
+    engine = AsyncTransferEngine(url, streams=streams, duration=duration)
+    t0 = time.perf_counter()
+    d_bps = asyncio.run(engine.download())
+    u_bps = asyncio.run(engine.upload())
+    return d_bps, u_bps, time.perf_counter() - t0
+
+
+def bench_multiprocess(url: str, duration: int, streams: int, processes: int) -> tuple[float, float, float]:
+    sampler = ThroughputSampler()
+    engine = MultiProcessTransferEngine(url, processes=processes, streams=streams, duration=duration,
+                                        sampler=sampler)
+    t0 = time.perf_counter()
+    d_bps = engine.run_phase('download')
+    u_bps = engine.run_phase('upload')
+    return d_bps, u_bps, time.perf_counter() - t0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Loopback-бенчмарк движков измерения скорости')
+    parser.add_argument('--duration', type=int, default=10, help='Длительность каждой фазы, сек')
+    parser.add_argument('--streams', type=int, default=8, help='Количество потоков asyncio-движка')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='Количество процессов multiprocess-движка (0 — по числу ядер)')
+    args = parser.parse_args()
+
+    print('=' * 60)
+    print('🚀 Loopback-бенчмарк движков')
+    print('=' * 60)
+    rows = []
+    with LoopbackServer() as server:
+        print(f'Сервер: {server.upload_url}')
+        rows.append(('speedtest-cli',) + bench_speedtest_cli(server.upload_url, args.duration))
+        rows.append((f'asyncio x{args.streams}',) + bench_async(server.upload_url, args.duration, args.streams))
+        processes = args.processes or default_processes()
+        rows.append((f'mp {processes}x{args.streams}',)
+                    + bench_multiprocess(server.upload_url, args.duration, args.streams, processes))
+
+    print(f"{'Движок':<18}{'Download, Mbps':>16}{'Upload, Mbps':>16}{'Время, с':>10}")
+    for name, d_bps, u_bps, wall in rows:
+        print(f'{name:<18}{d_bps / 1e6:>16.1f}{u_bps / 1e6:>16.1f}{wall:>10.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
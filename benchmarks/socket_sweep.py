@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Перебор профилей опций сокетов (core/socket_profile.py) на локальном сервере: asyncio-движок
+(AsyncTransferEngine) с разными SO_RCVBUF/SO_SNDBUF и алгоритмами TCP_CONGESTION, доступными
+на этом хосте. Сервер работает в отдельном процессе; с `--shape` он имитирует канал
+(core/shaping.py) — на loopback без задержки размер буфера почти ни на что не влияет,
+а на длинном толстом канале (например rate=1000,delay=20) ограничивает окно.
+
+В конце печатается самый быстрый профиль (по сумме download + upload) в виде настроек
+для settings.json.
+
+Запуск из корня репозитория:
+    python benchmarks/socket_sweep.py --duration 5 --buffers 0,262144,4194304 --shape rate=1000,delay=20
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from core.async_engine import AsyncTransferEngine  # noqa: E402
+from core.local_server import LocalSpeedtestServer  # noqa: E402
+from core.shaping import ShapingProfile  # noqa: E402
+from core.socket_profile import SocketProfile, available_congestion  # noqa: E402
+
+DEFAULT_BUFFERS = (0, 262144, 1048576, 4194304, 16777216)
+
+
+def _serve(spec: str, duration: int, url_queue, stop_event) -> None:
+    profile = ShapingProfile.parse(spec) if spec else None
+    with LocalSpeedtestServer('127.0.0.1', 0, test_length=duration, profile=profile) as server:
+        url_queue.put(server.upload_url)
+        stop_event.wait()
+
+
+def bench_profile(url: str, profile: SocketProfile, duration: int, streams: int) -> tuple[float, float, float]:
+    engine = AsyncTransferEngine(url, streams=streams, duration=duration,
+                                 socket_profile=None if profile.is_default else profile)
+    t0 = time.perf_counter()
+    d_bps = asyncio.run(engine.download())
+    u_bps = asyncio.run(engine.upload())
+    return d_bps, u_bps, time.perf_counter() - t0
+
+
+def _buffer_label(size: int) -> str:
+    return 'авто' if not size else f'{size // 1024} КиБ'
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Перебор опций сокетов передачи на локальном сервере')
+    parser.add_argument('--duration', type=int, default=5, help='Длительность каждой фазы, сек')
+    parser.add_argument('--streams', type=int, default=8, help='Количество потоков asyncio-движка')
+    parser.add_argument('--buffers', default=','.join(str(b) for b in DEFAULT_BUFFERS),
+                        help='Размеры SO_RCVBUF/SO_SNDBUF через запятую, байт (0 — автоподстройка ядра)')
+    parser.add_argument('--congestion', default='',
+                        help='Алгоритмы TCP_CONGESTION через запятую (по умолчанию — все доступные)')
+    parser.add_argument('--shape', default='', help='Профиль канала сервера, например rate=1000,delay=20')
+    args = parser.parse_args()
+
+    try:
+        buffers = [int(b) for b in args.buffers.split(',') if b.strip()]
+        shape = ShapingProfile.parse(args.shape) if args.shape else None
+    except ValueError as e:
+        parser.error(str(e))
+    congestion = [c.strip() for c in args.congestion.split(',') if c.strip()] or available_congestion() or ['']
+
+    print('=' * 60)
+    print('🚀 Перебор опций сокетов')
+    print('=' * 60)
+    print(f"Канал: {shape.describe() if shape else 'loopback без ограничений'}; "
+          f"алгоритмы: {', '.join(c or 'системный' for c in congestion)}")
+
+    url_queue, stop_event = mp.Queue(), mp.Event()
+    server = mp.Process(target=_serve, args=(args.shape, args.duration, url_queue, stop_event), daemon=True)
+    server.start()
+    rows = []
+    try:
+        url = url_queue.get(timeout=30)
+        for algo in congestion:
+            for size in buffers:
+                profile = SocketProfile(rcvbuf=size, sndbuf=size, congestion=algo)
+                try:
+                    rows.append((profile,) + bench_profile(url, profile, args.duration, args.streams))
+                except OSError as e:
+                    print(f'{algo or "системный"} / {_buffer_label(size)}: ошибка {e}')
+    finally:
+        stop_event.set()
+        server.join(timeout=10)
+
+    if not rows:
+        return 1
+    print(f"{'Алгоритм':<12}{'Буфер':>12}{'Download, Mbps':>16}{'Upload, Mbps':>16}{'Время, с':>10}")
+    for profile, d_bps, u_bps, wall in rows:
+        print(f"{profile.congestion or 'системный':<12}{_buffer_label(profile.rcvbuf):>12}"
+              f'{d_bps / 1e6:>16.1f}{u_bps / 1e6:>16.1f}{wall:>10.1f}')
+
+    best = max(rows, key=lambda row: row[1] + row[2])[0]
+    print(f'\nЛучший профиль: {best.describe()}')
+    print(json.dumps({
+        'socket_rcvbuf': best.rcvbuf,
+        'socket_sndbuf': best.sndbuf,
+        'tcp_congestion': best.congestion,
+    }, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
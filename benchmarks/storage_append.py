@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Задержка append_result (core/storage.py) и агрегатов истории при 1 тыс., 100 тыс. и 1 млн записей.
+
+Для каждого размера создаётся заполненный до лимита файл истории во временном каталоге
+(`max_history_records` = размер, поэтому каждая новая запись отрезает самую старую),
+после чего замеряются:
+
+- `head` — текущая схема: дописать строку и её смещение в results.idx, сдвинуть голову в results.meta.json;
+- `rewrite` — прежняя схема: разобрать весь файл и переписать его после каждой записи
+  (на больших размерах — меньше повторов, см. --legacy-appends);
+- `compact` — однократное сжатие файла после серии записей;
+- `meta` — однократная пересборка results.meta.json и results.idx по файлу без них;
+- `cols` — однократная пересборка колоночного кэша results.cols по файлу (до записей,
+  чтобы не попасть в замер `head`);
+- `stats` — history_stats() по колоночному кэшу (count, mean, min, max, p50/p90/p99 пинга и скоростей).
+
+Все файлы истории, индекса и кэша создаются во временном каталоге.
+
+Запуск из корня репозитория:
+    python benchmarks/storage_append.py --sizes 1000,100000,1000000 --appends 200
+"""
+import argparse
+import json
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from core import storage  # noqa: E402
+from core.history_columns import np  # noqa: E402
+
+# Запись без поинтервальных отсчётов — порядка 400 байт
+RECORD = {
+    'timestamp': '2025-09-21T19:06:28',
+    'ping_ms': 11.0,
+    'download_bps': 72800000.0,
+    'upload_bps': 73600000.0,
+    'jitter_ms': 1.2,
+    'packet_loss_pct': 0.0,
+    'server': {'id': 62489, 'sponsor': 'SKY-NET', 'name': 'Odesa', 'country': 'Ukraine',
+               'host': 'speedtest.sky-net.od.ua:8080'},
+    'engine': 'async',
+    'streams': 8,
+    'throughput_stats': {'download': {'peak_bps': 104857600.0, 'mean_bps': 72800000.0, 'cv': 0.125}},
+}
+
+
+def _legacy_append(result: dict, max_records: int) -> None:
+    # Прежний append_result: дописать строку, затем разобрать весь файл и переписать последние max_records
+    with open(storage.RESULTS_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result, ensure_ascii=False) + '\n')
+    with open(storage.RESULTS_FILE, 'r', encoding='utf-8') as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    if len(items) > max_records:
+        items = items[-max_records:]
+        with open(storage.RESULTS_FILE, 'w', encoding='utf-8') as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+
+def _fill(size: int) -> None:
+    # Пинг и скорости случайные: на одинаковых значениях сортировка для перцентилей вырождена
+    rnd = random.Random(size)
+    template = json.dumps(dict(RECORD, ping_ms=-1.0, download_bps=-2.0, upload_bps=-3.0), ensure_ascii=False)
+    template = template.replace('-1.0', '%.3f').replace('-2.0', '%.0f').replace('-3.0', '%.0f') + '\n'
+    with open(storage.RESULTS_FILE, 'wb') as f:
+        for start in range(0, size, 10000):
+            lines = [template % (rnd.uniform(5, 50), rnd.uniform(1e7, 1e9), rnd.uniform(1e7, 1e9))
+                     for _ in range(min(10000, size - start))]
+            f.write(''.join(lines).encode('utf-8'))
+    storage.META_FILE.unlink(missing_ok=True)
+    storage.INDEX_FILE.unlink(missing_ok=True)
+    shutil.rmtree(storage.COLUMNS_DIR, ignore_errors=True)
+
+
+def _timed(fn, repeat: int) -> list:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return times
+
+
+def _fmt(times: list) -> str:
+    if not times:
+        return '—'
+    p99 = sorted(times)[max(0, int(len(times) * 0.99) - 1)]
+    return f'{statistics.median(times):.3f} / {p99:.3f}'
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Задержка записи в историю при разном размере файла')
+    parser.add_argument('--sizes', default='1000,100000,1000000', help='Размеры истории через запятую')
+    parser.add_argument('--appends', type=int, default=200, help='Записей на размер (схема head)')
+    parser.add_argument('--legacy-appends', type=int, default=3,
+                        help='Записей на размер для прежней схемы (0 — не замерять)')
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help='Прежняя схема замеряется только до этого размера')
+    parser.add_argument('--stats-repeat', type=int, default=5, help='Повторов history_stats() на размер')
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    print('=' * 60)
+    print('🚀 Запись в историю: сдвиг головы против перезаписи файла')
+    print('=' * 60)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.RESULTS_FILE = Path(tmp) / 'results.jsonl'
+        storage.META_FILE = Path(tmp) / 'results.meta.json'
+        storage.INDEX_FILE = Path(tmp) / 'results.idx'
+        storage.COLUMNS_DIR = Path(tmp) / 'results.cols'
+        for size in sizes:
+            storage.get_settings = lambda size=size: {'max_history_records': size}
+            _fill(size)
+            t0 = time.perf_counter()
+            storage.load_results_page(0, 1)  # первое обращение к файлу без meta и индекса пересобирает их
+            scan_ms = (time.perf_counter() - t0) * 1000.0
+            t0 = time.perf_counter()
+            with storage.metric_columns():  # пересборка колоночного кэша по файлу
+                pass
+            cols_ms = (time.perf_counter() - t0) * 1000.0
+            head = _timed(lambda: storage.append_result(RECORD), args.appends)
+            stats = _timed(storage.history_stats, args.stats_repeat)
+            assert storage.history_stats()['ping_ms']['count'] == size
+            assert storage.get_total_records_count() == size
+            t0 = time.perf_counter()
+            storage.compact_results(force=True)
+            compact_ms = (time.perf_counter() - t0) * 1000.0
+            legacy = []
+            if args.legacy_appends and size <= args.legacy_max:
+                _fill(size)
+                legacy = _timed(lambda: _legacy_append(RECORD, size), args.legacy_appends)
+            rows.append((size, storage.RESULTS_FILE.stat().st_size, scan_ms, head, legacy, compact_ms,
+                         cols_ms, stats))
+
+    print(f"{'Записей':>10}{'Файл, МБ':>10}{'head p50/p99, мс':>20}{'rewrite p50/p99, мс':>22}"
+          f"{'compact, мс':>13}{'meta, мс':>10}{'cols, мс':>10}{'stats p50/p99, мс':>20}")
+    for size, nbytes, scan_ms, head, legacy, compact_ms, cols_ms, stats in rows:
+        print(f'{size:>10}{nbytes / 1e6:>10.1f}{_fmt(head):>20}{_fmt(legacy):>22}{compact_ms:>13.1f}'
+              f'{scan_ms:>10.1f}{cols_ms:>10.1f}{_fmt(stats):>20}')
+    if np is None:
+        print('⚠️ NumPy не установлена: history_stats() считает агрегаты без неё (pip install -r requirements.txt)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
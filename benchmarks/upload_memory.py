@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Loopback-бенчмарк памяти upload-фазы: Speedtest.upload (строки HTTPUploaderData, созданные
+заранее) против upload с ZeroCopyUploadData (срезы одного общего буфера).
+
+Каждый вариант запускается в отдельном процессе, чтобы пики RSS не влияли друг на друга.
+
+Запуск из корня репозитория:
+    python benchmarks/upload_memory.py --duration 10
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from _loopback_server import LoopbackServer  # noqa: E402
+from loopback_engines import _OfflineSpeedtest  # noqa: E402
+from core.memory_monitor import PeakMemoryTracker  # noqa: E402
+from core.speedtest_client import _NextGenSpeedtest  # noqa: E402
+
+VARIANTS = ('speedtest-cli', 'zero-copy')
+
+
+class _OfflineNextGen(_OfflineSpeedtest, _NextGenSpeedtest):
+    # Конфигурация _OfflineSpeedtest, upload — из _NextGenSpeedtest
+    pass
+
+
+def run_variant(variant: str, url: str, duration: int) -> dict:
+    st = _OfflineNextGen(duration, zero_copy=(variant == 'zero-copy'))
+    st._best = {'url': url}
+    with PeakMemoryTracker(period_ms=5) as mem:
+        t0 = time.perf_counter()
+        u_bps = st.upload()
+        elapsed = time.perf_counter() - t0
+    return dict(mem.to_result(), upload_bps=u_bps, bytes_sent=st.results.bytes_sent, elapsed=elapsed)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Loopback-бенчмарк памяти upload-фазы')
+    parser.add_argument('--duration', type=int, default=10, help='Длительность upload-фазы, сек')
+    parser.add_argument('--variant', choices=VARIANTS, help='Выполнить один вариант (внутренний режим)')
+    parser.add_argument('--url', help='URL upload.php для внутреннего режима')
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.url, args.duration)))
+        return 0
+
+    print('=' * 60)
+    print('🚀 Память upload-фазы: speedtest-cli против zero-copy')
+    print('=' * 60)
+    rows = []
+    with LoopbackServer() as server:
+        for variant in VARIANTS:
+            out = subprocess.run(
+                [sys.executable, __file__, '--variant', variant, '--url', server.upload_url,
+                 '--duration', str(args.duration)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            rows.append((variant, json.loads(out.strip().splitlines()[-1])))
+
+    print(f"{'Вариант':<16}{'Upload, Мбит/с':>16}{'Пик RSS, МБ':>14}{'Прирост, МБ':>14}")
+    for variant, r in rows:
+        print(f"{variant:<16}{r['upload_bps'] / 1e6:>16.0f}"
+              f"{r.get('peak_rss', 0) / 2**20:>14.1f}{r.get('peak_delta', 0) / 2**20:>14.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+# coding: utf-8
+"""
+Адаптивная длительность фаз download/upload.
+
+PhaseController получает поинтервальные отсчёты фазы (см. core/sampling.py) и решает, когда
+её остановить: скорость стабилизировалась в пределах допуска, исчерпан бюджет времени или
+бюджет байт. Итоговая скорость считается без разгона TCP slow-start.
+"""
+from typing import List, Optional
+
+# Причины остановки фазы
+STOP_STABLE = 'stable'
+STOP_TIME_BUDGET = 'time_budget'
+STOP_BYTE_BUDGET = 'byte_budget'
+STOP_COMPLETED = 'completed'      # движок сам завершил фазу раньше любого критерия
+STOP_CANCELED = 'canceled'
+
+DEFAULT_TOLERANCE = 0.05
+DEFAULT_MIN_SECONDS = 3.0
+DEFAULT_MAX_SECONDS = 15.0
+# Окно проверки стабильности и число подокон, средние которых сравниваются
+STABLE_WINDOW_MS = 2000
+STABLE_SUBWINDOWS = 4
+
+
+class PhaseController:
+    """Контроллер одной фазы: копит отсчёты и сообщает причину остановки.
+
+    Args:
+        interval_ms: Шаг отсчётов
+        tolerance: Допустимый относительный разброс скорости в окне стабильности
+        min_seconds: Минимальная длительность фазы до проверки стабильности
+        max_seconds: Бюджет времени фазы (0 — без своего бюджета: фаза идёт обычную длительность движка)
+        max_bytes: Бюджет байт фазы (0 — без ограничения)
+    """
+
+    def __init__(self, interval_ms: int, tolerance: float = DEFAULT_TOLERANCE,
+                 min_seconds: float = DEFAULT_MIN_SECONDS, max_seconds: float = DEFAULT_MAX_SECONDS,
+                 max_bytes: int = 0):
+        self.interval_ms = max(1, int(interval_ms))
+        self.tolerance = max(0.001, float(tolerance))
+        self.min_ms = int(float(min_seconds) * 1000)
+        self.max_ms = max(0, int(float(max_seconds) * 1000))
+        self.max_bytes = max(0, int(max_bytes))
+        self.stop_reason: Optional[str] = None
+        self._bytes: List[int] = []
+        self._total = 0
+        # неполный последний интервал фазы, мс: его байты не входят в поинтервальную скорость
+        self._partial_ms = 0
+
+    @property
+    def elapsed_ms(self) -> int:
+        return len(self._bytes) * self.interval_ms
+
+    @property
+    def bytes_used(self) -> int:
+        return self._total
+
+    def feed(self, nbytes: int, duration_ms: Optional[float] = None) -> Optional[str]:
+        """Учесть отсчёт фазы.
+
+        Args:
+            nbytes: Байты за интервал
+            duration_ms: Длительность отсчёта, если он короче interval_ms (конец фазы)
+
+        Returns:
+            Причину остановки, если фазу пора завершать (только при первом срабатывании), иначе None
+        """
+        if self.stop_reason is not None:
+            return None
+        # полуинтервал запаса на погрешность interval_s * 1000 у полных отсчётов
+        if duration_ms is not None and duration_ms < self.interval_ms - 0.5:
+            self._total += nbytes
+            self._partial_ms += int(duration_ms)
+            return None
+        self._bytes.append(nbytes)
+        self._total += nbytes
+        if self.max_bytes and self._total >= self.max_bytes:
+            self.stop_reason = STOP_BYTE_BUDGET
+        elif self.max_ms and self.elapsed_ms >= self.max_ms:
+            self.stop_reason = STOP_TIME_BUDGET
+        elif self.elapsed_ms >= self.min_ms and self._is_stable():
+            self.stop_reason = STOP_STABLE
+        return self.stop_reason
+
+    def finish(self, reason: str = STOP_COMPLETED) -> None:
+        """Отметить завершение фазы по внешней причине (если критерий ещё не сработал)."""
+        if self.stop_reason is None:
+            self.stop_reason = reason
+
+    def _is_stable(self) -> bool:
+        per_sub = max(1, STABLE_WINDOW_MS // self.interval_ms // STABLE_SUBWINDOWS)
+        need = per_sub * STABLE_SUBWINDOWS
+        if len(self._bytes) < need:
+            return False
+        window = self._bytes[-need:]
+        means = [sum(window[i * per_sub:(i + 1) * per_sub]) / per_sub for i in range(STABLE_SUBWINDOWS)]
+        mean = sum(means) / len(means)
+        if mean <= 0:
+            return False
+        return (max(means) - min(means)) / mean <= self.tolerance
+
+    def _steady_level(self) -> float:
+        # Средние байты за интервал в «установившемся» режиме: окно стабильности или вторая половина фазы
+        per_window = max(1, STABLE_WINDOW_MS // self.interval_ms)
+        tail = self._bytes[-per_window:] if self.stop_reason == STOP_STABLE else self._bytes[len(self._bytes) // 2:]
+        return (sum(tail) / len(tail)) if tail else 0.0
+
+    def warmup_samples(self) -> int:
+        """Число отсчётов разгона: до первого момента, когда скользящее среднее достигло установившегося уровня."""
+        steady = self._steady_level()
+        if steady <= 0:
+            return 0
+        per_sub = max(1, STABLE_WINDOW_MS // self.interval_ms // STABLE_SUBWINDOWS)
+        threshold = steady * (1.0 - self.tolerance)
+        acc = 0
+        for i, b in enumerate(self._bytes):
+            acc += b
+            if i >= per_sub:
+                acc -= self._bytes[i - per_sub]
+            if i + 1 >= per_sub and acc / per_sub >= threshold:
+                return max(0, i + 1 - per_sub)
+        return 0
+
+    def summary(self) -> dict:
+        """Итог фазы для поля `adaptive` результата."""
+        warmup = self.warmup_samples()
+        measured = self._bytes[warmup:]
+        measured_ms = len(measured) * self.interval_ms
+        measured_bps = (sum(measured) * 8.0 / (measured_ms / 1000.0)) if measured_ms > 0 else 0.0
+        return {
+            'stop_reason': self.stop_reason or STOP_COMPLETED,
+            'bytes_used': self._total,
+            'duration_ms': self.elapsed_ms + self._partial_ms,
+            'warmup_ms': warmup * self.interval_ms,
+            'measured_bps': measured_bps,
+        }
+
+
+def phase_duration(ctl: Optional[PhaseController], default: float) -> float:
+    """Длительность фазы для движка: бюджет времени контроллера, а без него — обычная default.
+
+    Нулевой бюджет (`adaptive_max_seconds: 0`) не подменяет длительность движка, иначе фаза
+    обрывалась бы сразу.
+    """
+    return ctl.max_ms / 1000.0 if ctl is not None and ctl.max_ms > 0 else default
+
+
+def controller_from_settings(settings, interval_ms: int) -> Optional[PhaseController]:
+    """Создать контроллер фазы по настройкам или None, если адаптивный режим выключен."""
+    if not bool(settings.get('adaptive_mode', False)):
+        return None
+    max_mb = float(settings.get('adaptive_max_mb', 0) or 0)
+    return PhaseController(
+        interval_ms,
+        tolerance=float(settings.get('adaptive_tolerance', DEFAULT_TOLERANCE) or DEFAULT_TOLERANCE),
+        min_seconds=float(settings.get('adaptive_min_seconds', DEFAULT_MIN_SECONDS) or DEFAULT_MIN_SECONDS),
+        max_seconds=float(settings.get('adaptive_max_seconds', DEFAULT_MAX_SECONDS) or 0),
+        max_bytes=int(max_mb * 1024 * 1024),
+    )
+
+
+class AdaptiveHook:
+    """Колбэк отсчётов ThroughputSampler, управляющий адаптивной длительностью фаз.
+
+    Пробрасывает отсчёты дальше (on_sample) и вызывает on_stop, когда контроллер текущей
+    фазы решил её завершить. При выключенном адаптивном режиме только пробрасывает отсчёты.
+
+    Args:
+        settings: Менеджер настроек
+        interval_ms: Шаг отсчётов
+        on_sample: Следующий колбэк отсчётов (живые обновления UI)
+        on_stop: Вызывается из потока отсчётов при срабатывании критерия остановки
+    """
+
+    def __init__(self, settings, interval_ms: int, on_sample=None, on_stop=None):
+        self.enabled = bool(settings.get('adaptive_mode', False))
+        self._settings = settings
+        self._interval_ms = interval_ms
+        self._on_sample = on_sample
+        self._on_stop = on_stop
+        self.controllers: dict = {}
+
+    def begin(self, phase: str) -> Optional[PhaseController]:
+        """Создать контроллер для новой фазы (None в неадаптивном режиме)."""
+        ctl = controller_from_settings(self._settings, self._interval_ms) if self.enabled else None
+        if ctl is not None:
+            self.controllers[phase] = ctl
+        return ctl
+
+    def __call__(self, phase: str, t_ms: int, nbytes: int, interval_s: float) -> None:
+        if self._on_sample is not None:
+            self._on_sample(phase, t_ms, nbytes, interval_s)
+        ctl = self.controllers.get(phase)
+        if ctl is not None and ctl.feed(nbytes, interval_s * 1000.0) and self._on_stop is not None:
+            self._on_stop(phase, ctl.stop_reason)
+
+    def summary(self) -> dict:
+        """Поле `adaptive` результата: итог по фазам и суммарно израсходованные байты."""
+        phases = {phase: ctl.summary() for phase, ctl in self.controllers.items()}
+        return {
+            'tolerance': float(self._settings.get('adaptive_tolerance', DEFAULT_TOLERANCE) or DEFAULT_TOLERANCE),
+            'phases': phases,
+            'bytes_used': sum(p['bytes_used'] for p in phases.values()),
+        }
@@ -0,0 +1,693 @@
+# coding: utf-8
+"""
+Нативный asyncio-движок измерения скорости.
+
+Выбор сервера и ping берутся из speedtest-cli (через SpeedtestClient), а сама передача
+данных идёт по N параллельным keep-alive соединениям HTTP/1.1 к тем же legacy-эндпоинтам
+(`random{N}x{N}.jpg` и `upload.php`). Приём тела ответа выполняется через
+`asyncio.BufferedProtocol` в переиспользуемый буфер — байты только подсчитываются.
+При `autotune_mode` число потоков и размер запросов подбираются по ходу фазы (core/autotune.py).
+"""
+import asyncio
+import logging
+import os
+import socket
+import ssl
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+try:
+    from .speedtest_client import SpeedtestClient
+    from .sampling import ThroughputSampler, summarize_samples
+    from .adaptive import AdaptiveHook, phase_duration
+    from .http_session import get_session
+    from .payload import shared_upload_payload
+    from .memory_monitor import PeakMemoryTracker
+    from .loaded_latency import LatencyMonitor
+    from .autotune import StreamTuner, autotune_settings
+    from .socket_profile import SocketProfile
+    from .bidirectional import bidirectional_enabled, merge_samples, summarize as summarize_bidirectional
+    from .bidirectional import describe as describe_bidirectional
+    from .multi_server import split_streams, summarize as summarize_multi_server
+    from .multi_server import describe as describe_multi_server
+except ImportError:
+    from core.speedtest_client import SpeedtestClient  # type: ignore
+    from core.sampling import ThroughputSampler, summarize_samples  # type: ignore
+    from core.adaptive import AdaptiveHook, phase_duration  # type: ignore
+    from core.http_session import get_session  # type: ignore
+    from core.payload import shared_upload_payload  # type: ignore
+    from core.memory_monitor import PeakMemoryTracker  # type: ignore
+    from core.loaded_latency import LatencyMonitor  # type: ignore
+    from core.autotune import StreamTuner, autotune_settings  # type: ignore
+    from core.socket_profile import SocketProfile  # type: ignore
+    from core.bidirectional import (  # type: ignore
+        bidirectional_enabled, merge_samples, summarize as summarize_bidirectional,
+    )
+    from core.bidirectional import describe as describe_bidirectional  # type: ignore
+    from core.multi_server import split_streams, summarize as summarize_multi_server  # type: ignore
+    from core.multi_server import describe as describe_multi_server  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Размер картинки для download-потоков: random4000x4000.jpg (~31 МБ) — самый крупный из legacy-набора
+DOWNLOAD_IMAGE_SIZE = 4000
+# Размер тела одного upload-запроса и размер куска, которым тело пишется в сокет
+UPLOAD_REQUEST_SIZE = 4 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# Размер приёмного буфера одного соединения
+RECV_BUFFER_SIZE = 256 * 1024
+# Шаг опроса отмены/дедлайна во время фазы
+POLL_INTERVAL = 0.1
+# Ограничение на размер заголовков ответа
+MAX_HEADER_SIZE = 64 * 1024
+
+DEFAULT_STREAMS = 8
+DEFAULT_DURATION = 10.0
+
+# Размеры запросов для автоподбора: картинки legacy-набора speedtest.net и тела upload (байты)
+AUTOTUNE_DOWNLOAD_SIZES = (350, 500, 750, 1000, 1500, 2000, 2500, 3000, 3500, 4000)
+AUTOTUNE_DOWNLOAD_START = 1000
+AUTOTUNE_UPLOAD_SIZES = (256 * 1024, 512 * 1024, 1024 * 1024, 2 * 1024 * 1024, 4 * 1024 * 1024, 8 * 1024 * 1024)
+AUTOTUNE_UPLOAD_START = 1024 * 1024
+
+
+class _TransferProtocol(asyncio.BufferedProtocol):
+    # Одно keep-alive соединение: минимальный HTTP/1.1 клиент поверх BufferedProtocol.
+    # Заголовки ответа разбираются, тело принимается в общий буфер соединения и только считается.
+
+    def __init__(self, buffer_size: int = RECV_BUFFER_SIZE):
+        self.transport: asyncio.Transport | None = None
+        self._buf = bytearray(buffer_size)
+        self._view = memoryview(self._buf)
+        self._head = bytearray()
+        self._in_head = True
+        self._remaining = 0        # сколько байт тела осталось; -1 — читать до закрытия соединения
+        self._chunked_tail: bytearray | None = None
+        self._status = 0
+        self._keep_alive = True
+        self._waiter: asyncio.Future | None = None
+        self._on_bytes = None
+        self._can_write = asyncio.Event()
+        self._can_write.set()
+        self.closed = False
+
+    # --- asyncio callbacks ---
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.closed = True
+        self._can_write.set()
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            if not self._in_head and self._remaining == -1:
+                waiter.set_result(self._status)
+            else:
+                waiter.set_exception(exc or ConnectionError('Соединение закрыто сервером'))
+
+    def pause_writing(self):
+        self._can_write.clear()
+
+    def resume_writing(self):
+        self._can_write.set()
+
+    def get_buffer(self, sizehint):
+        return self._view
+
+    def buffer_updated(self, nbytes):
+        waiter = self._waiter
+        if waiter is None or waiter.done():
+            return  # лишние данные вне запроса игнорируем
+        if self._in_head:
+            self._head += self._view[:nbytes]
+            idx = self._head.find(b'\r\n\r\n')
+            if idx < 0:
+                if len(self._head) > MAX_HEADER_SIZE:
+                    waiter.set_exception(ConnectionError('Слишком большие заголовки ответа'))
+                return
+            try:
+                self._parse_head(bytes(self._head[:idx]))
+            except Exception as e:
+                waiter.set_exception(e)
+                return
+            body = self._head[idx + 4:]
+            self._head = bytearray()
+            self._in_head = False
+            self._consume_body(len(body), body)
+        else:
+            self._consume_body(nbytes, self._view[:nbytes])
+
+    # --- HTTP ---
+    def _parse_head(self, head: bytes) -> None:
+        lines = head.split(b'\r\n')
+        parts = lines[0].split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b'HTTP/'):
+            raise ConnectionError(f'Некорректный ответ сервера: {lines[0][:80]!r}')
+        self._status = int(parts[1])
+        self._keep_alive = parts[0] != b'HTTP/1.0'
+        self._remaining = -1
+        self._chunked_tail = None
+        for line in lines[1:]:
+            name, _, value = line.partition(b':')
+            name = name.strip().lower()
+            value = value.strip().lower()
+            if name == b'content-length':
+                self._remaining = int(value)
+            elif name == b'transfer-encoding' and b'chunked' in value:
+                self._chunked_tail = bytearray()
+            elif name == b'connection':
+                if value == b'close':
+                    self._keep_alive = False
+                elif value == b'keep-alive':
+                    self._keep_alive = True
+
+    def _consume_body(self, nbytes: int, data) -> None:
+        if self._chunked_tail is not None:
+            # chunked встречается только у коротких ответов (upload.php) — ищем завершающий chunk
+            self._count(nbytes)
+            self._chunked_tail += data
+            if self._chunked_tail.endswith(b'0\r\n\r\n'):
+                self._finish()
+            elif len(self._chunked_tail) > 16:
+                del self._chunked_tail[:-16]
+            return
+        if self._remaining < 0:
+            self._count(nbytes)
+            return
+        take = min(nbytes, self._remaining)
+        self._remaining -= take
+        self._count(take)
+        if self._remaining == 0:
+            self._finish()
+
+    def _count(self, nbytes: int) -> None:
+        if nbytes and self._on_bytes is not None:
+            self._on_bytes(nbytes)
+
+    def _finish(self) -> None:
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(self._status)
+        if not self._keep_alive and self.transport is not None:
+            self.transport.close()
+
+    async def request(self, head: bytes, body: memoryview | None = None,
+                      on_received=None, on_sent=None) -> int:
+        """Отправить запрос и дождаться полного ответа.
+
+        Args:
+            head: Стартовая строка и заголовки запроса
+            body: Тело запроса (отправляется срезами memoryview без копирования)
+            on_received: Колбэк подсчёта принятых байт тела ответа
+            on_sent: Колбэк подсчёта отправленных байт тела запроса
+
+        Returns:
+            HTTP-статус ответа
+        """
+        if self.closed or self.transport is None:
+            raise ConnectionError('Соединение закрыто')
+        loop = asyncio.get_running_loop()
+        self._waiter = loop.create_future()
+        self._on_bytes = on_received
+        self._in_head = True
+        self._head = bytearray()
+        self.transport.write(head)
+        if body is not None:
+            for pos in range(0, len(body), UPLOAD_CHUNK_SIZE):
+                if not self._can_write.is_set():
+                    await self._can_write.wait()
+                if self.closed:
+                    raise ConnectionError('Соединение закрыто во время отправки')
+                chunk = body[pos:pos + UPLOAD_CHUNK_SIZE]
+                self.transport.write(chunk)
+                if on_sent is not None:
+                    on_sent(len(chunk))
+        return await self._waiter
+
+    def close(self) -> None:
+        if self.transport is not None and not self.closed:
+            self.transport.close()
+
+
+class AsyncTransferEngine:
+    """Многопоточная (по соединениям) передача данных к legacy-серверу speedtest.net на asyncio.
+
+    Args:
+        server_url: URL `upload.php` выбранного сервера (поле `url` speedtest-cli)
+        streams: Количество параллельных keep-alive соединений
+        duration: Длительность каждой фазы (секунды)
+        cancel_event: Событие отмены (threading.Event)
+        sampler: Счётчик поинтервальных отсчётов (фазы запускаются движком)
+        stop_event: Событие досрочного завершения текущей фазы (адаптивный режим); сбрасывается в начале фазы
+        autotune: Параметры StreamTuner (`max_streams`, `gain`) — подбирать потоки и размер запросов вместо streams
+        socket_profile: Опции сокетов соединений (None — системные значения)
+    """
+
+    def __init__(self, server_url: str, streams: int = DEFAULT_STREAMS, duration: float = DEFAULT_DURATION,
+                 cancel_event: threading.Event | None = None, sampler: ThroughputSampler | None = None,
+                 stop_event: threading.Event | None = None, autotune: dict | None = None,
+                 socket_profile: SocketProfile | None = None):
+        parts = urlsplit(server_url)
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname or ''
+        self.port = parts.port or (443 if self.scheme == 'https' else 80)
+        self.upload_path = parts.path or '/speedtest/upload.php'
+        self.base_path = os.path.dirname(self.upload_path)
+        self.streams = max(1, int(streams))
+        self.duration = max(1.0, float(duration))
+        self.cancel_event = cancel_event
+        self.sampler = sampler
+        self.stop_event = stop_event
+        self._host_header = parts.netloc.encode('idna') if parts.netloc else self.host.encode()
+        self._ssl = ssl.create_default_context() if self.scheme == 'https' else None
+        self._addr: tuple | None = None
+        self._bytes = 0
+        self._request_seq = 0
+        self.autotune = autotune
+        self.socket_profile = socket_profile
+        # итоги автоподбора по фазам (StreamTuner.summary())
+        self.tuning: dict = {}
+        # размер запросов текущей фазы: сторона картинки download или байты тела upload
+        self.request_size = 0
+
+    def _cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def _add_bytes(self, nbytes: int) -> None:
+        self._bytes += nbytes
+        if self.sampler is not None:
+            self.sampler.add(nbytes)
+
+    def _next_stamp(self) -> str:
+        self._request_seq += 1
+        return f'{int(time.time() * 1000)}.{self._request_seq}'
+
+    async def _resolve(self) -> None:
+        if self._addr is not None:
+            return
+        loop = asyncio.get_running_loop()
+        # одна DNS-операция на движок (из кэша общей HTTP-сессии): все потоки подключаются к одному адресу
+        addrs = await loop.run_in_executor(None, get_session().resolve, self.host, self.port)
+        family = self.socket_profile.family if self.socket_profile is not None else None
+        if family is not None:
+            # source_address привязывает к одному семейству адресов (IPv4 или IPv6)
+            addrs = [a for a in addrs if a[0] == family]
+            if not addrs:
+                raise ConnectionError(f'У {self.host} нет адресов {self.socket_profile.family_name}')
+        if not addrs:
+            raise ConnectionError(f'Не удалось разрешить адрес {self.host}')
+        self._addr = addrs[0]
+
+    async def _connect(self) -> _TransferProtocol:
+        loop = asyncio.get_running_loop()
+        family, sockaddr = self._addr  # type: ignore[misc]
+        if self.socket_profile is None:
+            _transport, proto = await loop.create_connection(
+                _TransferProtocol,
+                host=sockaddr[0],
+                port=sockaddr[1],
+                family=family,
+                ssl=self._ssl,
+                server_hostname=self.host if self._ssl else None,
+            )
+            return proto
+        # опции профиля (буферы, congestion, bind) ставятся до connect
+        sock = self.socket_profile.create_socket(family)
+        try:
+            sock.setblocking(False)
+            await loop.sock_connect(sock, sockaddr)
+            transport, proto = await loop.create_connection(
+                _TransferProtocol, sock=sock, ssl=self._ssl, server_hostname=self.host if self._ssl else None)
+        except BaseException:
+            sock.close()
+            raise
+        if not self.socket_profile.nodelay:
+            # asyncio включает TCP_NODELAY сам
+            transport.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 0)
+        return proto
+
+    def _request_head(self, method: str, path: str, extra: str = '') -> bytes:
+        return (
+            f'{method} {path} HTTP/1.1\r\n'
+            f'Host: {self._host_header.decode()}\r\n'
+            'User-Agent: Mozilla/5.0 (Windows NT 10.0; Win64; x64) SpeedtestNextGen\r\n'
+            'Accept: */*\r\n'
+            'Cache-Control: no-cache\r\n'
+            'Connection: keep-alive\r\n'
+            f'{extra}\r\n'
+        ).encode('latin-1')
+
+    async def _download_stream(self) -> None:
+        proto = await self._connect()
+        try:
+            while not proto.closed:
+                size = self.request_size
+                path = f'{self.base_path}/random{size}x{size}.jpg?x={self._next_stamp()}'
+                status = await proto.request(self._request_head('GET', path), on_received=self._add_bytes)
+                if status != 200:
+                    raise ConnectionError(f'HTTP {status} при загрузке {path}')
+        finally:
+            proto.close()
+
+    async def _upload_stream(self, payload: memoryview) -> None:
+        proto = await self._connect()
+        try:
+            while not proto.closed:
+                body = payload[:self.request_size]
+                extra = (
+                    'Content-Type: application/x-www-form-urlencoded\r\n'
+                    f'Content-Length: {len(body)}\r\n'
+                )
+                path = f'{self.upload_path}?x={self._next_stamp()}'
+                status = await proto.request(self._request_head('POST', path, extra), body=body,
+                                             on_sent=self._add_bytes)
+                if status != 200:
+                    raise ConnectionError(f'HTTP {status} при отдаче на {path}')
+        finally:
+            proto.close()
+
+    def _retune(self, tuner: StreamTuner, tasks: list, retired: list, make_stream) -> None:
+        # Привести число потоков и размер запросов к решению автоподбора.
+        # Лишние потоки отменяются сразу: байты их недокачанных ответов уже учтены.
+        self.request_size = tuner.request_size
+        while len(tasks) < tuner.streams:
+            tasks.append(asyncio.ensure_future(make_stream()))
+        while len(tasks) > tuner.streams:
+            task = tasks.pop()
+            task.cancel()
+            retired.append(task)
+
+    async def _run_phase(self, phase: str, make_stream, sizes: tuple, size: int) -> float:
+        await self._resolve()
+        self._bytes = 0
+        self.request_size = size
+        tuner = None
+        if self.autotune is not None:
+            tuner = StreamTuner(sizes, size, **self.autotune)
+            tuner.start()
+            self.request_size = tuner.request_size
+        if self.stop_event is not None:
+            self.stop_event.clear()
+        if self.sampler is not None:
+            self.sampler.start_phase(phase)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.duration
+        tasks = [asyncio.ensure_future(make_stream()) for _ in range(tuner.streams if tuner else self.streams)]
+        retired: list = []
+        window_start, window_bytes = start, 0
+        try:
+            while loop.time() < deadline and not self._cancelled():
+                if self.stop_event is not None and self.stop_event.is_set():
+                    break
+                if all(t.done() for t in tasks):
+                    break
+                await asyncio.sleep(POLL_INTERVAL)
+                now = loop.time()
+                if tuner is not None and not tuner.holding and (now - window_start) * 1000 >= tuner.step_ms:
+                    bps = (self._bytes - window_bytes) * 8.0 / (now - window_start)
+                    window_start, window_bytes = now, self._bytes
+                    if tuner.feed(int((now - start) * 1000), bps):
+                        self._retune(tuner, tasks, retired, make_stream)
+        finally:
+            elapsed = loop.time() - start
+            total = self._bytes
+            for t in tasks:
+                t.cancel()
+            results = await asyncio.gather(*tasks, *retired, return_exceptions=True)
+            if self.sampler is not None:
+                self.sampler.stop_phase()
+            if tuner is not None:
+                tuner.finish()
+                self.tuning[phase] = tuner.summary()
+        errors = [r for r in results if isinstance(r, Exception) and not isinstance(r, asyncio.CancelledError)]
+        if errors and total == 0:
+            raise errors[0]
+        for err in errors:
+            logger.debug(f'Поток передачи завершился с ошибкой: {err}')
+        return (total * 8.0 / elapsed) if elapsed > 0 else 0.0
+
+    async def download(self, size: int = DOWNLOAD_IMAGE_SIZE) -> float:
+        """Измерить скорость загрузки (бит/с)."""
+        return await self._run_phase('download', self._download_stream, AUTOTUNE_DOWNLOAD_SIZES,
+                                     AUTOTUNE_DOWNLOAD_START if self.autotune is not None else size)
+
+    async def upload(self, request_size: int = UPLOAD_REQUEST_SIZE) -> float:
+        """Измерить скорость отдачи (бит/с)."""
+        if self.autotune is not None:
+            request_size = AUTOTUNE_UPLOAD_START
+        payload = shared_upload_payload(max(request_size, AUTOTUNE_UPLOAD_SIZES[-1]) if self.autotune is not None
+                                        else request_size)
+        return await self._run_phase('upload', lambda: self._upload_stream(payload), AUTOTUNE_UPLOAD_SIZES,
+                                     request_size)
+
+    def run(self) -> tuple[float, float]:
+        """Синхронно выполнить download и upload в собственном цикле событий.
+
+        Returns:
+            (download_bps, upload_bps)
+        """
+        async def _both():
+            d_bps = await self.download()
+            if self._cancelled():
+                raise RuntimeError('Отменено пользователем')
+            u_bps = await self.upload()
+            return d_bps, u_bps
+
+        return asyncio.run(_both())
+
+
+class _ServerSampler:
+    # «Сэмплер» движка одного сервера: байты — в общий ThroughputSampler, фазу которого
+    # запускает MultiServerTransferEngine
+
+    def __init__(self, sampler: ThroughputSampler):
+        self._sampler = sampler
+
+    def add(self, nbytes: int) -> None:
+        self._sampler.add(nbytes)
+
+    def start_phase(self, _phase: str) -> None:
+        pass
+
+    def stop_phase(self) -> None:
+        pass
+
+
+class MultiServerTransferEngine:
+    """Фазы download/upload одновременно на нескольких серверах (core/multi_server.py).
+
+    Для каждого сервера — свой AsyncTransferEngine со своей долей потоков; все они работают
+    в одном цикле событий и пишут байты в общий sampler.
+
+    Args:
+        server_urls: URL `upload.php` серверов
+        streams: Общее количество потоков (делится между серверами, минимум один на сервер)
+        duration: Длительность каждой фазы (секунды)
+        cancel_event: Событие отмены
+        sampler: Счётчик поинтервальных отсчётов (общий для всех серверов)
+        stop_event: Событие досрочного завершения текущей фазы (адаптивный режим)
+        autotune: Параметры StreamTuner — потоки и размер запросов подбираются для каждого сервера отдельно
+        socket_profile: Опции сокетов соединений
+    """
+
+    def __init__(self, server_urls: list[str], streams: int = DEFAULT_STREAMS, duration: float = DEFAULT_DURATION,
+                 cancel_event: threading.Event | None = None, sampler: ThroughputSampler | None = None,
+                 stop_event: threading.Event | None = None, autotune: dict | None = None,
+                 socket_profile: SocketProfile | None = None):
+        self.server_streams = split_streams(streams, len(server_urls))
+        self.streams = sum(self.server_streams)
+        self.sampler = sampler
+        self.engines = [
+            AsyncTransferEngine(url, streams=n, duration=duration, cancel_event=cancel_event,
+                                sampler=_ServerSampler(sampler) if sampler is not None else None,
+                                stop_event=stop_event, autotune=autotune, socket_profile=socket_profile)
+            for url, n in zip(server_urls, self.server_streams)
+        ]
+        # итоги автоподбора сохраняются по серверам (в stats), общего нет
+        self.tuning: dict = {}
+        # {phase: [{'bytes', 'bps', 'error', 'autotune'}, ...]} в порядке server_urls
+        self.stats: dict = {}
+
+    @property
+    def duration(self) -> float:
+        return self.engines[0].duration
+
+    @duration.setter
+    def duration(self, value: float) -> None:
+        for engine in self.engines:
+            engine.duration = value
+
+    async def _run_phase(self, phase: str) -> float:
+        if self.sampler is not None:
+            self.sampler.start_phase(phase)
+        try:
+            results = await asyncio.gather(*(e.download() if phase == 'download' else e.upload()
+                                             for e in self.engines), return_exceptions=True)
+        finally:
+            if self.sampler is not None:
+                self.sampler.stop_phase()
+        stats = []
+        for engine, res in zip(self.engines, results):
+            if isinstance(res, BaseException) and not isinstance(res, Exception):
+                raise res
+            failed = isinstance(res, Exception)
+            if failed:
+                logger.warning(f'{phase}: сервер {engine.host} завершил фазу с ошибкой: {res}')
+            st = {'bytes': engine._bytes, 'bps': 0.0 if failed else float(res), 'error': str(res) if failed else None}
+            if phase in engine.tuning:
+                st['autotune'] = engine.tuning[phase]
+            stats.append(st)
+        self.stats[phase] = stats
+        if all(st['error'] for st in stats):
+            raise next(r for r in results if isinstance(r, Exception))
+        return sum(st['bps'] for st in stats)
+
+    async def download(self) -> float:
+        """Измерить суммарную скорость загрузки со всех серверов (бит/с)."""
+        return await self._run_phase('download')
+
+    async def upload(self) -> float:
+        """Измерить суммарную скорость отдачи на все серверы (бит/с)."""
+        return await self._run_phase('upload')
+
+
+class AsyncSpeedtestClient(SpeedtestClient):
+    # Третий движок: выбор сервера как у SpeedtestClient, передача данных — AsyncTransferEngine.
+
+    @staticmethod
+    def _run_async_phase(engine: AsyncTransferEngine | MultiServerTransferEngine, phase: str, hook: AdaptiveHook,
+                         latency: LatencyMonitor | None = None) -> float:
+        # Фаза движка asyncio; в адаптивном режиме длительность ограничена бюджетом времени контроллера
+        ctl = hook.begin(phase)
+        duration = engine.duration
+        engine.duration = phase_duration(ctl, duration)
+        if latency is not None:
+            latency.set_phase(phase)
+        try:
+            bps = asyncio.run(engine.download() if phase == 'download' else engine.upload())
+        finally:
+            if latency is not None:
+                latency.set_phase(None)
+            engine.duration = duration
+        if ctl is None:
+            return bps
+        ctl.finish()
+        return ctl.summary()['measured_bps']
+
+    def perform_test(self, cancel_event: threading.Event | None = None, server_id_override: int | None = None,
+                     on_sample=None, on_tcp_info=None):
+        # on_tcp_info не используется: TCP_INFO снимается с сокетов общей HTTP-сессии (движок python)
+        logger.info('Инициализация клиента Speedtest (asyncio)...')
+        socket_profile = self._socket_profile()
+        s = self._create_speedtest()
+        best = self._select_server(s, server_id_override)
+        servers = self._multi_servers(s, best, cancel_event)
+
+        if cancel_event is not None and cancel_event.is_set():
+            raise RuntimeError('Отменено пользователем')
+
+        streams = int(self.settings.get('async_streams', DEFAULT_STREAMS) or DEFAULT_STREAMS)
+        duration = float(self.settings.get('async_duration', DEFAULT_DURATION) or DEFAULT_DURATION)
+        stop_event = threading.Event()
+        sampler, hook = self._create_sampler(on_sample, on_stop=lambda _phase, _reason: stop_event.set())
+        autotune = autotune_settings(self.settings)
+        if len(servers) > 1:
+            engine = MultiServerTransferEngine([sv['url'] for sv in servers], streams=streams, duration=duration,
+                                               cancel_event=cancel_event, sampler=sampler, stop_event=stop_event,
+                                               autotune=autotune, socket_profile=socket_profile)
+        else:
+            engine = AsyncTransferEngine(best['url'], streams=streams, duration=duration, cancel_event=cancel_event,
+                                         sampler=sampler, stop_event=stop_event, autotune=autotune,
+                                         socket_profile=socket_profile)
+        if autotune is not None:
+            streams_label = f"автоподбор до {autotune['max_streams']}"
+        else:
+            streams_label = str(engine.streams)
+        if len(servers) > 1:
+            streams_label += f', серверов: {len(servers)}'
+
+        idle_latency = self._measure_latency(s, best, cancel_event)
+        udp = self._measure_udp(cancel_event)
+        latency = self._start_latency_monitor(best, cancel_event)
+        try:
+            logger.info(f'Тест загрузки (download), потоков: {streams_label}...')
+            d_bps = self._run_async_phase(engine, 'download', hook, latency)
+            if cancel_event is not None and cancel_event.is_set():
+                raise RuntimeError('Отменено пользователем')
+
+            logger.info(f'Тест отдачи (upload), потоков: {streams_label}...')
+            with PeakMemoryTracker() as upload_memory:
+                u_bps = self._run_async_phase(engine, 'upload', hook, latency)
+
+            bidirectional = None
+            bidir_samplers = (ThroughputSampler(sampler.interval_ms), ThroughputSampler(sampler.interval_ms))
+            if bidirectional_enabled(self.settings):
+                def _both() -> tuple[float, float]:
+                    # отдельные пулы соединений в одном цикле событий; потоков — как в последовательных фазах
+                    # (или сколько подобрал автоподбор)
+                    down, up = (
+                        AsyncTransferEngine(best['url'], streams=engine.tuning.get(phase, {}).get('streams', streams),
+                                            duration=duration, cancel_event=cancel_event, sampler=phase_sampler,
+                                            socket_profile=socket_profile)
+                        for phase, phase_sampler in zip(('download', 'upload'), bidir_samplers)
+                    )
+
+                    async def _gather():
+                        return await asyncio.gather(down.download(), up.upload())
+
+                    return tuple(asyncio.run(_gather()))
+
+                bidirectional = self._run_bidirectional(_both, cancel_event, latency)
+        finally:
+            if latency is not None:
+                latency.stop()
+        if cancel_event is not None and cancel_event.is_set():
+            raise RuntimeError('Отменено пользователем')
+
+        result = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'ping_ms': float(s.results.ping),
+            **idle_latency,
+            'download_bps': float(d_bps),
+            'upload_bps': float(u_bps),
+            **udp,
+            'server': {
+                'id': best.get('id'),
+                'sponsor': best.get('sponsor'),
+                'name': best.get('name'),
+                'country': best.get('country'),
+                'host': best.get('host'),
+            },
+            'engine': 'async',
+            'streams': engine.streams,
+            'samples': sampler.to_result(),
+        }
+        merge_samples(result['samples'], *bidir_samplers)
+        result['throughput_stats'] = summarize_samples(result['samples'])
+        if hook.enabled:
+            result['adaptive'] = hook.summary()
+        if socket_profile is not None:
+            result['socket_profile'] = socket_profile.to_result()
+        if engine.tuning:
+            result['autotune'] = engine.tuning
+            result['streams'] = max(t['streams'] for t in engine.tuning.values())
+            for phase, info in engine.tuning.items():
+                logger.info(f"Автоподбор ({phase}): потоков {info['streams']}, размер запроса {info['request_size']}, "
+                            f"причина — {info['reason']}")
+        if len(servers) > 1:
+            result['multi_server'] = summarize_multi_server(servers, engine.server_streams, engine.stats)
+            logger.info(f"Разбивка по серверам: {describe_multi_server(result['multi_server'])}")
+        if upload_memory.to_result():
+            result['upload_memory'] = upload_memory.to_result()
+        if latency is not None:
+            result['loaded_latency'] = latency.to_result()
+            logger.info(f'Задержка под нагрузкой: {latency.describe()}')
+        if bidirectional is not None:
+            result['bidirectional'] = summarize_bidirectional((d_bps, u_bps), bidirectional,
+                                                              result.get('loaded_latency'))
+            logger.info(f"Одновременный тест: {describe_bidirectional(result['bidirectional'])}")
+        logger.info('Тест (asyncio) завершён успешно')
+        return result
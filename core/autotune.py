@@ -0,0 +1,161 @@
+# coding: utf-8
+"""
+Автоподбор числа потоков и размера запросов движка asyncio.
+
+Фиксированные 8 соединений и один размер запроса недооценивают длинные толстые каналы
+(одному TCP-потоку не хватает окна) и перегружают медленный Wi-Fi. StreamTuner начинает
+с небольшого числа потоков и по скорости за окно `step_ms` решает, что делать дальше:
+
+1. пока удвоение потоков даёт прирост не меньше `gain` — удваивать дальше (до `max_streams`);
+2. затем так же увеличивать размер запроса (следующий размер из списка фазы);
+3. прирост меньше `gain` — держать текущие параметры до конца фазы; падение больше 2 × `gain`
+   (меньшие колебания — шум окна) — вернуться к предыдущим и держать их.
+
+После каждого изменения одно окно пропускается: новые соединения проходят slow start.
+История решений сохраняется в результате (поле `autotune`), чтобы было видно, почему
+выбрана такая параллельность.
+"""
+from typing import List, Optional, Sequence
+
+# Причины остановки подбора
+HOLD_PLATEAU = 'plateau'      # прирост меньше порога
+HOLD_BACKOFF = 'backoff'      # последнее изменение уменьшило скорость — возврат к предыдущим параметрам
+HOLD_LIMIT = 'limit'          # достигнуты максимум потоков и самый крупный запрос
+HOLD_PHASE_END = 'phase_end'  # фаза закончилась раньше
+
+# Решения в истории
+STEP_START = 'start'
+STEP_SETTLE = 'settle'
+STEP_MORE_STREAMS = 'more_streams'
+STEP_LARGER_REQUESTS = 'larger_requests'
+STEP_HOLD = 'hold'
+
+DEFAULT_START_STREAMS = 2
+DEFAULT_MAX_STREAMS = 32
+DEFAULT_GAIN = 0.1
+DEFAULT_STEP_MS = 500
+# Во сколько раз падение скорости должно превышать gain, чтобы откатить последнее увеличение
+BACKOFF_FACTOR = 2.0
+
+
+class StreamTuner:
+    """Подбор (потоки, размер запроса) одной фазы по скорости за окно.
+
+    Args:
+        sizes: Допустимые размеры запроса фазы по возрастанию (единицы — как их понимает движок)
+        start_size: Начальный размер (индекс ближайшего не меньшего в sizes)
+        start_streams: Начальное число потоков
+        max_streams: Максимум потоков
+        gain: Минимальный относительный прирост скорости, ради которого параметры увеличиваются
+        step_ms: Длина окна оценки скорости
+    """
+
+    def __init__(self, sizes: Sequence[int], start_size: int, start_streams: int = DEFAULT_START_STREAMS,
+                 max_streams: int = DEFAULT_MAX_STREAMS, gain: float = DEFAULT_GAIN, step_ms: int = DEFAULT_STEP_MS):
+        self.sizes = list(sizes)
+        self.size_index = next((i for i, s in enumerate(self.sizes) if s >= start_size), len(self.sizes) - 1)
+        self.max_streams = max(1, int(max_streams))
+        self.streams = min(self.max_streams, max(1, int(start_streams)))
+        self.gain = max(0.0, float(gain))
+        self.step_ms = max(100, int(step_ms))
+        self.hold_reason: Optional[str] = None
+        self.history: List[dict] = []
+        self._stage = 'streams'
+        self._settling = False
+        self._best_bps = 0.0
+        self._previous: Optional[tuple] = None
+
+    @property
+    def request_size(self) -> int:
+        return self.sizes[self.size_index]
+
+    @property
+    def holding(self) -> bool:
+        return self.hold_reason is not None
+
+    def _record(self, t_ms: int, bps: Optional[float], decision: str) -> None:
+        self.history.append({
+            't_ms': t_ms,
+            'streams': self.streams,
+            'request_size': self.request_size,
+            'bps': round(bps, 1) if bps is not None else None,
+            'decision': decision,
+        })
+
+    def start(self) -> None:
+        """Отметить начальные параметры в истории."""
+        self._record(0, None, STEP_START)
+        self._settling = True
+
+    def _hold(self, t_ms: int, bps: float, reason: str) -> None:
+        self.hold_reason = reason
+        self._record(t_ms, bps, STEP_HOLD)
+
+    def _grow(self) -> Optional[str]:
+        # Следующий шаг роста или None, если расти некуда
+        if self._stage == 'streams' and self.streams < self.max_streams:
+            self.streams = min(self.max_streams, self.streams * 2)
+            return STEP_MORE_STREAMS
+        self._stage = 'sizes'
+        if self.size_index + 1 < len(self.sizes):
+            self.size_index += 1
+            return STEP_LARGER_REQUESTS
+        return None
+
+    def feed(self, t_ms: int, bps: float) -> bool:
+        """Учесть скорость за очередное окно.
+
+        Returns:
+            True, если параметры (streams/request_size) изменились
+        """
+        if self.holding:
+            return False
+        if self._settling:
+            self._settling = False
+            self._record(t_ms, bps, STEP_SETTLE)
+            return False
+        if self._previous is not None and bps < self._best_bps * (1.0 - BACKOFF_FACTOR * self.gain):
+            # последнее увеличение навредило (перегрузка очередей Wi-Fi/сервера)
+            self.streams, self.size_index, self._stage = self._previous
+            self._hold(t_ms, bps, HOLD_BACKOFF)
+            return True
+        if self._previous is not None and bps < self._best_bps * (1.0 + self.gain):
+            if self._stage == 'streams':
+                # потоки больше не помогают — пробуем размер запроса с текущими потоками
+                self._stage = 'sizes'
+            else:
+                self._hold(t_ms, bps, HOLD_PLATEAU)
+                return False
+        self._best_bps = max(self._best_bps, bps)
+        self._previous = (self.streams, self.size_index, self._stage)
+        step = self._grow()
+        if step is None:
+            self._hold(t_ms, bps, HOLD_LIMIT)
+            return False
+        self._record(t_ms, bps, step)
+        self._settling = True
+        return True
+
+    def finish(self) -> None:
+        """Отметить конец фазы (если подбор ещё не остановился)."""
+        if self.hold_reason is None:
+            self.hold_reason = HOLD_PHASE_END
+
+    def summary(self) -> dict:
+        """Итог подбора для поля `autotune` результата."""
+        return {
+            'streams': self.streams,
+            'request_size': self.request_size,
+            'reason': self.hold_reason or HOLD_PHASE_END,
+            'history': list(self.history),
+        }
+
+
+def autotune_settings(settings) -> Optional[dict]:
+    """Параметры StreamTuner из настроек (`autotune_mode`, `autotune_max_streams`, `autotune_gain`) или None."""
+    if not bool(settings.get('autotune_mode', False)):
+        return None
+    return {
+        'max_streams': int(settings.get('autotune_max_streams', DEFAULT_MAX_STREAMS) or DEFAULT_MAX_STREAMS),
+        'gain': float(settings.get('autotune_gain', DEFAULT_GAIN) or DEFAULT_GAIN),
+    }
@@ -0,0 +1,102 @@
+# coding: utf-8
+"""
+Двунаправленный тест: download и upload одновременно.
+
+Последовательные фазы не показывают, что происходит при полнодуплексной нагрузке, которую создаёт
+видеозвонок: на многих каналах (DOCSIS, Wi-Fi, ADSL) встречный поток ACK и общая очередь заметно
+режут одно из направлений. При `bidirectional_mode` после обычных фаз выполняется третья фаза
+`bidirectional`: download и upload идут одновременно по отдельным пулам соединений.
+
+В результат попадают скорости каждого направления под встречной нагрузкой, их падение относительно
+последовательных фаз того же теста и медианы задержки под нагрузкой (если она мерилась).
+"""
+import threading
+from typing import Callable, Optional, Tuple
+
+PHASE_BIDIRECTIONAL = 'bidirectional'
+# Фазы поля `samples` с поинтервальными отсчётами направлений
+PHASE_BIDIRECTIONAL_DOWNLOAD = 'bidirectional_download'
+PHASE_BIDIRECTIONAL_UPLOAD = 'bidirectional_upload'
+
+
+def bidirectional_enabled(settings) -> bool:
+    """Включён ли двунаправленный тест (`bidirectional_mode`)."""
+    return bool(settings.get('bidirectional_mode', False))
+
+
+def run_both(download: Callable[[], float], upload: Callable[[], float]) -> Tuple[float, float]:
+    """Выполнить download() и upload() одновременно в двух потоках.
+
+    Returns:
+        (download_bps, upload_bps)
+    """
+    results: dict = {}
+    errors: list = []
+    start = threading.Barrier(2)
+
+    def _run(direction: str, fn: Callable[[], float]) -> None:
+        try:
+            start.wait()
+            results[direction] = fn()
+        except BaseException as e:  # ошибка уходит вызывающему
+            errors.append(e)
+
+    threads = [threading.Thread(target=_run, args=('download', download), name='bidir-download', daemon=True),
+               threading.Thread(target=_run, args=('upload', upload), name='bidir-upload', daemon=True)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return results['download'], results['upload']
+
+
+def merge_samples(samples: dict, download_sampler, upload_sampler) -> None:
+    """Добавить отсчёты samplers направлений в поле `samples` результата (фазы bidirectional_*)."""
+    pairs = ((PHASE_BIDIRECTIONAL_DOWNLOAD, download_sampler), (PHASE_BIDIRECTIONAL_UPLOAD, upload_sampler))
+    for phase, sampler in pairs:
+        values = [row for rows in sampler.samples.values() for row in rows]
+        if values:
+            samples[phase] = values
+
+
+def _drop_pct(sequential: float, simultaneous: float) -> Optional[float]:
+    return round(100.0 * (sequential - simultaneous) / sequential, 1) if sequential > 0 else None
+
+
+def summarize(sequential: Tuple[float, float], simultaneous: Tuple[float, float],
+              loaded_latency: Optional[dict] = None) -> dict:
+    """Поле `bidirectional` результата.
+
+    Args:
+        sequential: (download_bps, upload_bps) последовательных фаз
+        simultaneous: (download_bps, upload_bps) одновременной фазы
+        loaded_latency: Поле `loaded_latency` результата (если задержка под нагрузкой мерилась)
+    """
+    data = {
+        'download_bps': float(simultaneous[0]),
+        'upload_bps': float(simultaneous[1]),
+        # положительное значение — насколько направление просело под встречной нагрузкой
+        'download_drop_pct': _drop_pct(sequential[0], simultaneous[0]),
+        'upload_drop_pct': _drop_pct(sequential[1], simultaneous[1]),
+    }
+    if loaded_latency:
+        p50 = {phase: loaded_latency[phase]['p50_ms'] for phase in ('download', 'upload', PHASE_BIDIRECTIONAL)
+               if 'p50_ms' in loaded_latency.get(phase, {})}
+        if p50:
+            data['latency_p50_ms'] = p50
+    return data
+
+
+def describe(data: dict) -> str:
+    """Краткая сводка для лога."""
+    parts = []
+    for direction in ('download', 'upload'):
+        drop = data.get(f'{direction}_drop_pct')
+        drop_text = f' ({-drop:+.1f}% к последовательному)' if drop is not None else ''
+        parts.append(f"{direction} {data[f'{direction}_bps'] / 1e6:.1f} Мбит/с{drop_text}")
+    latency = data.get('latency_p50_ms', {}).get(PHASE_BIDIRECTIONAL)
+    if latency is not None:
+        parts.append(f'задержка p50 {latency:.1f} мс')
+    return ', '.join(parts)
@@ -0,0 +1,218 @@
+# coding: utf-8
+"""
+Колоночный кэш числовых полей истории: Documents/SpeedtestNextGen/data/results.cols/.
+
+Каждая колонка — отдельный файл значений фиксированной ширины (формат модуля array, порядок
+байт платформы): время теста (секунды Unix), пинг, скорости загрузки и отдачи и ID сервера.
+Строка k колонок соответствует записи k индекса results.idx (core/storage.py), поэтому
+отрезанные лимитом записи отбрасываются тем же номером первой живой записи, а сжатие истории
+срезает начало колонок. append_result() дописывает по значению в каждую колонку.
+
+Читатели отображают файлы в память (mapped()) и считают агрегаты (summarize()) без разбора
+JSON. Колонки оборачиваются np.frombuffer без копирования (NumPy — из requirements.txt);
+если NumPy не установлена, агрегаты считаются по memoryview средствами стандартной
+библиотеки, на порядок медленнее.
+Отсутствующее значение — NaN (у server_id — -1).
+"""
+import math
+import mmap
+import os
+import shutil
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # запасной путь без NumPy
+    np = None
+
+# Колонки: имя и код типа array
+COLUMNS = (
+    ('timestamp', 'd'),
+    ('ping_ms', 'd'),
+    ('download_bps', 'd'),
+    ('upload_bps', 'd'),
+    ('server_id', 'q'),
+)
+# Колонки, по которым считаются агрегаты
+METRICS = ('ping_ms', 'download_bps', 'upload_bps')
+PERCENTILES = (50, 90, 99)
+# Строк в пачке при пересборке
+REBUILD_BATCH = 10000
+
+NAN = float('nan')
+
+
+def _timestamp(value) -> float:
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except (TypeError, ValueError, OverflowError, OSError):
+        return NAN
+
+
+def _number(value) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else NAN
+
+
+def row_values(result: Dict) -> tuple:
+    """Значения колонок для записи истории (в порядке COLUMNS)."""
+    server = result.get('server') or {}
+    try:
+        server_id = int(server.get('id'))
+    except (TypeError, ValueError, AttributeError):
+        server_id = -1
+    return (
+        _timestamp(result.get('timestamp')),
+        _number(result.get('ping_ms')),
+        _number(result.get('download_bps')),
+        _number(result.get('upload_bps')),
+        server_id,
+    )
+
+
+class HistoryColumns:
+    """Файлы колонок в каталоге directory.
+
+    Args:
+        directory: Каталог колонок (results.cols)
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def _path(self, name: str) -> Path:
+        return self.directory / f'{name}.bin'
+
+    def length(self) -> int:
+        """Число строк; -1, если колонки разной длины (запись прервалась) или повреждены."""
+        lengths = set()
+        for name, code in COLUMNS:
+            try:
+                size = self._path(name).stat().st_size
+            except OSError:
+                size = 0
+            itemsize = array(code).itemsize
+            if size % itemsize:
+                return -1
+            lengths.add(size // itemsize)
+        return lengths.pop() if len(lengths) == 1 else -1
+
+    def append(self, result: Dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for (name, code), value in zip(COLUMNS, row_values(result)):
+            with open(self._path(name), 'ab') as f:
+                f.write(array(code, (value,)).tobytes())
+
+    def rebuild(self, records: Iterable[Dict]) -> int:
+        """Переписать колонки по записям (по одной строке на запись); вернуть число строк."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = {name: self._path(name).with_suffix('.tmp') for name, _ in COLUMNS}
+        files = {name: open(path, 'wb') for name, path in tmp.items()}
+        total = 0
+        try:
+            batch = [array(code) for _, code in COLUMNS]
+            for record in records:
+                for column, value in zip(batch, row_values(record)):
+                    column.append(value)
+                total += 1
+                if len(batch[0]) >= REBUILD_BATCH:
+                    for (name, _), column in zip(COLUMNS, batch):
+                        column.tofile(files[name])
+                    batch = [array(code) for _, code in COLUMNS]
+            for (name, _), column in zip(COLUMNS, batch):
+                column.tofile(files[name])
+        finally:
+            for f in files.values():
+                f.close()
+        for name, path in tmp.items():
+            os.replace(path, self._path(name))
+        return total
+
+    def drop_front(self, rows: int) -> None:
+        """Отбросить первые rows строк (после сжатия истории)."""
+        for name, code in COLUMNS:
+            path = self._path(name)
+            tmp = path.with_suffix('.tmp')
+            with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+                src.seek(rows * array(code).itemsize)
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(tmp, path)
+
+    def clear(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for name, _ in COLUMNS:
+            self._path(name).write_bytes(b'')
+
+    def remove(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    @contextmanager
+    def mapped(self, first: int = 0) -> Iterator[Dict]:
+        """Колонки со строки first, отображённые в память: {имя: memoryview}.
+
+        Представления действительны только внутри блока with.
+        """
+        maps, views = [], []
+        columns = {}
+        try:
+            for name, code in COLUMNS:
+                itemsize = array(code).itemsize
+                path = self._path(name)
+                size = path.stat().st_size if path.exists() else 0
+                if size <= first * itemsize:
+                    columns[name] = memoryview(array(code))
+                    continue
+                with open(path, 'rb') as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                maps.append(mm)
+                raw = memoryview(mm)
+                view = raw[first * itemsize:(size // itemsize) * itemsize].cast(code)
+                views.extend((view, raw))
+                columns[name] = view
+            yield columns
+        finally:
+            columns.clear()
+            for view in views:
+                view.release()
+            for mm in maps:
+                mm.close()
+
+
+def percentile_rank(n: int, pct: float) -> int:
+    """Номер значения перцентиля pct (ближайший ранг) среди n упорядоченных."""
+    return min(n - 1, max(0, int(math.ceil(pct / 100.0 * n)) - 1))
+
+
+def aggregate(values) -> Dict:
+    """count, mean, min, max и перцентили PERCENTILES значений без NaN (memoryview/array/последовательность)."""
+    if np is not None:
+        if isinstance(values, memoryview):
+            data = np.frombuffer(values, dtype=np.float64)
+        else:
+            data = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(data)
+        if missing.any():
+            data = data[~missing]
+        n = int(data.size)
+        if not n:
+            return {'count': 0}
+        # полная сортировка копии быстрее np.partition по нескольким рангам
+        data = np.sort(data)
+        result = {'count': n, 'mean': float(data.mean()), 'min': float(data[0]), 'max': float(data[-1])}
+        result.update({f'p{p}': float(data[percentile_rank(n, p)]) for p in PERCENTILES})
+        return result
+    data = sorted(v for v in values if v == v)
+    n = len(data)
+    if not n:
+        return {'count': 0}
+    result = {'count': n, 'mean': math.fsum(data) / n, 'min': data[0], 'max': data[-1]}
+    result.update({f'p{p}': data[percentile_rank(n, p)] for p in PERCENTILES})
+    return result
+
+
+def summarize(columns: Dict, metrics: Optional[Iterable[str]] = None) -> Dict:
+    """Агрегаты по колонкам метрик: {метрика: aggregate(...)}."""
+    return {name: aggregate(columns[name]) for name in (metrics or METRICS)}
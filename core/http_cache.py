@@ -0,0 +1,249 @@
+# coding: utf-8
+"""
+Дисковый кэш конфигурации speedtest.net и каталога серверов.
+
+speedtest-cli скачивает speedtest-config.php при каждом создании Speedtest и полный XML серверов
+при каждом get_servers. CachingOpener оборачивает OpenerDirector экземпляра Speedtest и отдаёт
+эти документы из Documents/SpeedtestNextGen/cache:
+
+- свежая запись (моложе TTL) отдаётся без обращения к сети;
+- устаревшая, но не старше `cache_max_stale` — отдаётся сразу, а в фоне идёт условная
+  перепроверка (If-None-Match / If-Modified-Since, 304 лишь продлевает запись);
+- без записи или слишком старая — синхронная загрузка; если сеть недоступна, отдаётся
+  любая имеющаяся запись.
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import Request
+
+try:
+    from .settings import documents_dir, APP_FOLDER_NAME
+except ImportError:
+    from core.settings import documents_dir, APP_FOLDER_NAME  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = documents_dir() / APP_FOLDER_NAME / 'cache'
+
+# Имя файла speedtest.net -> ключ документа в кэше
+_DOCUMENTS = {
+    'speedtest-config.php': 'config',
+    'speedtest-servers-static.php': 'servers',
+    'speedtest-servers.php': 'servers',
+}
+
+DEFAULT_TTL = {'config': 3600, 'servers': 24 * 3600}
+DEFAULT_MAX_STALE = 7 * 24 * 3600
+
+
+class _CachedResponse:
+    # Ответ из кэша в объёме, который использует speedtest-cli (read/close/code/headers/geturl)
+
+    def __init__(self, url: str, body: bytes):
+        self._url = url
+        self._stream = BytesIO(body)
+        self.code = 200
+        self.status = 200
+        self.headers: dict = {}
+
+    def read(self, *args):
+        return self._stream.read(*args)
+
+    def close(self):
+        self._stream.close()
+
+    def geturl(self):
+        return self._url
+
+    def info(self):
+        return self.headers
+
+    def getheader(self, name, default=None):
+        # тело хранится распакованным, поэтому Content-Encoding у копии из кэша нет
+        return self.headers.get(name, default)
+
+
+class DocumentCache:
+    """Файловое хранилище документов: `<key>.xml` (тело) и `<key>.json` (время загрузки, валидаторы).
+
+    Args:
+        directory: Каталог кэша
+        ttl: Время жизни по ключам документов, сек
+        max_stale: Максимальный возраст записи, которую можно отдать до фоновой перепроверки, сек
+    """
+
+    def __init__(self, directory: Path = CACHE_DIR, ttl: Optional[dict] = None,
+                 max_stale: float = DEFAULT_MAX_STALE):
+        self.directory = Path(directory)
+        self.ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._refreshing: set = set()
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        return self.directory / f'{key}.xml', self.directory / f'{key}.json'
+
+    def load(self, key: str) -> Tuple[Optional[bytes], dict]:
+        """Прочитать запись: (тело или None, метаданные)."""
+        body_path, meta_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding='utf-8'))
+            return body_path.read_bytes(), meta
+        except Exception:
+            return None, {}
+
+    def store(self, key: str, body: bytes, headers) -> None:
+        """Сохранить тело и валидаторы ответа (атомарная замена файлов)."""
+        meta = {
+            'fetched_at': time.time(),
+            'etag': headers.get('ETag') if headers is not None else None,
+            'last_modified': headers.get('Last-Modified') if headers is not None else None,
+        }
+        self._write(key, body, meta)
+
+    def touch(self, key: str, meta: dict) -> None:
+        """Продлить запись после ответа 304."""
+        body, _ = self.load(key)
+        if body is not None:
+            self._write(key, body, dict(meta, fetched_at=time.time()))
+
+    def _write(self, key: str, body: bytes, meta: dict) -> None:
+        body_path, meta_path = self._paths(key)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                for path, data in ((body_path, body), (meta_path, json.dumps(meta).encode('utf-8'))):
+                    tmp = path.with_suffix(path.suffix + '.tmp')
+                    tmp.write_bytes(data)
+                    os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f'Не удалось записать кэш {key}: {e}')
+
+    def age(self, meta: dict) -> float:
+        return time.time() - float(meta.get('fetched_at', 0) or 0)
+
+    def begin_refresh(self, key: str) -> bool:
+        # Не запускать вторую фоновую перепроверку того же документа
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key: str) -> None:
+        with self._lock:
+            self._refreshing.discard(key)
+
+
+def _read_body(response) -> bytes:
+    # Полное тело ответа с распаковкой gzip (speedtest-cli запрашивает Accept-Encoding: gzip)
+    data = response.read()
+    response.close()
+    headers = getattr(response, 'headers', None)
+    if headers is not None and headers.get('content-encoding') == 'gzip':
+        data = gzip.decompress(data)
+    return data
+
+
+class CachingOpener:
+    """Обёртка OpenerDirector speedtest-cli с кэшированием конфигурации и каталога серверов.
+
+    Остальные запросы проходят к исходному opener без изменений.
+    """
+
+    def __init__(self, opener, cache: DocumentCache):
+        self._opener = opener
+        self._cache = cache
+
+    def open(self, request, *args, **kwargs):
+        key = None
+        if isinstance(request, Request) and request.data is None:
+            key = _DOCUMENTS.get(urlsplit(request.full_url).path.rsplit('/', 1)[-1])
+        if key is None:
+            return self._opener.open(request, *args, **kwargs)
+
+        url = request.full_url
+        body, meta = self._cache.load(key)
+        if body is not None:
+            age = self._cache.age(meta)
+            if age < self._cache.ttl.get(key, 0):
+                logger.debug(f'Кэш {key}: свежая запись ({age:.0f} с)')
+                return _CachedResponse(url, body)
+            if age < self._cache.max_stale:
+                logger.debug(f'Кэш {key}: устаревшая запись ({age:.0f} с), фоновая перепроверка')
+                self._refresh_async(key, request, meta)
+                return _CachedResponse(url, body)
+
+        try:
+            fresh = self._fetch(key, request, meta if body is not None else {})
+        except Exception as e:
+            if body is None:
+                raise
+            logger.warning(f'Не удалось обновить {key} ({e}), использую сохранённую копию')
+            return _CachedResponse(url, body)
+        return _CachedResponse(url, fresh if fresh is not None else body)
+
+    def _fetch(self, key: str, request: Request, meta: dict) -> Optional[bytes]:
+        # Условная загрузка документа. Возвращает новое тело или None, если сервер ответил 304
+        headers = dict(request.header_items())
+        headers.pop('Cache-control', None)
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        try:
+            response = self._opener.open(Request(request.full_url, headers=headers))
+        except HTTPError as e:
+            if e.code == 304:
+                self._cache.touch(key, meta)
+                return None
+            raise
+        body = _read_body(response)
+        if int(getattr(response, 'code', 200)) == 200 and body:
+            self._cache.store(key, body, response.headers)
+        return body
+
+    def _refresh_async(self, key: str, request: Request, meta: dict) -> None:
+        if not self._cache.begin_refresh(key):
+            return
+
+        def _run():
+            try:
+                self._fetch(key, request, meta)
+            except Exception as e:
+                logger.debug(f'Фоновое обновление кэша {key} не удалось: {e}')
+            finally:
+                self._cache.end_refresh(key)
+
+        threading.Thread(target=_run, name=f'cache-refresh-{key}', daemon=True).start()
+
+    def __getattr__(self, name):
+        return getattr(self._opener, name)
+
+
+_cache: Optional[DocumentCache] = None
+
+
+def get_document_cache(settings) -> DocumentCache:
+    """Общий DocumentCache с TTL из настроек (`cache_config_ttl`, `cache_servers_ttl`, `cache_max_stale`)."""
+    global _cache
+    ttl = {
+        'config': float(settings.get('cache_config_ttl', DEFAULT_TTL['config']) or 0),
+        'servers': float(settings.get('cache_servers_ttl', DEFAULT_TTL['servers']) or 0),
+    }
+    max_stale = float(settings.get('cache_max_stale', DEFAULT_MAX_STALE) or 0)
+    if _cache is None:
+        _cache = DocumentCache(CACHE_DIR, ttl, max_stale)
+    else:
+        _cache.ttl.update(ttl)
+        _cache.max_stale = max_stale
+    return _cache
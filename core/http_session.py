@@ -0,0 +1,421 @@
+# coding: utf-8
+"""
+Общая для процесса HTTP-сессия: пул keep-alive соединений, кэш DNS и возобновление TLS-сессий.
+
+Стандартный обработчик urllib (и SpeedtestHTTPHandler из speedtest-cli) закрывает сокет после
+каждого ответа, поэтому каждый запрос конфигурации, каталога серверов, latency.txt и каждый
+download/upload-запрос заново платит DNS, TCP и TLS. HttpSession.opener() строит OpenerDirector
+с тем же набором обработчиков, что speedtest.build_opener, но соединения после полностью
+прочитанного ответа возвращаются в пул и переиспользуются всеми экземплярами Speedtest процесса
+(обычный тест, три прогона точного режима, загрузка списка серверов).
+
+Счётчики попаданий/промахов пула, DNS и TLS доступны через HttpSession.stats(). Наблюдатели сокетов
+(add_socket_observer) получают сокет каждого запроса — так телеметрия TCP_INFO (core/tcp_info.py)
+находит сокеты передачи speedtest-cli. Новые соединения открываются с профилем опций сокета
+(set_socket_profile, core/socket_profile.py).
+"""
+import http.client
+import logging
+import select
+import socket
+import ssl
+import threading
+import time
+import urllib.request
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.error import URLError
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Сколько простаивающих соединений держать на один хост (потоки download speedtest-cli + запас)
+MAX_IDLE_PER_HOST = 16
+# Простаивающее дольше соединение закрывается (серверы обычно рвут keep-alive через 5–60 с)
+IDLE_TIMEOUT = 15.0
+# Время жизни записи кэша DNS, сек (getaddrinfo не сообщает TTL записи)
+DNS_TTL = 300.0
+# Размер блока отправки тела запроса (по умолчанию http.client шлёт по 8 КиБ)
+SEND_BLOCKSIZE = 64 * 1024
+
+_PoolKey = Tuple[str, str, int, Optional[str]]
+
+
+def _is_dead(sock) -> bool:
+    # Простаивающее соединение не должно быть читаемым: EOF или лишние данные — соединение непригодно.
+    # У TLS 1.3 читаемыми бывают служебные записи (NewSessionTicket) — их поглощает recv без данных.
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    if not readable:
+        return False
+    if not isinstance(sock, ssl.SSLSocket):
+        return True
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        sock.recv(1)
+        return True
+    except ssl.SSLWantReadError:
+        return False
+    except OSError:
+        return True
+    finally:
+        sock.settimeout(timeout)
+
+
+class _PooledHTTPConnection(http.client.HTTPConnection):
+    # HTTP-соединение пула: адрес берётся из кэша DNS сессии, Nagle выключен
+
+    def __init__(self, host: str, port: int, session: "HttpSession", timeout: float):
+        super().__init__(host, port, timeout=timeout, blocksize=SEND_BLOCKSIZE)
+        self._session = session
+        self.last_used = 0.0
+
+    def _open_socket(self) -> None:
+        last_err: Optional[OSError] = None
+        profile = self._session.socket_profile
+        addrs = self._session.resolve(self.host, self.port)
+        if profile is not None and profile.family is not None:
+            # source_address привязывает к одному семейству адресов (IPv4 или IPv6)
+            addrs = [a for a in addrs if a[0] == profile.family]
+            if not addrs:
+                raise OSError(f'У {self.host} нет адресов {profile.family_name}')
+        for family, sockaddr in addrs:
+            try:
+                if profile is not None:
+                    sock = profile.create_socket(family)
+                else:
+                    sock = socket.socket(family, socket.SOCK_STREAM)
+            except OSError as e:
+                last_err = e
+                continue
+            try:
+                sock.settimeout(self.timeout)
+                sock.connect(sockaddr)
+            except OSError as e:
+                sock.close()
+                last_err = e
+                continue
+            if profile is None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock = sock
+            self._session.notify_socket(sock)
+            return
+        raise last_err or OSError(f'Не удалось подключиться к {self.host}:{self.port}')
+
+    def connect(self):
+        self._open_socket()
+        if self._tunnel_host:
+            self._tunnel()
+
+
+class _PooledHTTPSConnection(_PooledHTTPConnection):
+    # HTTPS-соединение пула: TLS-сессия предыдущего соединения с тем же хостом возобновляется
+
+    default_port = http.client.HTTPS_PORT
+
+    def connect(self):
+        super().connect()
+        server_hostname = self._tunnel_host or self.host
+        self.sock = self._session.wrap_tls(self.sock, server_hostname)
+
+
+class _PooledResponse:
+    # Ответ, возвращающий соединение в пул после полного чтения тела
+
+    def __init__(self, response: http.client.HTTPResponse, conn: _PooledHTTPConnection,
+                 session: "HttpSession", key: _PoolKey):
+        self._response = response
+        self._conn: Optional[_PooledHTTPConnection] = conn
+        self._session = session
+        self._key = key
+        if response.isclosed():
+            self._finish(True)
+
+    def _finish(self, eof: bool) -> None:
+        # eof — тело прочитано до конца (HTTPResponse закрывается сам при исчерпании длины или
+        # последнем блоке chunked); недочитанный ответ оставил бы в сокете хвост тела
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if eof and not self._response.will_close:
+            self._session.release(self._key, conn)
+        else:
+            conn.close()
+
+    def read(self, *args):
+        data = self._response.read(*args)
+        if self._response.isclosed():
+            self._finish(True)
+        return data
+
+    def readinto(self, b):
+        n = self._response.readinto(b)
+        if self._response.isclosed():
+            self._finish(True)
+        return n
+
+    def close(self):
+        eof = self._response.isclosed()
+        self._response.close()
+        self._finish(eof)
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+class _PooledHandler(urllib.request.AbstractHTTPHandler):
+    # Обработчик http/https для OpenerDirector, работающий через пул сессии
+
+    def __init__(self, session: "HttpSession", timeout: float):
+        super().__init__()
+        self._session = session
+        self._timeout = timeout
+
+    def http_open(self, req):
+        return self._session.open(req, 'http', self._timeout)
+
+    def https_open(self, req):
+        return self._session.open(req, 'https', self._timeout)
+
+    http_request = urllib.request.AbstractHTTPHandler.do_request_
+    https_request = urllib.request.AbstractHTTPHandler.do_request_
+
+
+class HttpSession:
+    """Пул соединений, кэш DNS и кэш TLS-сессий, общие для всех запросов процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle: Dict[_PoolKey, List[_PooledHTTPConnection]] = {}
+        self._dns: Dict[Tuple[str, int], Tuple[float, list]] = {}
+        self._tls_sessions: Dict[str, ssl.SSLSession] = {}
+        self.ssl_context = ssl.create_default_context()
+        self._socket_observers: List[Callable] = []
+        # профиль опций новых сокетов (SocketProfile) или None — системные значения и TCP_NODELAY
+        self.socket_profile = None
+        self._stats = {
+            'pool_hits': 0, 'pool_misses': 0, 'pool_discarded': 0,
+            'dns_hits': 0, 'dns_misses': 0,
+            'tls_resumed': 0, 'tls_full': 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict:
+        """Снимок счётчиков: попадания/промахи пула и DNS, возобновлённые и полные TLS-рукопожатия."""
+        with self._lock:
+            data = dict(self._stats)
+            data['idle_connections'] = sum(len(v) for v in self._idle.values())
+        return data
+
+    def describe(self) -> str:
+        """Счётчики одной строкой для лога."""
+        st = self.stats()
+        return (
+            f"пул {st['pool_hits']} попаданий / {st['pool_misses']} промахов (отброшено {st['pool_discarded']}), "
+            f"DNS {st['dns_hits']} / {st['dns_misses']}, TLS возобновлено {st['tls_resumed']} / полных {st['tls_full']}"
+        )
+
+    def set_socket_profile(self, profile) -> None:
+        """Открывать новые соединения с профилем опций сокета (None — системные значения).
+
+        Простаивающие соединения со старыми опциями закрываются.
+        """
+        if profile == self.socket_profile:
+            return
+        self.socket_profile = profile
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    # Наблюдатели сокетов
+    def add_socket_observer(self, observer: Callable) -> None:
+        """Вызывать observer(sock) для сокета каждого запроса (нового и взятого из пула)."""
+        with self._lock:
+            self._socket_observers.append(observer)
+
+    def remove_socket_observer(self, observer: Callable) -> None:
+        with self._lock:
+            if observer in self._socket_observers:
+                self._socket_observers.remove(observer)
+
+    def notify_socket(self, sock) -> None:
+        observers = self._socket_observers
+        for observer in list(observers) if observers else ():
+            try:
+                observer(sock)
+            except Exception as e:
+                logger.debug(f'Наблюдатель сокетов завершился с ошибкой: {e}')
+
+    # DNS
+    def resolve(self, host: str, port: int) -> list:
+        """Адреса хоста `[(family, sockaddr), ...]` из кэша или getaddrinfo."""
+        key = (host.lower(), int(port))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._dns.get(key)
+            if entry is not None and now - entry[0] < DNS_TTL:
+                self._stats['dns_hits'] += 1
+                return entry[1]
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addrs = [(family, sockaddr) for family, _type, _proto, _canon, sockaddr in infos]
+        with self._lock:
+            self._stats['dns_misses'] += 1
+            self._dns[key] = (now, addrs)
+        return addrs
+
+    # TLS
+    def wrap_tls(self, sock: socket.socket, server_hostname: str) -> ssl.SSLSocket:
+        """Обернуть сокет в TLS, возобновляя сохранённую сессию хоста, если она есть."""
+        with self._lock:
+            cached = self._tls_sessions.get(server_hostname)
+        try:
+            tls = self.ssl_context.wrap_socket(sock, server_hostname=server_hostname, session=cached)
+        except ssl.SSLError:
+            # сохранённая сессия могла стать причиной отказа — следующее соединение выполнит полное рукопожатие
+            with self._lock:
+                self._tls_sessions.pop(server_hostname, None)
+            raise
+        self._count('tls_resumed' if tls.session_reused else 'tls_full')
+        self._remember_tls(server_hostname, tls)
+        return tls
+
+    def _remember_tls(self, server_hostname: str, sock) -> None:
+        session = getattr(sock, 'session', None)
+        if session is not None:
+            with self._lock:
+                self._tls_sessions[server_hostname] = session
+
+    # Пул
+    @staticmethod
+    def _key(scheme: str, host: str, port: Optional[int], tunnel_host: Optional[str] = None) -> _PoolKey:
+        return scheme, host.lower(), int(port or (443 if scheme == 'https' else 80)), tunnel_host
+
+    def acquire(self, scheme: str, host: str, port: Optional[int], timeout: float,
+                tunnel_host: Optional[str] = None) -> Tuple[_PooledHTTPConnection, bool]:
+        """Взять соединение из пула или создать новое.
+
+        Returns:
+            (соединение, True если оно переиспользовано)
+        """
+        key = self._key(scheme, host, port, tunnel_host)
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                conn = idle.pop() if idle else None
+            if conn is None:
+                break
+            if now - conn.last_used > IDLE_TIMEOUT or conn.sock is None or _is_dead(conn.sock):
+                conn.close()
+                self._count('pool_discarded')
+                continue
+            conn.timeout = timeout
+            conn.sock.settimeout(timeout)
+            self._count('pool_hits')
+            return conn, True
+        self._count('pool_misses')
+        cls = _PooledHTTPSConnection if scheme == 'https' else _PooledHTTPConnection
+        return cls(key[1], key[2], self, timeout), False
+
+    def release(self, key: _PoolKey, conn: _PooledHTTPConnection) -> None:
+        """Вернуть соединение с полностью прочитанным ответом в пул."""
+        if conn.sock is None:
+            return
+        if isinstance(conn.sock, ssl.SSLSocket):
+            # у TLS 1.3 билет сессии приходит после рукопожатия — запоминаем актуальный
+            self._remember_tls(key[3] or key[1], conn.sock)
+        conn.last_used = time.monotonic()
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < MAX_IDLE_PER_HOST:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def release_connection(self, scheme: str, conn: _PooledHTTPConnection) -> None:
+        """Вернуть в пул соединение, взятое через acquire без proxy-туннеля."""
+        self.release(self._key(scheme, conn.host, conn.port), conn)
+
+    def open(self, req: urllib.request.Request, scheme: str, timeout: float):
+        """Выполнить запрос urllib через пул (аналог AbstractHTTPHandler.do_open)."""
+        parts = urlsplit(f'//{req.host}')
+        tunnel_host = getattr(req, '_tunnel_host', None)
+        headers = dict(req.unredirected_hdrs)
+        headers.update({k: v for k, v in req.headers.items() if k not in headers})
+        headers['Connection'] = 'keep-alive'
+        headers = {name.title(): val for name, val in headers.items()}
+        tunnel_headers = {}
+        if tunnel_host and 'Proxy-Authorization' in headers:
+            tunnel_headers['Proxy-Authorization'] = headers.pop('Proxy-Authorization')
+        # повтор допустим, только если тело можно отправить заново
+        retriable = req.data is None or isinstance(req.data, (bytes, bytearray))
+
+        for attempt in (0, 1):
+            conn, reused = self.acquire(scheme, parts.hostname or req.host, parts.port, timeout, tunnel_host)
+            if tunnel_host and not reused:
+                conn.set_tunnel(tunnel_host, headers=tunnel_headers)
+            if reused:
+                self.notify_socket(conn.sock)
+            try:
+                conn.request(req.get_method(), req.selector, req.data, headers,
+                             encode_chunked=req.has_header('Transfer-encoding'))
+                r = conn.getresponse()
+            except (ConnectionError, http.client.BadStatusLine) as e:
+                conn.close()
+                # соединение из пула могло быть закрыто сервером между запросами
+                if reused and retriable and attempt == 0:
+                    continue
+                raise URLError(e)
+            except OSError as e:
+                conn.close()
+                raise URLError(e)
+            break
+
+        r.url = req.get_full_url()
+        r.msg = r.reason
+        return _PooledResponse(r, conn, self, self._key(scheme, parts.hostname or req.host, parts.port, tunnel_host))
+
+    def opener(self, timeout: float = 10, user_agent: Optional[str] = None) -> urllib.request.OpenerDirector:
+        """OpenerDirector с набором обработчиков speedtest.build_opener, работающий через пул."""
+        opener = urllib.request.OpenerDirector()
+        if user_agent:
+            opener.addheaders = [('User-agent', user_agent)]
+        for handler in (
+            urllib.request.ProxyHandler(),
+            _PooledHandler(self, timeout),
+            urllib.request.HTTPDefaultErrorHandler(),
+            urllib.request.HTTPRedirectHandler(),
+            urllib.request.HTTPErrorProcessor(),
+        ):
+            opener.add_handler(handler)
+        return opener
+
+    def clear(self) -> None:
+        """Закрыть все простаивающие соединения и сбросить кэши DNS и TLS."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+            self._dns.clear()
+            self._tls_sessions.clear()
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+_session: Optional[HttpSession] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> HttpSession:
+    """Общая HTTP-сессия процесса."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = HttpSession()
+        return _session
@@ -0,0 +1,364 @@
+# coding: utf-8
+"""
+Замер задержки простоя с гистограммой.
+
+`ping_ms` speedtest-cli — медиана трёх запросов latency.txt, у Ookla — одно число из отчёта.
+LatencySampler перед передачей снимает десятки замеров (`latency_samples`) каждым из способов
+`latency_methods` по часам `time.perf_counter_ns`:
+
+- `tcp`  — время установки TCP-соединения;
+- `http` — GET latency.txt по keep-alive соединению (первый запрос прогревочный);
+- `udp`  — эхо пакета от UDP echo-сервера `udp_endpoint` (core/udp_probe.py).
+
+Серверы (тестовый и ещё `latency_servers` − 1 ближайших кандидатов) и способы опрашиваются
+одновременно, поэтому этап длится примерно samples × RTT. Замеры каждой пары сервер/способ
+собираются в LatencyHistogram — гистограмму в духе HdrHistogram: корзины с постоянной
+относительной точностью при точных min/max/среднем/стандартном отклонении.
+"""
+import http.client
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+try:
+    from .server_probe import PROBE_HTTP, PROBE_TCP, _server_address, probe_settings
+    from .udp_probe import HEADER, MAGIC, parse_endpoint
+    from .socket_profile import address_family
+except ImportError:
+    from core.server_probe import PROBE_HTTP, PROBE_TCP, _server_address, probe_settings  # type: ignore
+    from core.udp_probe import HEADER, MAGIC, parse_endpoint  # type: ignore
+    from core.socket_profile import address_family  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+PROBE_UDP = 'udp'
+METHODS = (PROBE_TCP, PROBE_HTTP, PROBE_UDP)
+
+DEFAULT_SAMPLES = 30
+DEFAULT_SERVERS = 3
+DEFAULT_TIMEOUT = 2.0
+# Значащих цифр корзины гистограммы: при 2 относительная ошибка значения не больше 1%
+DEFAULT_SIGNIFICANT_DIGITS = 2
+# Перцентили поля результата
+PERCENTILES = (50, 90, 99)
+
+
+class LatencyHistogram:
+    """Гистограмма задержек в наносекундах (лог-линейные корзины, как у HdrHistogram).
+
+    Значение v попадает в корзину шириной 2^k, где k подобрано так, чтобы ширина не превышала
+    v / 10^significant_digits; корзины хранятся разреженно. min, max, среднее и стандартное
+    отклонение считаются по точным значениям, перцентили — по корзинам (верхняя граница
+    корзины, не больше max).
+
+    Args:
+        significant_digits: Точность корзин в значащих цифрах (1..5)
+    """
+
+    def __init__(self, significant_digits: int = DEFAULT_SIGNIFICANT_DIGITS):
+        self.significant_digits = min(5, max(1, int(significant_digits)))
+        # бит «мантиссы» корзины: ширина корзины не больше 10^-digits от её значения
+        self._sub_bits = math.ceil(math.log2(2 * 10 ** self.significant_digits))
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.lost = 0
+        self.min_ns: Optional[int] = None
+        self.max_ns: Optional[int] = None
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def _key(self, value_ns: int) -> int:
+        # нижняя граница корзины
+        shift = max(0, value_ns.bit_length() - self._sub_bits)
+        return (value_ns >> shift) << shift
+
+    def _upper(self, key: int) -> int:
+        shift = max(0, key.bit_length() - self._sub_bits)
+        return key + (1 << shift) - 1
+
+    def record(self, value_ns: int) -> None:
+        """Учесть значение (нс)."""
+        value_ns = max(0, int(value_ns))
+        key = self._key(value_ns)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.min_ns = value_ns if self.min_ns is None else min(self.min_ns, value_ns)
+        self.max_ns = value_ns if self.max_ns is None else max(self.max_ns, value_ns)
+        # Уэлфорд: дисперсия без хранения значений
+        delta = value_ns - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value_ns - self._mean)
+
+    def record_lost(self) -> None:
+        """Учесть замер без ответа."""
+        self.lost += 1
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        """Добавить значения другой гистограммы (корзины пересчитываются под свою точность)."""
+        for key, n in other.counts.items():
+            mapped = self._key(key)
+            self.counts[mapped] = self.counts.get(mapped, 0) + n
+        if other.count:
+            total = self.count + other.count
+            delta = other._mean - self._mean
+            self._m2 += other._m2 + delta * delta * self.count * other.count / total
+            self._mean += delta * other.count / total
+            self.count = total
+            self.min_ns = other.min_ns if self.min_ns is None else min(self.min_ns, other.min_ns)
+            self.max_ns = other.max_ns if self.max_ns is None else max(self.max_ns, other.max_ns)
+        self.lost += other.lost
+
+    @property
+    def stddev_ns(self) -> float:
+        return math.sqrt(self._m2 / self.count) if self.count else 0.0
+
+    def value_at_percentile(self, q: float) -> int:
+        """Значение перцентиля q (0..100), нс; гистограмма не должна быть пустой."""
+        rank = max(1, math.ceil(q / 100.0 * self.count))
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= rank:
+                return min(self._upper(key), self.max_ns)
+        return self.max_ns
+
+    def to_result(self) -> dict:
+        """Сводка (мс) и непустые корзины `buckets` — [верхняя граница, мс; количество]."""
+        data: dict = {'count': self.count, 'lost': self.lost}
+        if not self.count:
+            return data
+        data.update({
+            'min_ms': round(self.min_ns / 1e6, 3),
+            **{f'p{q}_ms': round(self.value_at_percentile(q) / 1e6, 3) for q in PERCENTILES},
+            'max_ms': round(self.max_ns / 1e6, 3),
+            'mean_ms': round(self._mean / 1e6, 3),
+            'stddev_ms': round(self.stddev_ns / 1e6, 3),
+            'buckets': [[round(self._upper(key) / 1e6, 3), self.counts[key]] for key in sorted(self.counts)],
+        })
+        return data
+
+
+class _Target:
+    # Одна пара сервер/способ: свои соединения и своя гистограмма
+
+    def __init__(self, method: str, host: str, port: int, path: str = '', secure: bool = False,
+                 timeout: float = DEFAULT_TIMEOUT, source_address: str = ''):
+        self.method = method
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secure = secure
+        self.timeout = timeout
+        self.source = (source_address, 0) if source_address else None
+        self.source_address = source_address
+        self.histogram = LatencyHistogram()
+
+    def _tcp(self, count: int, stop: threading.Event) -> None:
+        # адрес разрешается один раз: DNS в замер не входит
+        family = address_family(self.source_address) if self.source_address else None
+        family, stype, proto, _, addr = socket.getaddrinfo(self.host, self.port, family=family or 0,
+                                                           type=socket.SOCK_STREAM)[0]
+        for _ in range(count):
+            if stop.is_set():
+                return
+            sock = socket.socket(family, stype, proto)
+            try:
+                sock.settimeout(self.timeout)
+                if self.source is not None:
+                    sock.bind(self.source)
+                t0 = time.perf_counter_ns()
+                sock.connect(addr)
+                self.histogram.record(time.perf_counter_ns() - t0)
+            except OSError:
+                self.histogram.record_lost()
+            finally:
+                sock.close()
+
+    def _connect_http(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+        conn = cls(self.host, self.port, timeout=self.timeout, source_address=self.source)
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _http(self, count: int, stop: threading.Event) -> None:
+        conn = None
+        stamp = int(time.time() * 1000)
+        # первый запрос каждого соединения прогревочный: в замер не входят DNS и рукопожатия
+        i, warm = 0, False
+        while self.histogram.count + self.histogram.lost < count and not stop.is_set():
+            i += 1
+            try:
+                if conn is None:
+                    conn, warm = self._connect_http(), False
+                t0 = time.perf_counter_ns()
+                conn.request('GET', f'{self.path}?x={stamp}.{i}', headers={'Connection': 'keep-alive'})
+                resp = conn.getresponse()
+                resp.read()
+                rtt = time.perf_counter_ns() - t0
+                if resp.status != 200:
+                    raise ConnectionError(f'latency.txt: HTTP {resp.status}')
+                if warm:
+                    self.histogram.record(rtt)
+                warm = True
+                if resp.will_close:
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException):
+                self.histogram.record_lost()
+                if conn is not None:
+                    conn.close()
+                    conn = None
+        if conn is not None:
+            conn.close()
+
+    def _udp(self, count: int, stop: threading.Event) -> None:
+        family = address_family(self.source_address) if self.source_address else None
+        family, stype, proto, _, addr = socket.getaddrinfo(self.host, self.port, family=family or 0,
+                                                           type=socket.SOCK_DGRAM)[0]
+        token = int.from_bytes(os.urandom(4), 'big')
+        packet = bytearray(HEADER.size)
+        buf = bytearray(HEADER.size)
+        with socket.socket(family, stype, proto) as sock:
+            if self.source_address:
+                sock.bind((self.source_address, 0))
+            sock.connect(addr)
+            for seq in range(count):
+                if stop.is_set():
+                    return
+                t0 = time.perf_counter_ns()
+                HEADER.pack_into(packet, 0, MAGIC, token, seq, t0)
+                sock.send(packet)
+                deadline = t0 + int(self.timeout * 1e9)
+                while True:
+                    left = deadline - time.perf_counter_ns()
+                    if left <= 0:
+                        self.histogram.record_lost()
+                        break
+                    sock.settimeout(left / 1e9)
+                    try:
+                        n = sock.recv_into(buf)
+                    except socket.timeout:
+                        continue
+                    now = time.perf_counter_ns()
+                    if n < HEADER.size:
+                        continue
+                    magic, tok, rseq, _sent = HEADER.unpack_from(buf)
+                    # опоздавшие ответы на предыдущие пакеты пропускаются
+                    if magic == MAGIC and tok == token and rseq == seq:
+                        self.histogram.record(now - t0)
+                        break
+
+    def run(self, count: int, stop: threading.Event) -> None:
+        try:
+            {PROBE_TCP: self._tcp, PROBE_HTTP: self._http, PROBE_UDP: self._udp}[self.method](count, stop)
+        except OSError as e:
+            logger.debug(f'Замер задержки {self.method} {self.host}:{self.port} не удался: {e}')
+            self.histogram.lost += max(0, count - self.histogram.count - self.histogram.lost)
+
+
+class LatencySampler:
+    """Замер задержки простоя несколькими способами до нескольких серверов одновременно.
+
+    Args:
+        servers: Серверы (словари speedtest-cli), первым — сервер теста
+        methods: Способы замера к серверам (`tcp`, `http`); `udp` идёт к udp_endpoint
+        samples: Замеров на каждую пару сервер/способ
+        udp_endpoint: UDP echo-сервер (`host:port`) для способа `udp` ('' — без UDP)
+        timeout: Таймаут одного замера, сек
+        source_address: Локальный адрес соединений ('' — выбирает ОС)
+    """
+
+    def __init__(self, servers: Sequence[dict], methods: Sequence[str] = METHODS, samples: int = DEFAULT_SAMPLES,
+                 udp_endpoint: str = '', timeout: float = DEFAULT_TIMEOUT, source_address: str = ''):
+        self.servers = list(servers)
+        self.methods = [m for m in METHODS if m in methods]
+        self.samples = max(1, int(samples))
+        self.udp_endpoint = udp_endpoint if PROBE_UDP in self.methods else ''
+        self.timeout = float(timeout)
+        self.source_address = source_address
+        # по серверу: {method: _Target}
+        self.targets: List[Dict[str, _Target]] = []
+        for sv in self.servers:
+            host, port, path, secure = _server_address(sv)
+            self.targets.append({
+                m: _Target(m, host, port, path, secure, self.timeout, source_address)
+                for m in self.methods if m != PROBE_UDP and host
+            })
+        self.udp: Optional[_Target] = None
+        if self.udp_endpoint:
+            host, port = parse_endpoint(self.udp_endpoint)
+            self.udp = _Target(PROBE_UDP, host, port, timeout=self.timeout, source_address=source_address)
+
+    def run(self, cancel_event: threading.Event | None = None) -> dict:
+        """Снять замеры и вернуть поле `latency` результата."""
+        jobs = [t for per_server in self.targets for t in per_server.values()]
+        if self.udp is not None:
+            jobs.append(self.udp)
+        stop = cancel_event if cancel_event is not None else threading.Event()
+        if jobs:
+            with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix='latency-sampler') as pool:
+                for fut in [pool.submit(t.run, self.samples, stop) for t in jobs]:
+                    fut.result()
+        return self.to_result()
+
+    def to_result(self) -> dict:
+        servers = []
+        for sv, per_server in zip(self.servers, self.targets):
+            row = {'id': sv.get('id'), 'sponsor': sv.get('sponsor', ''), 'host': sv.get('host', '')}
+            row.update({m: t.histogram.to_result() for m, t in per_server.items()})
+            servers.append(row)
+        data: dict = {'samples': self.samples, 'methods': self.methods, 'servers': servers}
+        if self.udp is not None:
+            data['udp'] = dict(self.udp.histogram.to_result(), endpoint=self.udp_endpoint)
+        return data
+
+
+def ping_from_result(data: dict, method: str) -> Optional[float]:
+    """Медиана задержки до сервера теста способом method (или первым, давшим замеры), мс."""
+    if not data.get('servers'):
+        return None
+    first = data['servers'][0]
+    for m in [method] + [m for m in METHODS if m != method]:
+        if 'p50_ms' in first.get(m, {}):
+            return first[m]['p50_ms']
+    return None
+
+
+def describe(data: dict) -> str:
+    """Краткая сводка для лога: min/p50/p99/σ сервера теста по способам."""
+    parts = []
+    rows = [(m, h) for m, h in (data['servers'][0].items() if data.get('servers') else ()) if m in METHODS]
+    if 'udp' in data:
+        rows.append((PROBE_UDP, data['udp']))
+    for method, h in rows:
+        if 'p50_ms' in h:
+            parts.append(f"{method} min {h['min_ms']:.2f} / p50 {h['p50_ms']:.2f} / p99 {h['p99_ms']:.2f} мс, "
+                         f"σ {h['stddev_ms']:.2f}")
+        else:
+            parts.append(f'{method} нет ответов')
+    return '; '.join(parts) or 'нет замеров'
+
+
+def sampler_from_settings(settings, servers: Sequence[dict], exclude: Sequence[str] = ()) -> Optional[LatencySampler]:
+    """LatencySampler по настройкам (`latency_samples`, `latency_methods`, `latency_servers`, `udp_endpoint`,
+    `source_address`) или None; способы exclude не используются."""
+    samples = int(settings.get('latency_samples', DEFAULT_SAMPLES) or 0)
+    if samples <= 0 or not servers:
+        return None
+    raw = str(settings.get('latency_methods', ','.join(METHODS)) or '')
+    methods = [m.strip().lower() for m in raw.split(',') if m.strip().lower() in METHODS]
+    methods = [m for m in methods if m not in exclude]
+    count = max(1, int(settings.get('latency_servers', DEFAULT_SERVERS) or 1))
+    return LatencySampler(
+        list(servers)[:count],
+        methods=methods or [m for m in (probe_settings(settings)['method'], PROBE_TCP) if m not in exclude][:1],
+        samples=samples,
+        udp_endpoint=str(settings.get('udp_endpoint', '') or '').strip(),
+        source_address=str(settings.get('source_address', '') or '').strip(),
+    )
@@ -0,0 +1,270 @@
+# coding: utf-8
+"""
+Задержка под нагрузкой (bufferbloat).
+
+`ping_ms` speedtest-cli снимается на простаивающем канале до начала передачи. LatencyMonitor
+продолжает мерить задержку до того же сервера в фоне во время download и upload: один
+маленький запрос latency.txt за раз по отдельному keep-alive соединению (или TCP connect
+при `probe_method: tcp`) раз в `interval_ms`. Запросы по несколько десятков байт и не чаще
+нескольких раз в секунду на пропускную способность не влияют.
+
+Результат — распределения задержки по фазам (простой, download, upload) с p50/p90/p99
+и оценка bufferbloat по приросту медианы под нагрузкой к простою.
+"""
+import http.client
+import logging
+import math
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+try:
+    from .server_probe import PROBE_HTTP, PROBE_TCP, _server_address, probe_settings
+    from .bidirectional import PHASE_BIDIRECTIONAL
+except ImportError:
+    from core.server_probe import PROBE_HTTP, PROBE_TCP, _server_address, probe_settings  # type: ignore
+    from core.bidirectional import PHASE_BIDIRECTIONAL  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+PHASE_IDLE = 'idle'
+
+DEFAULT_INTERVAL_MS = 200
+# Замеров простоя перед download
+DEFAULT_IDLE_SAMPLES = 5
+# Таймаут одного замера: ответ дольше считается потерянным
+DEFAULT_TIMEOUT = 2.0
+
+# Оценка по приросту медианы под нагрузкой, мс (верхние границы классов)
+GRADES = (
+    (5.0, 'A+'),
+    (30.0, 'A'),
+    (60.0, 'B'),
+    (200.0, 'C'),
+    (400.0, 'D'),
+)
+GRADE_WORST = 'F'
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль q (0..100) методом ближайшего ранга; values не должен быть пустым."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize_latency(rtts: List[float], lost: int = 0) -> dict:
+    """Распределение задержки фазы: count, lost, min, p50, p90, p99, max (мс)."""
+    data: dict = {'count': len(rtts), 'lost': lost}
+    if rtts:
+        data.update({
+            'min_ms': round(min(rtts), 2),
+            'p50_ms': round(percentile(rtts, 50), 2),
+            'p90_ms': round(percentile(rtts, 90), 2),
+            'p99_ms': round(percentile(rtts, 99), 2),
+            'max_ms': round(max(rtts), 2),
+        })
+    return data
+
+
+def bufferbloat_grade(increase_ms: float) -> str:
+    """Класс bufferbloat (A+ … F) по приросту задержки под нагрузкой."""
+    for bound, grade in GRADES:
+        if increase_ms < bound:
+            return grade
+    return GRADE_WORST
+
+
+class LatencyMonitor:
+    """Фоновый замер задержки до сервера теста с разбивкой по фазам.
+
+    Замеры идут всё время между start() и stop(), но учитываются только в текущей фазе
+    (set_phase); вне фаз монитор простаивает.
+
+    Args:
+        server: Словарь сервера speedtest-cli (нужны `url` или `host`)
+        method: `http` (latency.txt по keep-alive) или `tcp` (время TCP connect)
+        interval_ms: Период замеров
+        timeout: Таймаут одного замера, сек
+        source_address: Локальный адрес соединений замера ('' — выбирает ОС)
+    """
+
+    def __init__(self, server: dict, method: str = PROBE_HTTP, interval_ms: int = DEFAULT_INTERVAL_MS,
+                 timeout: float = DEFAULT_TIMEOUT, source_address: str = ''):
+        self.host, self.port, self.path, self.secure = _server_address(server)
+        self.method = method if method in (PROBE_TCP, PROBE_HTTP) else PROBE_HTTP
+        self.interval_ms = max(10, int(interval_ms))
+        self.timeout = float(timeout)
+        self.source = (source_address, 0) if source_address else None
+        self.rtts: Dict[str, List[float]] = {}
+        self.lost: Dict[str, int] = {}
+        self._phase: Optional[str] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn: Optional[http.client.HTTPConnection] = None
+        self._seq = 0
+
+    # --- замер ---
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+        conn = cls(self.host, self.port, timeout=self.timeout, source_address=self.source)
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _measure_http(self) -> float:
+        if self._conn is None:
+            # соединение открывается вне замера: в задержку не входят DNS и рукопожатия
+            self._conn = self._connect()
+        self._seq += 1
+        t0 = time.perf_counter()
+        self._conn.request('GET', f'{self.path}?x={int(time.time() * 1000)}.{self._seq}',
+                           headers={'Connection': 'keep-alive'})
+        resp = self._conn.getresponse()
+        resp.read()
+        rtt = (time.perf_counter() - t0) * 1000.0
+        if resp.status != 200:
+            raise ConnectionError(f'latency.txt: HTTP {resp.status}')
+        if resp.will_close:
+            self._close()
+        return rtt
+
+    def _measure_tcp(self) -> float:
+        t0 = time.perf_counter()
+        with socket.create_connection((self.host, self.port), timeout=self.timeout, source_address=self.source):
+            return (time.perf_counter() - t0) * 1000.0
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def measure(self) -> Optional[float]:
+        """Один замер задержки, мс; None — ответ не получен за timeout."""
+        try:
+            return self._measure_tcp() if self.method == PROBE_TCP else self._measure_http()
+        except (OSError, http.client.HTTPException) as e:
+            logger.debug(f'Замер задержки под нагрузкой не удался: {e}')
+            self._close()
+            return None
+
+    # --- фоновый цикл ---
+
+    def _record(self, phase: str, rtt: Optional[float]) -> None:
+        with self._lock:
+            if self._phase != phase:
+                # фаза сменилась во время замера — к какой фазе он относится, неизвестно
+                return
+            if rtt is None:
+                self.lost[phase] = self.lost.get(phase, 0) + 1
+            else:
+                self.rtts.setdefault(phase, []).append(rtt)
+            self._wake.notify_all()
+
+    def _loop(self) -> None:
+        step = self.interval_ms / 1000.0
+        while not self._stop.is_set():
+            with self._lock:
+                while self._phase is None and not self._stop.is_set():
+                    self._wake.wait()
+                phase = self._phase
+            if phase is None:
+                break
+            t0 = time.perf_counter()
+            self._record(phase, self.measure())
+            self._stop.wait(max(0.0, step - (time.perf_counter() - t0)))
+        self._close()
+
+    def start(self) -> None:
+        """Запустить фоновый поток (без фазы замеры не идут)."""
+        if self._thread is not None or not self.host:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='loaded-latency', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Остановить фоновый поток."""
+        if self._thread is None:
+            return
+        with self._lock:
+            self._phase = None
+            self._stop.set()
+            self._wake.notify_all()
+        self._thread.join(self.timeout + 1.0)
+        self._thread = None
+
+    def set_phase(self, phase: Optional[str]) -> None:
+        """Начать учитывать замеры в фазе phase (None — приостановить замеры)."""
+        with self._lock:
+            self._phase = phase
+            if phase is not None:
+                self.rtts.setdefault(phase, [])
+            self._wake.notify_all()
+
+    def measure_idle(self, count: int = DEFAULT_IDLE_SAMPLES, cancel_event: threading.Event | None = None) -> None:
+        """Снять count замеров простоя (фаза `idle`) до начала передачи."""
+        if self._thread is None:
+            return
+        self.set_phase(PHASE_IDLE)
+        deadline = time.perf_counter() + count * (self.interval_ms / 1000.0 + self.timeout)
+        with self._lock:
+            while (len(self.rtts.get(PHASE_IDLE, [])) + self.lost.get(PHASE_IDLE, 0) < count
+                   and time.perf_counter() < deadline
+                   and not (cancel_event is not None and cancel_event.is_set())):
+                self._wake.wait(self.interval_ms / 1000.0)
+            self._phase = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_exc):
+        self.stop()
+
+    # --- результат ---
+
+    def to_result(self) -> dict:
+        """Поле `loaded_latency` результата: распределения по фазам и оценка bufferbloat."""
+        with self._lock:
+            phases = {p: summarize_latency(list(v), self.lost.get(p, 0)) for p, v in self.rtts.items()}
+        data: dict = {'method': self.method, 'interval_ms': self.interval_ms}
+        data.update(phases)
+        idle = phases.get(PHASE_IDLE, {}).get('p50_ms')
+        if idle is None:
+            return data
+        increases = {}
+        for phase in ('download', 'upload', PHASE_BIDIRECTIONAL):
+            loaded = phases.get(phase, {}).get('p50_ms')
+            if loaded is not None:
+                increases[f'{phase}_increase_ms'] = round(max(0.0, loaded - idle), 2)
+        if increases:
+            data['bufferbloat'] = dict(increases, grade=bufferbloat_grade(max(increases.values())))
+        return data
+
+    def describe(self) -> str:
+        """Краткая сводка для лога: медианы по фазам и оценка bufferbloat."""
+        data = self.to_result()
+        phases = (PHASE_IDLE, 'download', 'upload', PHASE_BIDIRECTIONAL)
+        parts = [f"{p} p50 {data[p]['p50_ms']:.1f} мс" for p in phases if 'p50_ms' in data.get(p, {})]
+        if 'bufferbloat' in data:
+            parts.append(f"bufferbloat {data['bufferbloat']['grade']}")
+        return ', '.join(parts) or 'нет замеров'
+
+
+def monitor_from_settings(settings, server: dict) -> Optional[LatencyMonitor]:
+    """LatencyMonitor по настройкам (`loaded_latency`, `loaded_latency_interval_ms`, `probe_method`,
+    `source_address`) или None."""
+    if not settings.get('loaded_latency', True):
+        return None
+    interval_ms = int(settings.get('loaded_latency_interval_ms', DEFAULT_INTERVAL_MS) or DEFAULT_INTERVAL_MS)
+    probe = probe_settings(settings)
+    return LatencyMonitor(server, method=probe['method'], interval_ms=interval_ms,
+                          source_address=probe['source_address'])
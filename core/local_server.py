@@ -0,0 +1,451 @@
+# coding: utf-8
+"""
+Локальный сервер legacy-протокола speedtest.net для LAN-тестов и воспроизводимых замеров.
+
+Отдаёт то же, что клиенту нужно от speedtest.net и сервера теста:
+
+- `/speedtest-config.php` — конфигурация (клиент, длительности, число потоков);
+- `/speedtest-servers.php`, `/speedtest-servers-static.php` — каталог из одного сервера (себя);
+- `/speedtest/latency.txt`, `/speedtest/random{N}x{N}.jpg`, `/speedtest/upload.php`;
+- `/speedtest/stats.json` — серверный учёт байт.
+
+Тела download отдаются из заранее подготовленного файла через socket.sendfile (на Linux —
+os.sendfile, без копирования в пространство пользователя), upload читается readinto в буфер
+потока. Отправленные и принятые байты учитываются поинтервально на стороне сервера.
+Профиль канала (core/shaping.py) добавляет ограничение скорости, задержку, джиттер и потери.
+
+Клиент приложения направляется на сервер настройкой `custom_server_url`. Запуск:
+
+    python -m fluent_speedtest serve --host 0.0.0.0 --port 8080 [--shape rate=100,delay=20,jitter=5,loss=0.5]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from xml.sax.saxutils import quoteattr
+
+try:
+    from .udp_probe import UdpEchoServer
+    from .shaping import TCP_MSS, Shaper, ShapingProfile
+except ImportError:
+    from core.udp_probe import UdpEchoServer  # type: ignore
+    from core.shaping import TCP_MSS, Shaper, ShapingProfile  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '0.0.0.0'
+DEFAULT_PORT = 8080
+DEFAULT_SERVER_ID = 1
+DEFAULT_INTERVAL_MS = 100
+# Длительность фаз и потоки в выдаваемой конфигурации (как у типичного ответа speedtest.net)
+DEFAULT_TEST_LENGTH = 10
+
+# Самая большая картинка speedtest-cli — random4000x4000.jpg (4000*4000*2 байт)
+MAX_IMAGE_SIDE = 4000
+PAYLOAD_SIZE = MAX_IMAGE_SIDE * MAX_IMAGE_SIDE * 2
+# Блок sendfile и буфер приёма upload: определяет гранулярность серверного учёта
+SEND_CHUNK = 1024 * 1024
+RECV_CHUNK = 256 * 1024
+# Сколько поинтервальных отсчётов хранить (при 100 мс — час)
+MAX_SAMPLES = 36000
+# Приёмный буфер сокета при ограничении скорости: сколько времени передачи на ограниченной скорости
+# может осесть в буферах до того, как TCP притормозит отправителя, сек
+SHAPED_BUFFER_SECONDS = 0.05
+MIN_SOCKET_BUFFER = 64 * 1024
+
+_RANDOM_RE = re.compile(r'/random(\d+)x(\d+)\.jpg$')
+_SERVER_LISTS = ('/speedtest-servers.php', '/speedtest-servers-static.php')
+
+
+def _build_payload_file() -> str:
+    # Файл с телом самой большой картинки: несжимаемый блок, повторённый до PAYLOAD_SIZE
+    fd, path = tempfile.mkstemp(prefix='speedtest-nextgen-', suffix='.bin')
+    block = os.urandom(SEND_CHUNK)
+    with os.fdopen(fd, 'wb') as f:
+        remaining = PAYLOAD_SIZE
+        while remaining > 0:
+            n = min(remaining, len(block))
+            f.write(block[:n])
+            remaining -= n
+    return path
+
+
+class ByteAccounting:
+    """Поинтервальный учёт отправленных и принятых сервером байт.
+
+    Args:
+        interval_ms: Шаг отсчётов
+    """
+
+    def __init__(self, interval_ms: int = DEFAULT_INTERVAL_MS):
+        self.interval_ms = max(10, int(interval_ms))
+        self.tx_bytes = 0
+        self.rx_bytes = 0
+        self.requests = 0
+        self.samples: deque = deque(maxlen=MAX_SAMPLES)
+        self._taken = (0, 0)
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_tx(self, nbytes: int) -> None:
+        with self._lock:
+            self.tx_bytes += nbytes
+
+    def add_rx(self, nbytes: int) -> None:
+        with self._lock:
+            self.rx_bytes += nbytes
+
+    def add_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def _take(self, now: float) -> None:
+        with self._lock:
+            tx, rx = self.tx_bytes, self.rx_bytes
+        dtx, drx = tx - self._taken[0], rx - self._taken[1]
+        self._taken = (tx, rx)
+        if dtx or drx:
+            # простой не хранится: отсчёты — только интервалы с трафиком
+            self.samples.append([int((now - self._t0) * 1000), dtx, drx])
+
+    def _loop(self) -> None:
+        step = self.interval_ms / 1000.0
+        next_tick = time.perf_counter() + step
+        while not self._stop.wait(max(0.0, next_tick - time.perf_counter())):
+            self._take(next_tick)
+            next_tick += step
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='server-accounting', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._take(time.perf_counter())
+
+    def to_result(self, since_ms: int = 0) -> dict:
+        """Счётчики и отсчёты `[t_ms, tx_bytes, rx_bytes]` (начиная с since_ms)."""
+        with self._lock:
+            data = {
+                'interval_ms': self.interval_ms,
+                'uptime_ms': int((time.perf_counter() - self._t0) * 1000),
+                'requests': self.requests,
+                'tx_bytes': self.tx_bytes,
+                'rx_bytes': self.rx_bytes,
+            }
+        data['samples'] = [s for s in list(self.samples) if s[0] >= since_ms]
+        return data
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'SpeedtestNextGen'
+    # заголовки и короткое тело уходят разными write — без TCP_NODELAY ответ ждёт delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *_args):
+        pass
+
+    def setup(self):
+        super().setup()
+        shaper = self.server.shaper
+        self._down, self._up = shaper.connection_buckets() if shaper is not None else (None, None)
+
+    def _shape_delay(self) -> None:
+        # добавочная задержка ответа (delay ± jitter профиля)
+        if self.server.shaper is not None:
+            delay = self.server.shaper.profile.sample_delay()
+            if delay:
+                time.sleep(delay)
+
+    def _shape(self, buckets, nbytes: int) -> None:
+        for bucket in buckets:
+            if bucket is not None:
+                bucket.consume(nbytes)
+
+    def _chunk(self, default: int) -> int:
+        limit = self.server.shaper.chunk_limit if self.server.shaper is not None else 0
+        return min(default, limit) if limit else default
+
+    # --- маршрутизация ---
+
+    def do_GET(self):
+        self.server.accounting.add_request()
+        self._shape_delay()
+        path = self.path.split('?', 1)[0]
+        if path.endswith('/latency.txt'):
+            self._send_small(b'test=test')
+        elif path.endswith('/speedtest-config.php'):
+            self._send_small(self._config_xml(), 'text/xml')
+        elif path.endswith(_SERVER_LISTS):
+            self._send_small(self._servers_xml(), 'text/xml')
+        elif path.endswith('/stats.json'):
+            since = re.search(r'[?&]since=(\d+)', self.path)
+            body = json.dumps(self.server.accounting.to_result(int(since.group(1)) if since else 0))
+            self._send_small(body.encode(), 'application/json')
+        else:
+            m = _RANDOM_RE.search(path)
+            if m is None:
+                self.send_error(404)
+                return
+            self._send_image(min(int(m.group(1)), MAX_IMAGE_SIDE) * min(int(m.group(2)), MAX_IMAGE_SIDE) * 2)
+
+    def do_POST(self):
+        self.server.accounting.add_request()
+        if not self.path.split('?', 1)[0].endswith('/upload.php'):
+            self.send_error(404)
+            return
+        remaining = int(self.headers.get('Content-Length', '0') or 0)
+        total = 0
+        chunk = self._chunk(RECV_CHUNK)
+        buf = bytearray(chunk)
+        view = memoryview(buf)
+        accounting = self.server.accounting
+        shaper = self.server.shaper
+        buckets = (shaper.up, self._up) if shaper is not None else ()
+        try:
+            while remaining > 0:
+                n = self.rfile.readinto(view[:min(remaining, chunk)])
+                if not n:
+                    break
+                remaining -= n
+                total += n
+                accounting.add_rx(n)
+                self._shape(buckets, n)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+            return
+        self._shape_delay()
+        self._send_small(f'size={total}'.encode())
+
+    # --- ответы ---
+
+    def _send_small(self, body: bytes, content_type: str = 'text/plain'):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_image(self, size: int):
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(size))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        accounting = self.server.accounting
+        shaper = self.server.shaper
+        buckets = (shaper.down, self._down) if shaper is not None else ()
+        chunk = self._chunk(SEND_CHUNK)
+        offset = 0
+        try:
+            with open(self.server.payload_path, 'rb') as f:
+                while offset < size:
+                    n = min(chunk, size - offset)
+                    self._shape(buckets, n)
+                    sent = self.connection.sendfile(f, offset, n)
+                    if not sent:
+                        break
+                    offset += sent
+                    accounting.add_tx(sent)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _config_xml(self) -> bytes:
+        length = self.server.test_length
+        ip = quoteattr(self.client_address[0])
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n<settings>\n'
+            f'<client ip={ip} lat="0" lon="0" isp="LAN" isprating="3.7" rating="0" '
+            'ispdlavg="0" ispulavg="0" loggedin="0" country="" />\n'
+            '<server-config threadcount="4" ignoreids="" notonmap="" forcepingid="" preferredserverid="" />\n'
+            f'<download testlength="{length}" initialtest="250K" mintestsize="250K" threadsperurl="4" />\n'
+            f'<upload testlength="{length}" ratio="5" initialtest="0" mintestsize="32K" threads="2" '
+            'maxchunksize="512K" maxchunkcount="50" threadsperurl="4" />\n'
+            '</settings>\n'
+        ).encode()
+
+    def _servers_xml(self) -> bytes:
+        srv = self.server
+        # адрес — как к серверу обратился клиент, чтобы URL был доступен из его сети
+        host = self.headers.get('Host') or f'{srv.server_address[0]}:{srv.server_address[1]}'
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n<settings>\n<servers>\n'
+            f'<server url={quoteattr(f"http://{host}/speedtest/upload.php")} lat="0" lon="0" '
+            f'name={quoteattr(srv.name)} country="LAN" cc="LAN" sponsor="SpeedtestNextGen" '
+            f'id="{srv.server_id}" host={quoteattr(host)} />\n'
+            '</servers>\n</settings>\n'
+        ).encode()
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # очередь accept по умолчанию (5) переполняют частые соединения замера задержки: SYN уходит на повтор через 1 с
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # клиенты рвут keep-alive соединения по окончании фазы — это штатно
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class _HTTPServer6(_HTTPServer):
+    address_family = socket.AF_INET6
+
+
+class LocalSpeedtestServer:
+    """Сервер legacy-протокола speedtest.net; контекстный менеджер запускает его в фоновом потоке.
+
+    Args:
+        host: Адрес прослушивания
+        port: Порт (0 — выбрать свободный)
+        server_id: ID сервера в выдаваемом каталоге
+        name: Имя сервера в каталоге (по умолчанию — имя хоста)
+        test_length: Длительность фаз в выдаваемой конфигурации, сек
+        interval_ms: Шаг серверного учёта байт
+        profile: Профиль имитируемого канала (None — без ограничений)
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, server_id: int = DEFAULT_SERVER_ID,
+                 name: str | None = None, test_length: int = DEFAULT_TEST_LENGTH,
+                 interval_ms: int = DEFAULT_INTERVAL_MS, profile: ShapingProfile | None = None):
+        self.httpd = (_HTTPServer6 if ':' in host else _HTTPServer)((host, port), _Handler)
+        self.profile = profile if profile is not None and profile.enabled else None
+        self.httpd.shaper = Shaper(self.profile) if self.profile is not None else None
+        if self.profile is not None and self.profile.rate:
+            # без этого принятое осело бы в автоподстраиваемом буфере приёма (мегабайты на loopback)
+            # и upload клиента на ограниченной скорости выглядел бы быстрее
+            size = max(MIN_SOCKET_BUFFER, int(self.profile.rate * 1e6 / 8 * SHAPED_BUFFER_SECONDS))
+            self.httpd.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+            if hasattr(socket, 'TCP_MAXSEG'):
+                # MSS как у Ethernet вместо 64 КиБ loopback: окно перегрузки клиента в байтах, а с ним и
+                # автоподстройка его буфера отправки, остаются соразмерны настоящему каналу
+                try:
+                    self.httpd.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_MAXSEG, TCP_MSS)
+                except OSError:
+                    pass
+        self.httpd.accounting = ByteAccounting(interval_ms)
+        self.httpd.payload_path = _build_payload_file()
+        self.httpd.server_id = int(server_id)
+        self.httpd.name = name or socket.gethostname()
+        self.httpd.test_length = int(test_length)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def accounting(self) -> ByteAccounting:
+        return self.httpd.accounting
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        if host in ('0.0.0.0', '::'):
+            host = '127.0.0.1'
+        return f'http://[{host}]:{port}' if ':' in host else f'http://{host}:{port}'
+
+    @property
+    def upload_url(self) -> str:
+        return f'{self.base_url}/speedtest/upload.php'
+
+    def serve_forever(self) -> None:
+        self.accounting.start()
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.accounting.stop()
+
+    def shutdown(self) -> None:
+        self.httpd.shutdown()
+
+    def close(self) -> None:
+        self.httpd.server_close()
+        try:
+            os.unlink(self.httpd.payload_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='local-speedtest-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_exc):
+        self.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.close()
+
+
+def _report(accounting: ByteAccounting, stop: threading.Event) -> None:
+    # Раз в секунду печатать скорость по серверному учёту, если был трафик
+    last = (0, 0)
+    while not stop.wait(1.0):
+        tx, rx = accounting.tx_bytes, accounting.rx_bytes
+        dtx, drx = tx - last[0], rx - last[1]
+        last = (tx, rx)
+        if dtx or drx:
+            print(f'отдано {dtx * 8 / 1e6:9.1f} Мбит/с | принято {drx * 8 / 1e6:9.1f} Мбит/с', flush=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='fluent_speedtest serve',
+                                     description='Локальный сервер legacy-протокола speedtest.net')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='Адрес прослушивания')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='TCP-порт HTTP (и UDP-порт echo)')
+    parser.add_argument('--server-id', type=int, default=DEFAULT_SERVER_ID, help='ID сервера в каталоге')
+    parser.add_argument('--name', default=None, help='Имя сервера в каталоге')
+    parser.add_argument('--length', type=int, default=DEFAULT_TEST_LENGTH, help='Длительность фаз в конфигурации, сек')
+    parser.add_argument('--interval-ms', type=int, default=DEFAULT_INTERVAL_MS, help='Шаг серверного учёта байт')
+    parser.add_argument('--shape', default='', help='Профиль канала: rate=100,conn_rate=50,delay=20,jitter=5,loss=0.5')
+    parser.add_argument('--no-udp', action='store_true', help='Не запускать UDP echo на том же порту')
+    parser.add_argument('--quiet', action='store_true', help='Не печатать скорость раз в секунду')
+    args = parser.parse_args(argv)
+
+    try:
+        profile = ShapingProfile.parse(args.shape)
+    except ValueError as e:
+        parser.error(str(e))
+    server = LocalSpeedtestServer(args.host, args.port, args.server_id, args.name, args.length, args.interval_ms,
+                                  profile)
+    udp = None if args.no_udp else UdpEchoServer(args.host, server.httpd.server_address[1], profile).__enter__()
+    stop = threading.Event()
+    if not args.quiet:
+        threading.Thread(target=_report, args=(server.accounting, stop), daemon=True).start()
+    print(f'Сервер speedtest: {server.base_url} (custom_server_url)')
+    if server.profile is not None:
+        print(f'Профиль канала: {server.profile.describe()}')
+    if udp is not None:
+        print(f'UDP echo: {udp.endpoint} (udp_endpoint)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        if udp is not None:
+            udp.close()
+        server.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# coding: utf-8
+"""
+Пиковое потребление памяти процесса (RSS) во время фазы теста.
+
+psutil используется, если установлен; иначе RSS читается из /proc/self/statm (Linux) или
+через GetProcessMemoryInfo (Windows). Если ни один способ недоступен, замер пропускается.
+"""
+import os
+import sys
+import threading
+from typing import Optional
+
+try:
+    import psutil  # type: ignore
+except ImportError:  # необязательная зависимость
+    psutil = None
+
+DEFAULT_PERIOD_MS = 20
+
+
+def _rss_windows() -> Optional[int]:
+    import ctypes
+    from ctypes import wintypes
+
+    class _Counters(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+    counters = _Counters()
+    counters.cb = ctypes.sizeof(_Counters)
+    handle = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+        return None
+    return int(counters.WorkingSetSize)
+
+
+def current_rss() -> Optional[int]:
+    """Текущий RSS процесса в байтах или None, если узнать его нельзя."""
+    try:
+        if psutil is not None:
+            return int(psutil.Process().memory_info().rss)
+        if sys.platform.startswith('linux'):
+            with open('/proc/self/statm', 'rb') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        if sys.platform == 'win32':
+            return _rss_windows()
+    except Exception:
+        pass
+    return None
+
+
+class PeakMemoryTracker:
+    """Фоновый опрос RSS с запоминанием пика; используется как контекстный менеджер.
+
+    Args:
+        period_ms: Период опроса
+    """
+
+    def __init__(self, period_ms: int = DEFAULT_PERIOD_MS):
+        self._period = max(1, int(period_ms)) / 1000.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.baseline: Optional[int] = None
+        self.peak: Optional[int] = None
+
+    def _poll(self) -> None:
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self._period):
+            self._poll()
+
+    def start(self) -> None:
+        self.baseline = current_rss()
+        self.peak = self.baseline
+        if self.baseline is None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='memory-peak', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._poll()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_exc):
+        self.stop()
+
+    def to_result(self) -> dict:
+        """Поле результата: RSS до фазы, пиковый RSS и прирост (байты); пусто, если замер недоступен."""
+        if self.baseline is None or self.peak is None:
+            return {}
+        return {
+            'baseline_rss': self.baseline,
+            'peak_rss': self.peak,
+            'peak_delta': max(0, self.peak - self.baseline),
+        }
@@ -0,0 +1,311 @@
+# coding: utf-8
+"""
+Многопроцессный режим передачи для каналов в несколько Гбит/с.
+
+Выше 2–3 Гбит/с один процесс Python упирается в GIL, сколько бы потоков ни было.
+MultiProcessTransferEngine раскладывает потоки download/upload по процессам (по умолчанию
+по одному на ядро). Каждый процесс выполняет AsyncTransferEngine со своей долей потоков и
+пишет накопленные байты в свою ячейку общей памяти (multiprocessing.Array без блокировок:
+у ячейки один писатель). Родитель складывает ячейки и отдаёт сумму в ThroughputSampler,
+поэтому отсчёты, адаптивный режим и формат результата те же, что у остальных движков.
+"""
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import threading
+import time
+from datetime import datetime
+
+try:
+    from .speedtest_client import SpeedtestClient
+    from .sampling import ThroughputSampler, summarize_samples
+    from .async_engine import AsyncTransferEngine, DEFAULT_STREAMS, DEFAULT_DURATION
+    from .memory_monitor import PeakMemoryTracker
+    from .adaptive import phase_duration
+    from .bidirectional import bidirectional_enabled, merge_samples, run_both, summarize as summarize_bidirectional
+    from .bidirectional import describe as describe_bidirectional
+    from .multi_server import summarize as summarize_multi_server, describe as describe_multi_server
+except ImportError:
+    from core.speedtest_client import SpeedtestClient  # type: ignore
+    from core.sampling import ThroughputSampler, summarize_samples  # type: ignore
+    from core.async_engine import AsyncTransferEngine, DEFAULT_STREAMS, DEFAULT_DURATION  # type: ignore
+    from core.memory_monitor import PeakMemoryTracker  # type: ignore
+    from core.adaptive import phase_duration  # type: ignore
+    from core.bidirectional import (  # type: ignore
+        bidirectional_enabled, merge_samples, run_both, summarize as summarize_bidirectional,
+    )
+    from core.bidirectional import describe as describe_bidirectional  # type: ignore
+    from core.multi_server import summarize as summarize_multi_server, describe as describe_multi_server  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Шаг опроса общих счётчиков родителем
+POLL_INTERVAL = 0.02
+# Сколько ждать готовности процессов (запуск интерпретатора и импорт модулей при spawn)
+START_TIMEOUT = 30.0
+# Сколько ждать завершения процессов после остановки фазы
+JOIN_TIMEOUT = 5.0
+
+
+def default_processes() -> int:
+    """По одному процессу на ядро."""
+    return max(1, os.cpu_count() or 1)
+
+
+class _SharedCounter:
+    # «Сэмплер» для AsyncTransferEngine в дочернем процессе: байты — в свою ячейку общей памяти
+
+    def __init__(self, counters, slot: int):
+        self._counters = counters
+        self._slot = slot
+
+    def add(self, nbytes: int) -> None:
+        self._counters[self._slot] += nbytes
+
+    def start_phase(self, _phase: str) -> None:
+        self._counters[self._slot] = 0
+
+    def stop_phase(self) -> None:
+        pass
+
+
+def _worker_main(phase: str, server_url: str, streams: int, duration: float, counters, slot: int,
+                 ready, go, stop_event, socket_profile=None) -> None:
+    # Точка входа дочернего процесса: сообщить о готовности, дождаться общего старта и выполнить фазу
+    engine = AsyncTransferEngine(server_url, streams=streams, duration=duration, cancel_event=stop_event,
+                                 sampler=_SharedCounter(counters, slot), socket_profile=socket_profile)
+    ready.release()
+    if not go.wait(START_TIMEOUT) or stop_event.is_set():
+        return
+    try:
+        asyncio.run(engine.download() if phase == 'download' else engine.upload())
+    except Exception as e:
+        logger.debug(f'Процесс {slot}: фаза {phase} завершилась с ошибкой: {e}')
+
+
+class MultiProcessTransferEngine:
+    """Фазы download/upload, разложенные по процессам.
+
+    Args:
+        server_url: URL upload.php выбранного сервера или список URL нескольких серверов
+            (core/multi_server.py: серверы раздаются процессам по кругу, процессов не меньше серверов)
+        processes: Количество процессов
+        streams: Общее количество потоков (делится между процессами, минимум один на процесс)
+        duration: Длительность фазы, сек
+        cancel_event: Событие отмены
+        sampler: Счётчик поинтервальных отсчётов родителя
+        stop_event: Событие досрочного завершения фазы (адаптивный режим)
+        socket_profile: Опции сокетов соединений процессов (None — системные значения)
+    """
+
+    def __init__(self, server_url: str | list[str], processes: int | None = None, streams: int = DEFAULT_STREAMS,
+                 duration: float = DEFAULT_DURATION, cancel_event: threading.Event | None = None,
+                 sampler: ThroughputSampler | None = None, stop_event: threading.Event | None = None,
+                 socket_profile=None):
+        self.server_urls = [server_url] if isinstance(server_url, str) else list(server_url)
+        self.processes = max(len(self.server_urls), int(processes or default_processes()))
+        self.streams = max(self.processes, int(streams))
+        self.duration = max(1.0, float(duration))
+        self.cancel_event = cancel_event
+        self.sampler = sampler
+        self.stop_event = stop_event
+        self.socket_profile = socket_profile
+        # процессов на каждый сервер и {phase: [{'bytes', 'bps'}, ...]} в порядке server_urls
+        self.server_processes = [len(range(i, self.processes, len(self.server_urls)))
+                                 for i in range(len(self.server_urls))]
+        self.stats: dict = {}
+
+    def _streams_for(self, slot: int) -> int:
+        base, extra = divmod(self.streams, self.processes)
+        return base + (1 if slot < extra else 0)
+
+    def _should_stop(self) -> bool:
+        return ((self.cancel_event is not None and self.cancel_event.is_set())
+                or (self.stop_event is not None and self.stop_event.is_set()))
+
+    def _wait_ready(self, workers, ready, worker_stop) -> None:
+        # Дождаться готовности всех процессов; упавший при запуске процесс не должен держать фазу до таймаута
+        deadline = time.perf_counter() + START_TIMEOUT
+        pending = len(workers)
+        while pending:
+            if ready.acquire(timeout=POLL_INTERVAL * 10):
+                pending -= 1
+                continue
+            if self._should_stop() or time.perf_counter() > deadline or any(w.exitcode for w in workers):
+                worker_stop.set()
+                for w in workers:
+                    w.join(JOIN_TIMEOUT)
+                if self._should_stop():
+                    raise RuntimeError('Отменено пользователем')
+                raise RuntimeError('Процессы передачи не запустились')
+
+    def run_phase(self, phase: str) -> float:
+        """Выполнить фазу и вернуть скорость (бит/с)."""
+        ctx = mp.get_context('spawn')
+        counters = ctx.Array('Q', self.processes, lock=False)
+        ready, go, worker_stop = ctx.Semaphore(0), ctx.Event(), ctx.Event()
+        # запас к длительности: фазу завершает родитель, процессы лишь не должны закончить раньше
+        worker_duration = self.duration + 2 * JOIN_TIMEOUT
+        workers = [
+            ctx.Process(target=_worker_main, name=f'mp-{phase}-{slot}', daemon=True,
+                        args=(phase, self.server_urls[slot % len(self.server_urls)], self._streams_for(slot),
+                              worker_duration, counters, slot, ready, go, worker_stop, self.socket_profile))
+            for slot in range(self.processes)
+        ]
+        if self.stop_event is not None:
+            self.stop_event.clear()
+        for w in workers:
+            w.start()
+        self._wait_ready(workers, ready, worker_stop)
+        go.set()
+
+        if self.sampler is not None:
+            self.sampler.start_phase(phase)
+        start = time.perf_counter()
+        deadline = start + self.duration
+        total = 0
+        try:
+            while time.perf_counter() < deadline and not self._should_stop():
+                time.sleep(POLL_INTERVAL)
+                total = sum(counters)
+                if self.sampler is not None:
+                    self.sampler.set_total(total)
+                if not any(w.is_alive() for w in workers):
+                    break
+        finally:
+            elapsed = time.perf_counter() - start
+            total = sum(counters)
+            if self.sampler is not None:
+                self.sampler.set_total(total)
+                self.sampler.stop_phase()
+            worker_stop.set()
+            for w in workers:
+                w.join(JOIN_TIMEOUT)
+                if w.is_alive():
+                    w.terminate()
+        logger.info(f'{phase}: {self.processes} процессов, {total / 1e6:.1f} МБ за {elapsed:.2f} с')
+        per_server = [sum(counters[i::len(self.server_urls)]) for i in range(len(self.server_urls))]
+        # ошибки дочерних процессов видны только в их логе: сервер без байтов считается неответившим
+        self.stats[phase] = [{'bytes': n, 'bps': (n * 8.0 / elapsed) if elapsed > 0 else 0.0,
+                              'error': None if n else 'сервер не передал данных'} for n in per_server]
+        return (total * 8.0 / elapsed) if elapsed > 0 else 0.0
+
+
+class MultiProcessSpeedtestClient(SpeedtestClient):
+    # Движок 'multiprocess': выбор сервера как у SpeedtestClient, передача — MultiProcessTransferEngine.
+
+    def perform_test(self, cancel_event: threading.Event | None = None, server_id_override: int | None = None,
+                     on_sample=None, on_tcp_info=None):
+        # on_tcp_info не используется: сокеты передачи живут в дочерних процессах
+        logger.info('Инициализация клиента Speedtest (multiprocessing)...')
+        socket_profile = self._socket_profile()
+        s = self._create_speedtest()
+        best = self._select_server(s, server_id_override)
+        servers = self._multi_servers(s, best, cancel_event)
+
+        if cancel_event is not None and cancel_event.is_set():
+            raise RuntimeError('Отменено пользователем')
+
+        processes = int(self.settings.get('mp_processes', 0) or 0) or default_processes()
+        streams = int(self.settings.get('async_streams', DEFAULT_STREAMS) or DEFAULT_STREAMS)
+        duration = float(self.settings.get('async_duration', DEFAULT_DURATION) or DEFAULT_DURATION)
+        stop_event = threading.Event()
+        sampler, hook = self._create_sampler(on_sample, on_stop=lambda _phase, _reason: stop_event.set())
+        engine = MultiProcessTransferEngine([sv['url'] for sv in servers], processes=processes, streams=streams,
+                                            duration=duration, cancel_event=cancel_event, sampler=sampler,
+                                            stop_event=stop_event, socket_profile=socket_profile)
+
+        def _phase(phase: str) -> float:
+            ctl = hook.begin(phase)
+            engine.duration = phase_duration(ctl, duration)
+            if latency is not None:
+                latency.set_phase(phase)
+            try:
+                bps = engine.run_phase(phase)
+            finally:
+                if latency is not None:
+                    latency.set_phase(None)
+            if ctl is None:
+                return bps
+            ctl.finish()
+            return ctl.summary()['measured_bps']
+
+        idle_latency = self._measure_latency(s, best, cancel_event)
+        udp = self._measure_udp(cancel_event)
+        latency = self._start_latency_monitor(best, cancel_event)
+        try:
+            servers_label = f', серверов: {len(servers)}' if len(servers) > 1 else ''
+            logger.info(f'Тест загрузки (download), процессов: {engine.processes}, потоков: {engine.streams}'
+                        f'{servers_label}...')
+            d_bps = _phase('download')
+            if cancel_event is not None and cancel_event.is_set():
+                raise RuntimeError('Отменено пользователем')
+
+            logger.info(f'Тест отдачи (upload), процессов: {engine.processes}, потоков: {engine.streams}'
+                        f'{servers_label}...')
+            with PeakMemoryTracker() as upload_memory:
+                u_bps = _phase('upload')
+
+            bidirectional = None
+            bidir_samplers = (ThroughputSampler(sampler.interval_ms), ThroughputSampler(sampler.interval_ms))
+            # процессы делятся между направлениями, чтобы фаза не занимала вдвое больше ядер
+            bidir_processes = max(1, engine.processes // 2)
+            if bidirectional_enabled(self.settings):
+                down, up = (
+                    MultiProcessTransferEngine(best['url'], processes=bidir_processes, streams=streams,
+                                               duration=duration, cancel_event=cancel_event, sampler=phase_sampler,
+                                               socket_profile=socket_profile)
+                    for phase_sampler in bidir_samplers
+                )
+                bidirectional = self._run_bidirectional(
+                    lambda: run_both(lambda: down.run_phase('download'), lambda: up.run_phase('upload')),
+                    cancel_event, latency)
+        finally:
+            if latency is not None:
+                latency.stop()
+        if cancel_event is not None and cancel_event.is_set():
+            raise RuntimeError('Отменено пользователем')
+
+        result = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'ping_ms': float(s.results.ping),
+            **idle_latency,
+            'download_bps': float(d_bps),
+            'upload_bps': float(u_bps),
+            **udp,
+            'server': {
+                'id': best.get('id'),
+                'sponsor': best.get('sponsor'),
+                'name': best.get('name'),
+                'country': best.get('country'),
+                'host': best.get('host'),
+            },
+            'engine': 'multiprocess',
+            'processes': engine.processes,
+            'streams': engine.streams,
+            'samples': sampler.to_result(),
+        }
+        merge_samples(result['samples'], *bidir_samplers)
+        result['throughput_stats'] = summarize_samples(result['samples'])
+        if hook.enabled:
+            result['adaptive'] = hook.summary()
+        if len(servers) > 1:
+            result['multi_server'] = summarize_multi_server(servers, engine.server_processes, engine.stats,
+                                                              unit='processes')
+            logger.info(f"Разбивка по серверам: {describe_multi_server(result['multi_server'])}")
+        if upload_memory.to_result():
+            # RSS только родителя: буферы дочерних процессов сюда не входят
+            result['upload_memory'] = upload_memory.to_result()
+        if latency is not None:
+            result['loaded_latency'] = latency.to_result()
+            logger.info(f'Задержка под нагрузкой: {latency.describe()}')
+        if socket_profile is not None:
+            result['socket_profile'] = socket_profile.to_result()
+        if bidirectional is not None:
+            result['bidirectional'] = summarize_bidirectional((d_bps, u_bps), bidirectional,
+                                                              result.get('loaded_latency'))
+            result['bidirectional']['processes'] = bidir_processes
+            logger.info(f"Одновременный тест: {describe_bidirectional(result['bidirectional'])}")
+        logger.info('Тест (multiprocessing) завершён успешно')
+        return result
@@ -0,0 +1,86 @@
+# coding: utf-8
+"""
+Тест на нескольких серверах одновременно.
+
+На каналах быстрее, чем способен отдать один сервер speedtest.net, тест к единственному лучшему
+серверу занижает пропускную способность. При `multi_server_count` > 1 к лучшему серверу
+добавляются ещё K−1 ближайших по задержке из того же каталога, что и у
+SpeedtestClient.list_servers (параллельный замер core/server_probe.py), и потоки фаз
+download/upload делятся между ними: движок async ведёт по пулу соединений на сервер
+(MultiServerTransferEngine), движок multiprocess раздаёт серверы процессам по кругу.
+
+Байты каждого сервера считаются отдельно и одновременно идут в общий ThroughputSampler:
+скорость фазы в результате — сумма по серверам, а поле `multi_server` хранит разбивку.
+Сервер, на котором фаза завершилась ошибкой, отмечается в разбивке; фаза падает, только
+если не ответил ни один.
+"""
+from typing import List, Optional, Sequence
+
+PHASES = ('download', 'upload')
+
+
+def multi_server_count(settings) -> int:
+    """Число серверов теста (`multi_server_count`; 1 — обычный тест к одному серверу)."""
+    try:
+        return max(1, int(settings.get('multi_server_count', 1) or 1))
+    except (TypeError, ValueError):
+        return 1
+
+
+def split_streams(streams: int, parts: int) -> List[int]:
+    """Разделить streams потоков на parts частей (минимум один поток на часть)."""
+    parts = max(1, int(parts))
+    base, extra = divmod(max(parts, int(streams)), parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+
+def summarize(servers: Sequence[dict], streams: Sequence[int], stats: dict, unit: str = 'streams') -> dict:
+    """Поле `multi_server` результата.
+
+    Args:
+        servers: Описания серверов (словари speedtest-cli), первым — лучший
+        streams: Потоков (у multiprocess — процессов) на каждый сервер
+        unit: Имя поля для streams в строке сервера ('streams' | 'processes')
+        stats: {phase: [{'bytes', 'bps', 'error', 'autotune'}, ...]} в порядке servers
+    """
+    rows = []
+    for i, sv in enumerate(servers):
+        row = {
+            'id': int(sv['id']) if sv.get('id') is not None else None,
+            'sponsor': sv.get('sponsor', ''),
+            'name': sv.get('name', ''),
+            'country': sv.get('country', ''),
+            'host': sv.get('host', ''),
+            'latency_ms': round(float(sv['latency']), 2) if sv.get('latency') is not None else None,
+            unit: streams[i],
+        }
+        for phase in PHASES:
+            phase_stats = stats.get(phase)
+            if not phase_stats:
+                continue
+            total = sum(st['bps'] for st in phase_stats)
+            st = phase_stats[i]
+            row[phase] = {
+                'bps': float(st['bps']),
+                'bytes': int(st['bytes']),
+                'share_pct': round(100.0 * st['bps'] / total, 1) if total > 0 else None,
+            }
+            if st.get('autotune'):
+                row[phase]['autotune'] = st['autotune']
+            if st.get('error'):
+                row[phase]['error'] = st['error']
+        rows.append(row)
+    return {'count': len(rows), 'servers': rows}
+
+
+def describe(data: dict) -> str:
+    """Краткая сводка для лога: скорость каждого сервера по фазам."""
+    parts = []
+    for row in data['servers']:
+        speeds = []
+        for phase in PHASES:
+            info: Optional[dict] = row.get(phase)
+            if info is not None:
+                speeds.append(f"{phase} {info['bps'] / 1e6:.1f}" + (' (ошибка)' if info.get('error') else ''))
+        parts.append(f"{row['sponsor'] or row['host']} [{', '.join(speeds)} Мбит/с]")
+    return '; '.join(parts)
@@ -0,0 +1,359 @@
+# coding: utf-8
+"""
+Тест по нескольким путям: локальным интерфейсам, адресам и семействам адресов (IPv4 против IPv6).
+
+Обычный тест идёт тем маршрутом, который выбрала ОС. Здесь для каждого пути из настройки
+`multipath_paths` выполняется полный тест (задержка, UDP-замер, download, upload), все соединения
+которого привязаны к локальному адресу пути (`source_address` профиля сокетов, core/socket_profile.py):
+
+- `ipv4` / `ipv6` — только соответствующее семейство (привязка к `0.0.0.0` / `::`);
+- IP-адрес — привязка к нему (семейство — по адресу);
+- имя интерфейса (`eth0`, `eth0/ipv6`) — его IPv4-адрес (или IPv6, кроме link-local, с суффиксом `/ipv6`).
+
+Пути проходятся по очереди или одновременно (`multipath_concurrent`, каждый путь — в своём процессе:
+общая HTTP-сессия с профилем сокетов одна на процесс). Результат — запись на каждый путь и запись
+сравнения; все они получают общий `test_id`, по которому их можно связать в истории.
+"""
+import logging
+import multiprocessing as mp
+import queue
+import socket
+import sys
+import threading
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+try:
+    import psutil  # type: ignore
+except ImportError:  # необязательная зависимость
+    psutil = None
+
+try:
+    from .socket_profile import address_family
+except ImportError:
+    from core.socket_profile import address_family  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+PATH_IPV4 = 'ipv4'
+PATH_IPV6 = 'ipv6'
+_WILDCARD = {PATH_IPV4: '0.0.0.0', PATH_IPV6: '::'}
+_FAMILY_NAMES = {socket.AF_INET: PATH_IPV4, socket.AF_INET6: PATH_IPV6}
+
+# Период проверки отмены при одновременном прогоне, сек
+_JOIN_STEP = 0.1
+# Сколько ждать процессы путей после отмены, сек
+_CANCEL_GRACE = 10.0
+
+
+def _linux_ipv4(name: str) -> Optional[str]:
+    # IPv4-адрес интерфейса через ioctl SIOCGIFADDR
+    import fcntl
+    import struct
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            data = fcntl.ioctl(sock.fileno(), 0x8915, struct.pack('256s', name.encode()[:15]))
+        except OSError:
+            return None
+    return socket.inet_ntoa(data[20:24])
+
+
+def _linux_ipv6(name: str) -> Optional[str]:
+    # IPv6-адрес интерфейса, кроме link-local (scope 20), из /proc/net/if_inet6
+    # (поля: адрес, индекс, префикс, scope, флаги, имя)
+    try:
+        with open('/proc/net/if_inet6', encoding='ascii') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 6 and parts[5] == name and parts[3] != '20':
+            return socket.inet_ntop(socket.AF_INET6, bytes.fromhex(parts[0]))
+    return None
+
+
+def interface_addresses(name: str) -> Dict[int, str]:
+    """Адреса интерфейса: {AF_INET: IPv4, AF_INET6: IPv6 кроме link-local} (отсутствующие семейства пропущены).
+
+    Raises:
+        ValueError: адреса интерфейса не определить (нет интерфейса или нужен psutil)
+    """
+    found: Dict[int, str] = {}
+    if psutil is not None:
+        addrs = psutil.net_if_addrs().get(name)
+        if addrs is None:
+            raise ValueError(f'Интерфейс {name!r} не найден')
+        for addr in addrs:
+            ip = addr.address.split('%', 1)[0]
+            if addr.family == socket.AF_INET6 and ip.lower().startswith('fe80'):
+                continue  # link-local без scope id не годится для привязки
+            if addr.family in (socket.AF_INET, socket.AF_INET6):
+                found.setdefault(addr.family, ip)
+        return found
+    if not sys.platform.startswith('linux'):
+        raise ValueError(f'Для путей по имени интерфейса ({name!r}) нужен psutil')
+    if name not in {n for _, n in socket.if_nameindex()}:
+        raise ValueError(f'Интерфейс {name!r} не найден')
+    for family, reader in ((socket.AF_INET, _linux_ipv4), (socket.AF_INET6, _linux_ipv6)):
+        ip = reader(name)
+        if ip:
+            found[family] = ip
+    return found
+
+
+class NetworkPath:
+    """Путь теста: подпись и локальный адрес привязки.
+
+    Args:
+        label: Подпись пути в результате (как задана в настройке)
+        source_address: Локальный адрес (`0.0.0.0` / `::` — только семейство)
+        interface: Имя интерфейса, если путь задан через него
+    """
+
+    def __init__(self, label: str, source_address: str, interface: str = ''):
+        self.label = label
+        self.source_address = source_address
+        self.interface = interface
+
+    @classmethod
+    def parse(cls, spec: str) -> 'NetworkPath':
+        """Путь из строки `ipv4`, `ipv6`, IP-адреса или `интерфейс[/ipv4|/ipv6]`.
+
+        Raises:
+            ValueError: путь не распознан или у интерфейса нет адреса нужного семейства
+        """
+        spec = spec.strip()
+        key = spec.lower()
+        if key in _WILDCARD:
+            return cls(key, _WILDCARD[key])
+        if address_family(spec) is not None:
+            return cls(spec, spec)
+        name, _, want = spec.partition('/')
+        want = want.lower()
+        if want and want not in _WILDCARD:
+            raise ValueError(f'Неизвестное семейство адресов в пути {spec!r} (ожидается ipv4 или ipv6)')
+        addrs = interface_addresses(name)
+        if want:
+            family = socket.AF_INET if want == PATH_IPV4 else socket.AF_INET6
+        else:
+            family = socket.AF_INET if socket.AF_INET in addrs else socket.AF_INET6
+        if family not in addrs:
+            raise ValueError(f'У интерфейса {name!r} нет адреса {_FAMILY_NAMES[family]}')
+        return cls(spec, addrs[family], interface=name)
+
+    @property
+    def family(self) -> Optional[int]:
+        return address_family(self.source_address)
+
+    def to_result(self) -> dict:
+        """Поле `path` результата пути."""
+        data = {
+            'label': self.label,
+            'family': _FAMILY_NAMES.get(self.family, ''),
+            'source_address': self.source_address,
+        }
+        if self.interface:
+            data['interface'] = self.interface
+        return data
+
+
+def paths_from_settings(settings) -> List[NetworkPath]:
+    """Пути из настройки `multipath_paths` (строка через запятую или список); пустой список — режим выключен.
+
+    Raises:
+        ValueError: путь не распознан
+    """
+    raw = settings.get('multipath_paths', '') or ''
+    specs = raw.split(',') if isinstance(raw, str) else [str(x) for x in raw]
+    return [NetworkPath.parse(spec) for spec in specs if spec.strip()]
+
+
+def _settings_dict(settings) -> dict:
+    # Снимок настроек: SettingsManager (core/settings.py) или обычный словарь
+    return settings.as_dict() if hasattr(settings, 'as_dict') else dict(settings)
+
+
+def _path_settings(settings, path: NetworkPath) -> dict:
+    # Настройки прогона одного пути: привязка к его адресу, без вложенного режима нескольких путей
+    return dict(_settings_dict(settings), source_address=path.source_address, multipath_paths='')
+
+
+def _run_path(client_factory: Callable, settings: dict, path: NetworkPath, cancel_event,
+              server_id_override: int | None, on_sample=None, on_tcp_info=None) -> dict:
+    client = client_factory(str(settings.get('engine', 'python')))
+    client.settings = _path_settings(settings, path)
+    return client.perform_test(cancel_event=cancel_event, server_id_override=server_id_override,
+                               on_sample=on_sample, on_tcp_info=on_tcp_info)
+
+
+def _path_main(client_factory: Callable, settings: dict, path: NetworkPath, cancel_event,
+               server_id_override: int | None, index: int, results) -> None:
+    # Точка входа процесса пути при одновременном прогоне: результат или текст ошибки в очередь
+    try:
+        results.put((index, _run_path(client_factory, settings, path, cancel_event, server_id_override), None))
+    except Exception as e:
+        results.put((index, None, str(e) or e.__class__.__name__))
+
+
+def compare_paths(records: List[dict], concurrent: bool) -> dict:
+    """Поле `multipath` записи сравнения по результатам путей (записи с ошибкой содержат `error`)."""
+    rows = []
+    for record in records:
+        row = {'path': record['path']}
+        if 'error' in record:
+            row['error'] = record['error']
+        else:
+            row.update({
+                'ping_ms': record.get('ping_ms'),
+                'download_bps': record.get('download_bps'),
+                'upload_bps': record.get('upload_bps'),
+                'server_id': (record.get('server') or {}).get('id'),
+            })
+            for key in ('jitter_ms', 'packet_loss_pct'):
+                if record.get(key) is not None:
+                    row[key] = record[key]
+        rows.append(row)
+    measured = [r for r in rows if 'error' not in r]
+    data: dict = {'mode': 'concurrent' if concurrent else 'sequential', 'paths': rows}
+    if not measured:
+        return data
+    best = max(measured, key=lambda r: r['download_bps'] + r['upload_bps'])
+    data['best'] = best['path']['label']
+    for row in measured:
+        # доля от лучшего пути по каждому направлению
+        for key in ('download_bps', 'upload_bps'):
+            row[key.replace('_bps', '_ratio')] = round(row[key] / best[key], 3) if best[key] else None
+    if concurrent:
+        data['total_download_bps'] = sum(r['download_bps'] for r in measured)
+        data['total_upload_bps'] = sum(r['upload_bps'] for r in measured)
+    return data
+
+
+class MultipathTest:
+    """Полный тест по каждому пути и запись сравнения.
+
+    Args:
+        client_factory: Создание клиента по имени движка (core/worker.py: create_client)
+        settings: Настройки теста (движок и прочее); `source_address` каждого пути подставляется сам
+        paths: Пути теста
+        concurrent: Прогонять пути одновременно (каждый в своём процессе), иначе по очереди
+    """
+
+    def __init__(self, client_factory: Callable, settings, paths: List[NetworkPath], concurrent: bool = False):
+        self.client_factory = client_factory
+        self.settings = _settings_dict(settings)
+        self.paths = list(paths)
+        self.concurrent = bool(concurrent) and len(self.paths) > 1
+        self.test_id = uuid.uuid4().hex
+
+    def _sequential(self, cancel_event, server_id_override, on_sample, on_tcp_info) -> List[tuple]:
+        outcomes = []
+        for i, path in enumerate(self.paths):
+            if cancel_event is not None and cancel_event.is_set():
+                raise RuntimeError('Отменено пользователем')
+            logger.info(f'[{i + 1}/{len(self.paths)}] Путь {path.label} (адрес {path.source_address})...')
+            try:
+                outcomes.append((_run_path(self.client_factory, self.settings, path, cancel_event,
+                                           server_id_override, on_sample, on_tcp_info), None))
+            except Exception as e:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise
+                logger.warning(f'Путь {path.label}: {e}')
+                outcomes.append((None, str(e) or e.__class__.__name__))
+        return outcomes
+
+    def _concurrent(self, cancel_event, server_id_override) -> List[tuple]:
+        ctx = mp.get_context('spawn')
+        results, stop = ctx.Queue(), ctx.Event()
+        logger.info(f'Одновременный тест {len(self.paths)} путей: {", ".join(p.label for p in self.paths)}...')
+        workers = [
+            ctx.Process(target=_path_main, name=f'path-{i}',
+                        args=(self.client_factory, self.settings, path, stop, server_id_override, i, results))
+            for i, path in enumerate(self.paths)
+        ]
+        for proc in workers:
+            proc.start()
+        outcomes: Dict[int, tuple] = {}
+        try:
+            while len(outcomes) < len(workers):
+                if cancel_event is not None and cancel_event.is_set():
+                    stop.set()
+                try:
+                    index, result, error = results.get(timeout=_JOIN_STEP)
+                except queue.Empty:
+                    if not any(p.is_alive() for p in workers) and results.empty():
+                        break  # процесс упал, не успев ответить
+                    continue
+                outcomes[index] = (result, error)
+        finally:
+            for proc in workers:
+                proc.join(timeout=_CANCEL_GRACE if stop.is_set() else None)
+                if proc.is_alive():
+                    proc.terminate()
+        if cancel_event is not None and cancel_event.is_set():
+            raise RuntimeError('Отменено пользователем')
+        return [outcomes.get(i, (None, 'процесс пути завершился без результата')) for i in range(len(workers))]
+
+    def run(self, cancel_event: threading.Event | None = None, server_id_override: int | None = None,
+            on_sample=None, on_tcp_info=None) -> List[dict]:
+        """Выполнить тест по всем путям.
+
+        Живые отсчёты (on_sample, on_tcp_info) передаются клиентам только при прогоне по очереди.
+
+        Returns:
+            Записи путей (успешные — результаты perform_test, неудачные — с полем `error`) и последней —
+            запись сравнения; у всех общий `test_id`
+        """
+        if self.concurrent:
+            outcomes = self._concurrent(cancel_event, server_id_override)
+        else:
+            outcomes = self._sequential(cancel_event, server_id_override, on_sample, on_tcp_info)
+        timestamp = datetime.now().isoformat(timespec='seconds')
+        records = []
+        for path, (result, error) in zip(self.paths, outcomes):
+            record = result if result is not None else {'timestamp': timestamp, 'error': error}
+            record['test_id'] = self.test_id
+            record['path'] = path.to_result()
+            records.append(record)
+        comparison = compare_paths(records, self.concurrent)
+        if 'best' not in comparison:
+            raise RuntimeError('Ни один путь не дал результата: ' +
+                               '; '.join(f"{r['path']['label']}: {r['error']}" for r in records))
+        best = next(r for r in records if r['path']['label'] == comparison['best'])
+        records.append({
+            'timestamp': timestamp,
+            'test_id': self.test_id,
+            # карточки и история показывают лучший путь; все пути — в поле multipath
+            'ping_ms': best['ping_ms'],
+            'download_bps': best['download_bps'],
+            'upload_bps': best['upload_bps'],
+            'server': best.get('server', {}),
+            'aggregate': True,
+            'multipath': comparison,
+        })
+        return records
+
+    def describe(self, records: List[dict]) -> str:
+        """Краткая сводка для лога по записи сравнения."""
+        parts = []
+        for row in records[-1]['multipath']['paths']:
+            if 'error' in row:
+                parts.append(f"{row['path']['label']}: ошибка")
+            else:
+                parts.append(f"{row['path']['label']}: ping {row['ping_ms']:.0f} мс, "
+                             f"{row['download_bps'] / 1e6:.1f}/{row['upload_bps'] / 1e6:.1f} Мбит/с")
+        return '; '.join(parts)
+
+
+def multipath_from_settings(client_factory: Callable, settings) -> Optional[MultipathTest]:
+    """MultipathTest по настройкам (`multipath_paths`, `multipath_concurrent`) или None (режим выключен).
+
+    Raises:
+        ValueError: путь из настроек не распознан
+    """
+    paths = paths_from_settings(settings)
+    if not paths:
+        return None
+    return MultipathTest(client_factory, settings, paths, concurrent=bool(settings.get('multipath_concurrent', False)))
@@ -10,8 +10,20 @@ from typing import Optional
 
 try:
     from .settings import get_settings
+    from .sampling import ThroughputSampler, summarize_samples, DEFAULT_INTERVAL_MS
+    from .bidirectional import bidirectional_enabled
+    from .multi_server import multi_server_count
+    from .latency_sampler import PROBE_HTTP, sampler_from_settings as latency_sampler_from_settings
+    from .latency_sampler import describe as describe_latency
 except ImportError:
     from core.settings import get_settings  # type: ignore
+    from core.sampling import ThroughputSampler, summarize_samples, DEFAULT_INTERVAL_MS  # type: ignore
+    from core.bidirectional import bidirectional_enabled  # type: ignore
+    from core.multi_server import multi_server_count  # type: ignore
+    from core.latency_sampler import (  # type: ignore
+        PROBE_HTTP, sampler_from_settings as latency_sampler_from_settings,
+    )
+    from core.latency_sampler import describe as describe_latency  # type: ignore
 
 
 logger = logging.getLogger(__name__)
@@ -26,6 +38,8 @@ class OoklaCliClient:
       'ping_ms': float,
       'download_bps': float,
       'upload_bps': float,
+      'jitter_ms': float,         # ping.jitter (если есть)
+      'packet_loss_pct': float,   # packetLoss (если сервер его мерил)
       'server': {
         'id': int | str,
         'sponsor': str,   # провайдер (из поля name у Ookla)
@@ -54,13 +68,50 @@ class OoklaCliClient:
             self._resolve_binary(),
             '--accept-license',
             '--accept-gdpr',
-            '--format=json',
+            '--format=jsonl',
+            '--progress=yes',
         ]
         if server_id:
             cmd.extend(['--server-id', str(server_id)])
+        source = str(self.settings.get('source_address', '') or '').strip()
+        if source and source not in ('0.0.0.0', '::'):
+            # остальные опции сокетов speedtest.exe не принимает; выбор только семейства адресов — тоже
+            cmd.append(f'--ip={source}')
         return cmd
 
-    def perform_test(self, cancel_event: threading.Event | None = None, server_id_override: int | None = None) -> dict:
+    @staticmethod
+    def _feed_progress(data: dict, sampler: ThroughputSampler) -> None:
+        # Событие прогресса jsonl: {"type": "download", "download": {"bytes": ..., "elapsed": ...}, ...}
+        kind = data.get('type')
+        if kind in ('download', 'upload'):
+            section = data.get(kind) or {}
+            if sampler.phase != kind:
+                sampler.start_phase(kind)
+            try:
+                sampler.set_total(int(section.get('bytes', 0) or 0))
+            except Exception:
+                pass
+        elif kind == 'result':
+            sampler.stop_phase()
+
+    def _measure_latency(self, result: dict, cancel_event: threading.Event | None = None) -> None:
+        # Гистограммы задержки (core/latency_sampler.py) до сервера Ookla уже после теста — выбор сервера
+        # и ping выполняет speedtest.exe. ping_ms остаётся из отчёта Ookla; latency.txt у новых серверов нет,
+        # поэтому способ http пропускается.
+        try:
+            servers = [result['server']] if result['server']['host'] else []
+            sampler = latency_sampler_from_settings(self.settings, servers, exclude=(PROBE_HTTP,))
+            if sampler is None:
+                return
+            result['latency'] = sampler.run(cancel_event)
+        except (OSError, ValueError) as e:
+            logger.warning(f'Замер задержки не выполнен: {e}')
+            return
+        logger.info(f"Задержка: {describe_latency(result['latency'])}")
+
+    def perform_test(self, cancel_event: threading.Event | None = None, server_id_override: int | None = None,
+                     on_sample=None, on_tcp_info=None) -> dict:
+        # on_tcp_info не используется: сокеты принадлежат speedtest.exe
         # Определяем сервер
         server_id = server_id_override if server_id_override is not None else self.settings.get('server_id', None)
         try:
@@ -73,6 +124,12 @@ class OoklaCliClient:
         timeout_sec =  int(self.settings.get('ookla_timeout', 90) or 90)
 
         logger.info('Инициализация клиента Ookla Speedtest CLI...')
+        if bidirectional_enabled(self.settings):
+            logger.warning('Одновременный тест download + upload движок ookla не поддерживает — '
+                           'выполняется обычный тест')
+        if multi_server_count(self.settings) > 1:
+            logger.warning('Тест на нескольких серверах движок ookla не поддерживает — '
+                           'выполняется тест к одному серверу')
         logger.info('Запуск теста через Ookla CLI...')
 
         # Старт процесса
@@ -80,6 +137,9 @@ class OoklaCliClient:
         if os.name == 'nt' and hasattr(subprocess, 'CREATE_NO_WINDOW'):
             creationflags = subprocess.CREATE_NO_WINDOW  # скрыть консоль на Windows
 
+        interval_ms = int(self.settings.get('sample_interval_ms', DEFAULT_INTERVAL_MS) or DEFAULT_INTERVAL_MS)
+        sampler = ThroughputSampler(interval_ms, on_sample=on_sample)
+
         proc = subprocess.Popen(
             cmd,
             stdout=subprocess.PIPE,
@@ -103,13 +163,49 @@ class OoklaCliClient:
             cancel_thread = threading.Thread(target=_watch_cancel, name='ookla-cancel-watch', daemon=True)
             cancel_thread.start()
 
-        try:
-            stdout, stderr = proc.communicate(timeout=timeout_sec)
-        except subprocess.TimeoutExpired:
+        # stderr читаем в отдельном потоке, чтобы канал не переполнился, пока разбираем stdout построчно
+        stderr_parts: list[str] = []
+        stderr_thread = threading.Thread(target=lambda: stderr_parts.append(proc.stderr.read() or ''),
+                                         name='ookla-stderr', daemon=True)
+        stderr_thread.start()
+
+        # Сторожевой таймер вместо communicate(timeout=...): вывод читается по мере поступления
+        timed_out = threading.Event()
+
+        def _on_timeout():
+            timed_out.set()
             try:
                 proc.kill()
             except Exception:
                 pass
+        timer = threading.Timer(timeout_sec, _on_timeout)
+        timer.daemon = True
+        timer.start()
+
+        # Разбор jsonl: события прогресса питают отсчёты, итоговой считается строка type=result
+        data_line = ''
+        last_line = ''
+        try:
+            for line in proc.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                last_line = line
+                try:
+                    event = json.loads(line)
+                except Exception:
+                    continue
+                if event.get('type') == 'result':
+                    data_line = line
+                self._feed_progress(event, sampler)
+            proc.wait()
+        finally:
+            timer.cancel()
+            sampler.stop_phase()
+        stderr_thread.join(timeout=1.0)
+        stderr = ''.join(stderr_parts)
+
+        if timed_out.is_set():
             raise RuntimeError(f"Таймаут выполнения Ookla CLI ({timeout_sec} сек)")
 
         if cancel_event is not None and cancel_event.is_set():
@@ -117,16 +213,11 @@ class OoklaCliClient:
 
         # Проверка кода возврата
         if proc.returncode != 0:
-            err = (stderr or '').strip() or (stdout or '').strip()
+            err = (stderr or '').strip() or last_line
             raise RuntimeError(f"Ошибка запуска Ookla CLI: {err}")
 
-        # Извлекаем JSON (на всякий случай берём последнюю непустую строку)
-        data_line = ''
-        for line in (stdout or '').splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            data_line = line
+        # Если события result нет (старые версии CLI) — берём последнюю непустую строку
+        data_line = data_line or last_line
         if not data_line:
             raise RuntimeError('Пустой вывод от Ookla CLI — нет данных JSON')
 
@@ -160,6 +251,18 @@ class OoklaCliClient:
         except Exception:
             ping_ms = 0.0
 
+        # Джиттер и потери пакетов Ookla мерит сам (UDP); packetLoss бывает не у всех серверов
+        udp = {}
+        try:
+            jitter = ((data or {}).get('ping') or {}).get('jitter')
+            if jitter is not None:
+                udp['jitter_ms'] = float(jitter)
+            loss = (data or {}).get('packetLoss')
+            if loss is not None:
+                udp['packet_loss_pct'] = float(loss)
+        except Exception:
+            pass
+
         download_bps = to_bps((data or {}).get('download') or {})
         upload_bps = to_bps((data or {}).get('upload') or {})
 
@@ -177,6 +280,7 @@ class OoklaCliClient:
             'ping_ms': ping_ms,
             'download_bps': download_bps,
             'upload_bps': upload_bps,
+            **udp,
             'server': {
                 'id': srv.get('id'),
                 'sponsor': srv.get('name') or '',
@@ -185,7 +289,10 @@ class OoklaCliClient:
                 'host': host,
             },
             'engine': 'ookla',
+            'samples': sampler.to_result(),
         }
+        result['throughput_stats'] = summarize_samples(result['samples'])
+        self._measure_latency(result, cancel_event)
 
         logger.info('Тест (Ookla CLI) завершён успешно')
         return result
@@ -0,0 +1,173 @@
+# coding: utf-8
+"""
+Буферы передачи без копирования для движка speedtest-cli.
+
+Upload: speedtest-cli для каждого запроса строит строку `content1=0123…` нужной длины
+(несколько промежуточных копий) и держит все заранее созданные тела до конца фазы.
+Здесь один процессный буфер заполняется шаблоном один раз, а каждый запрос читает
+срезы memoryview над ним — на запрос не выделяется ничего, кроме самого среза.
+
+Download: HTTPDownloader читает тело по 10 КиБ в новые bytes и копит их длины в списке.
+SinkDownloader читает readinto в буфер из небольшого пула и только считает байты.
+"""
+import threading
+import timeit
+from typing import List, Optional
+
+import speedtest
+
+UPLOAD_PREFIX = b'content1='
+UPLOAD_PATTERN = b'0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# Размер приёмного буфера одного потока download
+RECV_BUFFER_SIZE = 256 * 1024
+# Сколько свободных приёмных буферов держать (по числу потоков download speedtest-cli + запас)
+RECV_POOL_SIZE = 16
+
+_lock = threading.Lock()
+_shared: Optional[memoryview] = None
+
+
+def build_upload_payload(size: int) -> memoryview:
+    """Подготовить тело upload-запроса (form-urlencoded, как у speedtest-cli).
+
+    Шаблон размножается удвоением внутри самого буфера, без временных строк.
+
+    Args:
+        size: Полный размер тела в байтах
+
+    Returns:
+        memoryview над единственным заранее заполненным буфером
+    """
+    buf = bytearray(max(size, len(UPLOAD_PREFIX)))
+    view = memoryview(buf)
+    p = len(UPLOAD_PREFIX)
+    view[:p] = UPLOAD_PREFIX
+    body_len = len(buf) - p
+    filled = min(len(UPLOAD_PATTERN), body_len)
+    view[p:p + filled] = UPLOAD_PATTERN[:filled]
+    while filled < body_len:
+        n = min(filled, body_len - filled)
+        view[p + filled:p + filled + n] = view[p:p + n]
+        filled += n
+    return view[:size]
+
+
+def shared_upload_payload(size: int) -> memoryview:
+    """Общий для процесса буфер не меньше size байт (растёт по требованию, не сжимается)."""
+    global _shared
+    with _lock:
+        if _shared is None or len(_shared) < size:
+            _shared = build_upload_payload(size)
+        return _shared[:size]
+
+
+class ZeroCopyUploadData:
+    """Замена speedtest.HTTPUploaderData: тело отдаётся срезами memoryview общего буфера.
+
+    Интерфейс совпадает с HTTPUploaderData в части, используемой HTTPUploader и http.client:
+    атрибут `start` (ставит HTTPUploader), список `total`, read(n), len().
+
+    Args:
+        length: Размер тела запроса
+        start: Время начала фазы (timeit.default_timer)
+        timeout: Длительность фазы, сек
+        shutdown_event: Событие досрочной остановки
+    """
+
+    def __init__(self, length: int, start: float, timeout: float, shutdown_event=None):
+        self.length = int(length)
+        self.start = start
+        self.timeout = timeout
+        # threading.Event или FakeShutdownEvent speedtest-cli (у последнего есть только isSet)
+        self._stopped = getattr(shutdown_event, 'is_set', None) or getattr(shutdown_event, 'isSet', None)
+        self._view = shared_upload_payload(self.length)
+        self._pos = 0
+        # HTTPUploader суммирует total; один элемент вместо списка на каждый блок
+        self.total = [0]
+
+    def read(self, n: int = 10240):
+        if (timeit.default_timer() - self.start) > self.timeout or (self._stopped is not None and self._stopped()):
+            raise speedtest.SpeedtestUploadTimeout()
+        chunk = self._view[self._pos:self._pos + n]
+        self._pos += len(chunk)
+        self.total[0] += len(chunk)
+        return chunk
+
+    def __len__(self):
+        return self.length
+
+
+class BufferPool:
+    """Пул переиспользуемых bytearray одного размера.
+
+    Args:
+        size: Размер буфера
+        keep: Сколько свободных буферов хранить
+    """
+
+    def __init__(self, size: int = RECV_BUFFER_SIZE, keep: int = RECV_POOL_SIZE):
+        self.size = size
+        self.keep = keep
+        self._free: List[bytearray] = []
+        self._lock = threading.Lock()
+        self.allocated = 0
+
+    def acquire(self) -> bytearray:
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self.allocated += 1
+        return bytearray(self.size)
+
+    def release(self, buf: bytearray) -> None:
+        with self._lock:
+            if len(self._free) < self.keep:
+                self._free.append(buf)
+
+
+recv_buffers = BufferPool()
+
+
+class SinkDownloader(threading.Thread):
+    """Замена speedtest.HTTPDownloader: тело ответа читается readinto в буфер из пула и только считается.
+
+    Условия остановки те же: дедлайн фазы, shutdown_event или конец тела.
+    `result` — число принятых байт (у HTTPDownloader — список длин прочитанных блоков).
+    """
+
+    def __init__(self, i: int, request, start: float, timeout: float, opener, shutdown_event=None,
+                 buffers: BufferPool = recv_buffers):
+        threading.Thread.__init__(self)
+        self.i = i
+        self.request = request
+        self.starttime = start
+        self.timeout = timeout
+        self.result = 0
+        self._open = opener.open
+        self._stopped = getattr(shutdown_event, 'is_set', None) or getattr(shutdown_event, 'isSet', None)
+        self._buffers = buffers
+
+    def _running(self) -> bool:
+        if self._stopped is not None and self._stopped():
+            return False
+        return (timeit.default_timer() - self.starttime) <= self.timeout
+
+    def run(self):
+        if not self._running():
+            return
+        buf = self._buffers.acquire()
+        view = memoryview(buf)
+        try:
+            f = self._open(self.request)
+            while self._running():
+                n = f.readinto(view)
+                if not n:
+                    break
+                self.result += n
+            f.close()
+        except speedtest.HTTP_ERRORS:
+            pass
+        finally:
+            view.release()
+            self._buffers.release(buf)
@@ -0,0 +1,240 @@
+# coding: utf-8
+"""
+Поинтервальные отсчёты пропускной способности во время теста.
+
+ThroughputSampler считает переданные байты (из любых потоков) и каждые `interval` секунд
+снимает отсчёт `[t_ms, bytes]`, где t_ms — время от начала теста, bytes — байты за интервал.
+Последний отсчёт фазы, снятый раньше конца интервала, — `[t_ms, bytes, dur_ms]` с его длительностью.
+Отсчёты хранятся по фазам (download/upload) и сохраняются в результате теста.
+"""
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_INTERVAL_MS = 100
+
+# Колбэк живого отсчёта: (phase, t_ms, bytes_in_interval, interval_s)
+SampleCallback = Callable[[str, int, int, float], None]
+
+
+class ThroughputSampler:
+    """Потокобезопасный счётчик байт с фоновым снятием отсчётов.
+
+    Args:
+        interval_ms: Шаг отсчётов в миллисекундах
+        on_sample: Колбэк, вызываемый из фонового потока для каждого отсчёта
+    """
+
+    def __init__(self, interval_ms: int = DEFAULT_INTERVAL_MS, on_sample: Optional[SampleCallback] = None):
+        self.interval_ms = max(10, int(interval_ms))
+        self.on_sample = on_sample
+        self.samples: Dict[str, List[List[int]]] = {}
+        self._lock = threading.Lock()
+        self._total = 0
+        self._taken = 0
+        self._phase: Optional[str] = None
+        self._t0 = time.perf_counter()
+        # время предыдущего отсчёта (или начала фазы)
+        self._last = self._t0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, nbytes: int) -> None:
+        """Учесть nbytes переданных байт (вызывается из потоков передачи)."""
+        with self._lock:
+            self._total += nbytes
+
+    def set_total(self, total: int) -> None:
+        """Установить накопленное число байт фазы (для источников с кумулятивным счётчиком)."""
+        with self._lock:
+            if total > self._total:
+                self._total = total
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    @property
+    def phase(self) -> Optional[str]:
+        return self._phase
+
+    def start_phase(self, phase: str) -> None:
+        """Начать фазу: обнулить счётчик и запустить фоновое снятие отсчётов."""
+        self.stop_phase()
+        with self._lock:
+            self._total = 0
+            self._taken = 0
+        self._last = time.perf_counter()
+        self._phase = phase
+        self.samples.setdefault(phase, [])
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=f'sampler-{phase}', daemon=True)
+        self._thread.start()
+
+    def stop_phase(self) -> None:
+        """Остановить текущую фазу и снять последний (возможно неполный) отсчёт."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._take(time.perf_counter(), partial=True)
+        self._phase = None
+
+    def _loop(self) -> None:
+        step = self.interval_ms / 1000.0
+        next_tick = time.perf_counter() + step
+        while not self._stop.wait(max(0.0, next_tick - time.perf_counter())):
+            self._take(next_tick)
+            next_tick += step
+
+    def _take(self, now: float, partial: bool = False) -> None:
+        phase = self._phase
+        if phase is None:
+            return
+        with self._lock:
+            delta = self._total - self._taken
+            self._taken = self._total
+        t_ms = int((now - self._t0) * 1000)
+        interval_s = self.interval_ms / 1000.0
+        dur_ms = max(1, int(round((now - self._last) * 1000)))
+        self._last = now
+        if partial and dur_ms < self.interval_ms:
+            # неполный интервал в конце фазы: длительность хранится рядом, иначе скорость занижается
+            self.samples[phase].append([t_ms, delta, dur_ms])
+            interval_s = dur_ms / 1000.0
+        else:
+            self.samples[phase].append([t_ms, delta])
+        if self.on_sample is not None:
+            try:
+                self.on_sample(phase, t_ms, delta, interval_s)
+            except Exception:
+                pass
+
+    def to_result(self) -> dict:
+        """Отсчёты в формате для поля `samples` результата."""
+        data: dict = {'interval_ms': self.interval_ms}
+        data.update(self.samples)
+        return data
+
+
+def summarize_phase(samples: List[List[int]], interval_ms: int) -> dict:
+    """Вычислить характеристики фазы по отсчётам.
+
+    Неполные отсчёты `[t_ms, bytes, dur_ms]` (конец фазы) в статистику скорости не входят:
+    короткий хвост давал бы случайный пик. Фаза короче одного интервала считается по ним.
+
+    Args:
+        samples: Список `[t_ms, bytes]` одной фазы
+        interval_ms: Шаг отсчётов
+
+    Returns:
+        Словарь: peak_bps, mean_bps, stddev_bps, cv, ramp_up_ms
+    """
+    samples = [row for row in samples if len(row) < 3] or samples
+    if not samples:
+        return {}
+    rates = [row[1] * 8000.0 / (row[2] if len(row) > 2 else interval_ms) for row in samples]
+    n = len(rates)
+    mean = sum(rates) / n
+    var = sum((r - mean) ** 2 for r in rates) / n
+    stddev = math.sqrt(var)
+    # «устойчивая» скорость — медиана второй половины фазы; разгон — время до 90% от неё
+    tail = sorted(rates[n // 2:])
+    steady = tail[len(tail) // 2] if tail else 0.0
+    ramp_up_ms = 0
+    if steady > 0:
+        t_start = samples[0][0] - interval_ms
+        for row, r in zip(samples, rates):
+            if r >= 0.9 * steady:
+                ramp_up_ms = row[0] - t_start
+                break
+    return {
+        'peak_bps': max(rates),
+        'mean_bps': mean,
+        'stddev_bps': stddev,
+        'cv': (stddev / mean) if mean > 0 else 0.0,
+        'ramp_up_ms': ramp_up_ms,
+    }
+
+
+def summarize_samples(samples: dict) -> dict:
+    """Характеристики всех фаз поля `samples` результата."""
+    interval_ms = int(samples.get('interval_ms', DEFAULT_INTERVAL_MS) or DEFAULT_INTERVAL_MS)
+    return {
+        phase: summarize_phase(values, interval_ms)
+        for phase, values in samples.items()
+        if phase != 'interval_ms' and values
+    }
+
+
+def concat_samples(runs: List[dict]) -> dict:
+    """Поле `samples` нескольких прогонов одной серией: время каждого прогона сдвигается за конец предыдущего."""
+    merged: dict = {'interval_ms': DEFAULT_INTERVAL_MS}
+    offset = 0
+    for samples in runs:
+        if not isinstance(samples, dict):
+            continue
+        merged['interval_ms'] = int(samples.get('interval_ms') or merged['interval_ms'])
+        end = offset
+        for phase, values in samples.items():
+            if phase == 'interval_ms' or not values:
+                continue
+            merged.setdefault(phase, []).extend([row[0] + offset] + list(row[1:]) for row in values)
+            end = max(end, offset + values[-1][0])
+        offset = end
+    return merged
+
+
+class _MeteredResponse:
+    # Обёртка ответа urllib: считает прочитанные байты тела
+
+    def __init__(self, response, sampler: ThroughputSampler):
+        self._response = response
+        self._sampler = sampler
+
+    def read(self, *args):
+        data = self._response.read(*args)
+        self._sampler.add(len(data))
+        return data
+
+    def readinto(self, b):
+        n = self._response.readinto(b)
+        if n:
+            self._sampler.add(n)
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+class MeteredOpener:
+    """Обёртка OpenerDirector speedtest-cli, подсчитывающая байты download и upload.
+
+    Тело upload-запроса (HTTPUploaderData) считается по мере чтения его http.client,
+    тело ответа — по мере чтения HTTPDownloader.
+    """
+
+    def __init__(self, opener, sampler: ThroughputSampler):
+        self._opener = opener
+        self._sampler = sampler
+
+    def open(self, request, *args, **kwargs):
+        data = getattr(request, 'data', None)
+        if data is None:
+            return _MeteredResponse(self._opener.open(request, *args, **kwargs), self._sampler)
+        if hasattr(data, 'total') and not getattr(data, '_metered', False):
+            read = data.read
+            sampler = self._sampler
+
+            def _read(n=10240):
+                chunk = read(n)
+                sampler.add(len(chunk))
+                return chunk
+            data.read = _read
+            data._metered = True
+        return self._opener.open(request, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._opener, name)
@@ -0,0 +1,199 @@
+# coding: utf-8
+"""
+Параллельный замер задержки до серверов-кандидатов для выбора лучшего сервера.
+
+speedtest-cli (Speedtest.get_best_server) опрашивает кандидатов по очереди, по три новых
+соединения на каждого. Здесь кандидаты опрашиваются одновременно (не более `concurrency`
+потоков) одним из способов:
+
+- `tcp`  — время установки TCP-соединения с host сервера;
+- `http` — время ответа на GET latency.txt по keep-alive соединению (первый запрос прогревочный).
+
+Как только победитель очевиден, оставшиеся замеры не ждут (ранний выход).
+"""
+import http.client
+import logging
+import socket
+import statistics
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:
+    from .http_session import get_session
+except ImportError:
+    from core.http_session import get_session  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+PROBE_TCP = 'tcp'
+PROBE_HTTP = 'http'
+
+DEFAULT_METHOD = PROBE_HTTP
+DEFAULT_CANDIDATES = 10
+DEFAULT_CONCURRENCY = 8
+DEFAULT_ATTEMPTS = 3
+DEFAULT_TIMEOUT = 2.0
+# Победитель очевиден, если его задержка меньше следующей (или нижней оценки незавершённых) на эту долю
+CLEAR_WINNER_MARGIN = 0.3
+# Минимум завершённых замеров перед ранним выходом
+MIN_RESULTS = 3
+# Период пересчёта критерия раннего выхода, сек
+_WAIT_STEP = 0.05
+
+
+def _server_address(server: dict) -> Tuple[str, int, str, bool]:
+    # (host, port, путь к latency.txt, https) из словаря сервера speedtest-cli
+    parts = urlsplit(server.get('url', ''))
+    secure = parts.scheme == 'https'
+    host = parts.hostname or ''
+    port = parts.port or (443 if secure else 80)
+    base = parts.path.rsplit('/', 1)[0] if parts.path else ''
+    if not host and server.get('host'):
+        host, _, p = str(server['host']).rpartition(':')
+        port = int(p) if p.isdigit() else port
+    return host, port, f'{base}/latency.txt', secure
+
+
+def _probe_tcp(host: str, port: int, attempts: int, timeout: float, source_address: str = '') -> List[float]:
+    rtts = []
+    source = (source_address, 0) if source_address else None
+    for _ in range(attempts):
+        t0 = time.perf_counter()
+        with socket.create_connection((host, port), timeout=timeout, source_address=source):
+            rtts.append((time.perf_counter() - t0) * 1000.0)
+    return rtts
+
+
+def _probe_http(host: str, port: int, path: str, secure: bool, attempts: int, timeout: float) -> List[float]:
+    # Соединение берётся из общей HTTP-сессии и возвращается в неё: победитель выбора
+    # начинает тест на уже прогретом соединении
+    scheme = 'https' if secure else 'http'
+    session = get_session()
+    conn, reused = session.acquire(scheme, host, port, timeout)
+    rtts = []
+    try:
+        stamp = int(time.time() * 1000)
+        # первый запрос прогревает соединение (DNS, TCP/TLS) и в замер не входит
+        for i in range(attempts + (0 if reused else 1)):
+            t0 = time.perf_counter()
+            conn.request('GET', f'{path}?x={stamp}.{i}', headers={'Connection': 'keep-alive'})
+            resp = conn.getresponse()
+            body = resp.read()
+            rtt = (time.perf_counter() - t0) * 1000.0
+            if resp.status != 200 or not body.startswith(b'test=test'):
+                raise ConnectionError(f'latency.txt: HTTP {resp.status}')
+            if reused or i > 0:
+                rtts.append(rtt)
+            if resp.will_close:
+                conn.close()
+    except BaseException:
+        conn.close()
+        raise
+    session.release_connection(scheme, conn)
+    return rtts
+
+
+def probe_server(server: dict, method: str = DEFAULT_METHOD, attempts: int = DEFAULT_ATTEMPTS,
+                 timeout: float = DEFAULT_TIMEOUT, source_address: str = '') -> Optional[float]:
+    """Измерить задержку до сервера.
+
+    Args:
+        server: Словарь сервера speedtest-cli (нужны `url` или `host`)
+        method: `tcp` или `http`
+        attempts: Количество замеров
+        timeout: Таймаут одного соединения/запроса, сек
+        source_address: Локальный адрес замера `tcp` (`http` идёт через общую HTTP-сессию с её профилем сокетов)
+
+    Returns:
+        Медиана замеров в мс или None, если сервер недоступен
+    """
+    host, port, path, secure = _server_address(server)
+    if not host:
+        return None
+    try:
+        if method == PROBE_TCP:
+            rtts = _probe_tcp(host, port, attempts, timeout, source_address)
+        else:
+            rtts = _probe_http(host, port, path, secure, attempts, timeout)
+    except (OSError, http.client.HTTPException) as e:
+        logger.debug(f'Замер задержки {host}:{port} не удался: {e}')
+        return None
+    return statistics.median(rtts) if rtts else None
+
+
+def rank_servers(servers: List[dict], top: int = 1, method: str = DEFAULT_METHOD,
+                 concurrency: int = DEFAULT_CONCURRENCY, attempts: int = DEFAULT_ATTEMPTS,
+                 timeout: float = DEFAULT_TIMEOUT, early_exit: bool = True,
+                 cancel_event: threading.Event | None = None, source_address: str = '') -> List[Tuple[float, dict]]:
+    """Параллельно замерить задержку до кандидатов и вернуть лучших.
+
+    Кандидаты должны быть отсортированы по расстоянию: при раннем выходе ещё не начатые замеры
+    (заведомо более далёкие серверы) отменяются, а незавершённые оцениваются снизу прошедшим
+    временем, делённым на число запросов.
+
+    Args:
+        servers: Кандидаты (словари speedtest-cli)
+        top: Сколько лучших серверов нужно
+        method: `tcp` или `http`
+        concurrency: Максимум одновременных замеров
+        attempts: Замеров на сервер
+        timeout: Таймаут одного соединения/запроса, сек
+        early_exit: Разрешить ранний выход, когда `top` лучших очевидны
+        cancel_event: Событие отмены
+        source_address: Локальный адрес замеров (см. probe_server)
+
+    Returns:
+        Список `(latency_ms, server)` по возрастанию задержки (не длиннее `top`)
+    """
+    if not servers:
+        return []
+    top = max(1, int(top))
+    requests_per_server = attempts + (1 if method == PROBE_HTTP else 0)
+    started: Dict[int, float] = {}
+    done: List[Tuple[float, dict]] = []
+
+    def _run(idx: int, server: dict) -> Optional[float]:
+        started[idx] = time.perf_counter()
+        return probe_server(server, method, attempts, timeout, source_address)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(int(concurrency), len(servers))),
+                              thread_name_prefix='server-probe')
+    try:
+        futures = {pool.submit(_run, i, sv): i for i, sv in enumerate(servers)}
+        pending = set(futures)
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            finished, pending = wait(pending, timeout=_WAIT_STEP, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                latency = fut.result()
+                if latency is not None:
+                    done.append((latency, servers[futures[fut]]))
+            if not early_exit or len(done) < max(top, MIN_RESULTS) or not pending:
+                continue
+            done.sort(key=lambda x: x[0])
+            now = time.perf_counter()
+            bounds = [l for l, _ in done[top:]]
+            bounds += [(now - started[futures[f]]) * 1000.0 / requests_per_server
+                       for f in pending if futures[f] in started]
+            kth = done[top - 1][0]
+            if all(kth * (1.0 + CLEAR_WINNER_MARGIN) < b for b in bounds):
+                logger.debug(f'Ранний выход выбора сервера: {len(done)} из {len(servers)} замеров')
+                break
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    done.sort(key=lambda x: x[0])
+    return done[:top]
+
+
+def probe_settings(settings) -> dict:
+    """Параметры rank_servers из настроек (`probe_method`, `probe_concurrency`, `source_address`)."""
+    method = str(settings.get('probe_method', DEFAULT_METHOD) or DEFAULT_METHOD).lower()
+    return {
+        'method': method if method in (PROBE_TCP, PROBE_HTTP) else DEFAULT_METHOD,
+        'concurrency': int(settings.get('probe_concurrency', DEFAULT_CONCURRENCY) or DEFAULT_CONCURRENCY),
+        'source_address': str(settings.get('source_address', '') or '').strip(),
+    }
@@ -24,11 +24,57 @@ _DEFAULTS: Dict[str, Any] = {
     "units": "Mbps",         # Mbps | MB/s
     "theme": "Dark",         # Dark | Light
     "favorite_server_ids": [],  # список избранных серверов (IDs)
-    "engine": "python",      # Движок измерения: 'python' (встроенная библиотека speedtest-cli) | 'ookla' (официальный speedtest.exe)
+    # Движок измерения: 'python' (встроенная библиотека speedtest-cli) | 'async' (asyncio, N потоков) |
+    # 'multiprocess' (asyncio в N процессах) | 'ookla' (официальный speedtest.exe)
+    "engine": "python",
+    "async_streams": 8,      # Параллельных keep-alive соединений asyncio-движка (у multiprocess — на все процессы)
+    "async_duration": 10,    # Длительность фазы download/upload asyncio-движка (секунды)
+    "autotune_mode": False,  # Автоподбор потоков и размера запросов asyncio по приросту скорости (вместо async_streams)
+    "autotune_max_streams": 32,  # Максимум потоков при автоподборе
+    "autotune_gain": 0.1,    # Минимальный относительный прирост скорости для новых потоков/роста запросов
+    "mp_processes": 0,       # Количество процессов движка multiprocess (0 — по числу ядер)
+    "sample_interval_ms": 100,  # Шаг поинтервальных отсчётов скорости (мс), сохраняются в результате
+    "live_update_ms": 250,   # Минимальный интервал живых обновлений скорости в UI (мс)
+    "probe_method": "http",  # Задержка при выборе сервера: 'http' (latency.txt по keep-alive) | 'tcp' (TCP connect)
+    "probe_concurrency": 8,  # Максимум одновременных замеров задержки
+    "probe_candidates": 10,  # Сколько ближайших серверов опрашивать при выборе лучшего
+    "custom_server_url": "",  # Свой сервер (serve), напр. http://192.168.1.10:8080; пусто — speedtest.net
+    "latency_samples": 30,   # Замеров задержки простоя на сервер и способ (0 — только ping выбора сервера)
+    "latency_methods": "tcp,http,udp",  # Способы замера задержки: tcp, http (latency.txt), udp (echo udp_endpoint)
+    "latency_servers": 3,    # До скольких серверов мерить задержку одновременно (первый — сервер теста)
+    "udp_endpoint": "",      # UDP echo-сервер для замера джиттера/потерь (host:port); пусто — замер выключен
+    "udp_rate_pps": 50,      # Частота отправки UDP-пакетов (пакетов в секунду)
+    "udp_duration": 5,       # Длительность UDP-замера (секунды)
+    "udp_payload_bytes": 172,  # Размер UDP-пакета (байты), по умолчанию как RTP G.711 на 20 мс
+    "loaded_latency": True,  # Мерить задержку во время download/upload (bufferbloat), способ — probe_method
+    "loaded_latency_interval_ms": 200,  # Период замеров задержки под нагрузкой (мс)
+    "tcp_info": True,        # TCP_INFO по потокам движка python (Linux, нужен http_pool), шаг — sample_interval_ms
+    "socket_rcvbuf": 0,      # SO_RCVBUF сокетов передачи всех движков (байт, 0 — автоподстройка ядра)
+    "socket_sndbuf": 0,      # SO_SNDBUF сокетов передачи всех движков (байт, 0 — автоподстройка ядра)
+    "tcp_nodelay": True,     # TCP_NODELAY сокетов передачи (выключить алгоритм Nagle)
+    "tcp_congestion": "",    # Алгоритм управления перегрузкой TCP_CONGESTION (Linux, например bbr; пусто — системный)
+    "source_address": "",    # Локальный адрес, с которого открываются соединения передачи (пусто — выбирает ОС)
+    "multipath_paths": "",   # Пути теста через запятую: ipv4, ipv6, IP-адрес, интерфейс[/ipv6] (пусто — обычный тест)
+    "multipath_concurrent": False,  # Прогонять пути одновременно (каждый в своём процессе), иначе по очереди
+    "bidirectional_mode": False,  # После обычных фаз — download и upload одновременно (python/async/multiprocess)
+    "multi_server_count": 1,  # Сколько серверов нагружать одновременно (1 — только лучший; движки async/multiprocess)
+    "cache_enabled": True,   # Кэш конфигурации speedtest.net и каталога серверов (Documents/SpeedtestNextGen/cache)
+    "cache_config_ttl": 3600,    # Время жизни кэша конфигурации (секунды)
+    "cache_servers_ttl": 86400,  # Время жизни кэша каталога серверов (секунды)
+    "cache_max_stale": 604800,   # До какого возраста устаревшая копия отдаётся сразу с фоновым обновлением (секунды)
+    "http_pool": True,       # Общий пул keep-alive соединений, кэш DNS и возобновление TLS для speedtest-cli
+    "zero_copy_upload": True,  # Тела upload-запросов speedtest-cli — срезы одного общего буфера
+    "download_sink": True,   # Download движка python — readinto в переиспользуемые буферы вместо bytes на блок
+    "adaptive_mode": False,  # Адаптивная длительность фаз: стоп при стабилизации скорости (python/async/multiprocess)
+    "adaptive_tolerance": 0.05,  # Допустимый разброс скорости в окне стабильности (доля)
+    "adaptive_min_seconds": 3,   # Минимальная длительность фазы в адаптивном режиме (секунды)
+    "adaptive_max_seconds": 15,  # Бюджет времени фазы в адаптивном режиме (секунды, 0 — обычная длительность)
+    "adaptive_max_mb": 0,    # Бюджет трафика фазы в адаптивном режиме (МиБ, 0 — без ограничения)
     "ookla_path": "",        # Путь к speedtest.exe (если пусто — ищется в PATH)
     "ookla_timeout": 90,     # Таймаут выполнения speedtest.exe (секунды)
     "accent_color": "blue",  # Акцентный цвет: blue | green | purple | red | orange | pink
     "max_history_records": 1000,  # Максимальное количество записей в истории
+    "storage_backend": "jsonl",  # Хранилище истории: 'jsonl' (results.jsonl) | 'sqlite' (results.sqlite3, WAL)
     "anonymous_mode": False,  # Анонимный режим: не сохранять историю тестов
 }
 
@@ -61,6 +107,10 @@ class SettingsManager(QObject):
     def get(self, key: str, default: Any = None) -> Any:
         return self._data.get(key, default)
 
+    def as_dict(self) -> Dict[str, Any]:
+        """Копия текущих настроек (для передачи в процессы и подмены значений на один прогон)."""
+        return dict(self._data)
+
     def set(self, key: str, value: Any) -> None:
         if self._data.get(key) == value:
             return
@@ -0,0 +1,146 @@
+# coding: utf-8
+"""
+Имитация характеристик канала для локального сервера (core/local_server.py) без tc и прав root.
+
+Профиль задаётся строкой `rate=100,conn_rate=50,delay=20,jitter=5,loss=0.5`:
+
+- `rate`      — пропускная способность пути, Мбит/с (общая для всех соединений, отдельно в каждую сторону);
+- `conn_rate` — ограничение одного соединения, Мбит/с;
+- `delay`     — добавочная задержка ответа на запрос, мс;
+- `jitter`    — разброс задержки, ±мс (равномерно);
+- `loss`      — потери пакетов, %.
+
+Ограничения скорости — token bucket (с долгом: потребитель, ушедший в минус, спит до его
+погашения). Задержка в пользовательском пространстве добавляется к каждому ответу, а не к
+каждому пакету. Потери UDP echo — настоящее выбрасывание пакетов; TCP сам повторяет потерянное,
+поэтому для TCP потери задают предел скорости соединения по формуле Матиса:
+MSS / RTT * 1.22 / sqrt(p), с RTT = 2 * delay.
+"""
+import math
+import random
+import threading
+import time
+from typing import Optional
+
+TCP_MSS = 1448
+# Нижняя граница RTT в формуле Матиса, сек (loopback без добавочной задержки)
+MIN_RTT = 0.001
+# Запас токенов: сколько времени передачи на полной скорости можно отправить разом, сек
+BURST_SECONDS = 0.01
+MIN_BURST = 16 * 1024
+
+_KEYS = ('rate', 'conn_rate', 'delay', 'jitter', 'loss')
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket в байтах.
+
+    Args:
+        rate_bps: Скорость, бит/с
+        burst: Ёмкость корзины, байт (по умолчанию — BURST_SECONDS передачи на полной скорости)
+    """
+
+    def __init__(self, rate_bps: float, burst: Optional[int] = None):
+        self.rate = max(1.0, float(rate_bps)) / 8.0
+        self.burst = int(burst or max(MIN_BURST, self.rate * BURST_SECONDS))
+        self._tokens = float(self.burst)
+        self._last = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes: int) -> None:
+        """Списать nbytes, при нехватке токенов — дождаться их накопления."""
+        with self._lock:
+            now = time.perf_counter()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= nbytes
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ShapingProfile:
+    """Параметры имитируемого канала (см. описание модуля); нулевые значения — без ограничения."""
+
+    def __init__(self, rate: float = 0.0, conn_rate: float = 0.0, delay: float = 0.0, jitter: float = 0.0,
+                 loss: float = 0.0):
+        self.rate = max(0.0, float(rate))
+        self.conn_rate = max(0.0, float(conn_rate))
+        self.delay = max(0.0, float(delay))
+        self.jitter = max(0.0, float(jitter))
+        self.loss = min(100.0, max(0.0, float(loss)))
+
+    @classmethod
+    def parse(cls, spec: str) -> 'ShapingProfile':
+        """Разобрать строку `ключ=значение,...`.
+
+        Raises:
+            ValueError: неизвестный ключ или нечисловое значение
+        """
+        values = {}
+        for item in str(spec or '').replace(';', ',').split(','):
+            if not item.strip():
+                continue
+            key, _, value = item.partition('=')
+            key = key.strip().replace('-', '_')
+            if key not in _KEYS:
+                raise ValueError(f'Неизвестный параметр профиля: {key!r} (допустимы: {", ".join(_KEYS)})')
+            values[key] = float(value)
+        return cls(**values)
+
+    @property
+    def enabled(self) -> bool:
+        return any((self.rate, self.conn_rate, self.delay, self.jitter, self.loss))
+
+    def describe(self) -> str:
+        parts = [f'{k}={getattr(self, k):g}' for k in _KEYS if getattr(self, k)]
+        return ','.join(parts) or 'без ограничений'
+
+    def sample_delay(self) -> float:
+        """Добавочная задержка одного ответа, сек."""
+        if not self.delay and not self.jitter:
+            return 0.0
+        return max(0.0, self.delay + random.uniform(-self.jitter, self.jitter)) / 1000.0
+
+    def drop(self) -> bool:
+        """Потерять ли очередной UDP-пакет."""
+        return self.loss > 0 and random.random() * 100.0 < self.loss
+
+    def connection_rate_bps(self) -> float:
+        """Предел скорости одного TCP-соединения, бит/с (0 — без ограничения): conn_rate и формула Матиса."""
+        limits = []
+        if self.conn_rate:
+            limits.append(self.conn_rate * 1e6)
+        if self.loss:
+            rtt = max(MIN_RTT, 2.0 * self.delay / 1000.0)
+            limits.append(TCP_MSS * 8.0 / rtt * 1.22 / math.sqrt(self.loss / 100.0))
+        return min(limits) if limits else 0.0
+
+
+class Shaper:
+    """Общие для сервера корзины пути (по одной на направление) и фабрика корзин соединений.
+
+    Args:
+        profile: Профиль канала
+    """
+
+    def __init__(self, profile: ShapingProfile):
+        self.profile = profile
+        self.down = TokenBucket(profile.rate * 1e6) if profile.rate else None
+        self.up = TokenBucket(profile.rate * 1e6) if profile.rate else None
+
+    def connection_buckets(self) -> tuple[Optional[TokenBucket], Optional[TokenBucket]]:
+        """Корзины нового соединения (download, upload) или (None, None)."""
+        rate = self.profile.connection_rate_bps()
+        if not rate:
+            return None, None
+        return TokenBucket(rate), TokenBucket(rate)
+
+    @property
+    def chunk_limit(self) -> int:
+        """Максимальный блок передачи: не больше самой маленькой корзины, чтобы ограничение было плавным."""
+        sizes = [b.burst for b in (self.down, self.up) if b is not None]
+        rate = self.profile.connection_rate_bps()
+        if rate:
+            sizes.append(TokenBucket(rate).burst)
+        return min(sizes) if sizes else 0
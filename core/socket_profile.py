@@ -0,0 +1,178 @@
+# coding: utf-8
+"""
+Профиль опций сокетов передачи.
+
+Сможет ли многогигабитный хост заполнить канал, решают размеры буферов сокета, алгоритм
+управления перегрузкой и Nagle — а соединения движков открываются с системными значениями.
+SocketProfile собирает эти опции из настроек и применяется ко всем соединениям передачи:
+пулу общей HTTP-сессии (движок python), asyncio-движку и процессам движка multiprocess.
+
+- `socket_rcvbuf` / `socket_sndbuf` — SO_RCVBUF / SO_SNDBUF в байтах (0 — автоподстройка ядра;
+  на Linux явный размер её отключает, а ядро удваивает заданное значение);
+- `tcp_nodelay` — TCP_NODELAY;
+- `tcp_congestion` — алгоритм управления перегрузкой (TCP_CONGESTION, только Linux;
+  доступные — available_congestion());
+- `source_address` — локальный адрес, с которого открываются соединения; `0.0.0.0` или `::`
+  оставляют только IPv4 или только IPv6 (core/multipath.py).
+
+Опции ставятся до connect(): размер приёмного буфера определяет масштаб окна в SYN.
+Подобрать профиль для своего хоста: python benchmarks/socket_sweep.py.
+"""
+import ipaddress
+import logging
+import socket
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Без root можно выбрать только разрешённые алгоритмы; список загруженных — запасной вариант
+_CONGESTION_PATHS = (
+    '/proc/sys/net/ipv4/tcp_allowed_congestion_control',
+    '/proc/sys/net/ipv4/tcp_available_congestion_control',
+)
+
+
+def available_congestion() -> List[str]:
+    """Алгоритмы управления перегрузкой, доступные без root (Linux), или пустой список."""
+    if not hasattr(socket, 'TCP_CONGESTION'):
+        return []
+    for path in _CONGESTION_PATHS:
+        try:
+            with open(path, encoding='ascii') as f:
+                names = f.read().split()
+        except OSError:
+            continue
+        if names:
+            return names
+    return []
+
+
+def address_family(address: str) -> Optional[int]:
+    """Семейство адресов IP-литерала (AF_INET/AF_INET6) или None."""
+    try:
+        return socket.AF_INET6 if ipaddress.ip_address(address).version == 6 else socket.AF_INET
+    except ValueError:
+        return None
+
+
+class SocketProfile:
+    """Опции сокета передачи; значения по умолчанию ничего не меняют, кроме TCP_NODELAY.
+
+    Args:
+        rcvbuf: SO_RCVBUF, байт (0 — не менять)
+        sndbuf: SO_SNDBUF, байт (0 — не менять)
+        nodelay: Выключить алгоритм Nagle
+        congestion: Имя алгоритма TCP_CONGESTION ('' — системный)
+        source_address: Локальный адрес для bind ('' — выбирает ОС)
+    """
+
+    def __init__(self, rcvbuf: int = 0, sndbuf: int = 0, nodelay: bool = True, congestion: str = '',
+                 source_address: str = ''):
+        self.rcvbuf = max(0, int(rcvbuf or 0))
+        self.sndbuf = max(0, int(sndbuf or 0))
+        self.nodelay = bool(nodelay)
+        self.congestion = str(congestion or '').strip()
+        self.source_address = str(source_address or '').strip()
+        self._warned = False
+
+    @classmethod
+    def from_settings(cls, settings) -> 'SocketProfile':
+        return cls(
+            rcvbuf=int(settings.get('socket_rcvbuf', 0) or 0),
+            sndbuf=int(settings.get('socket_sndbuf', 0) or 0),
+            nodelay=bool(settings.get('tcp_nodelay', True)),
+            congestion=str(settings.get('tcp_congestion', '') or ''),
+            source_address=str(settings.get('source_address', '') or ''),
+        )
+
+    @property
+    def is_default(self) -> bool:
+        return not (self.rcvbuf or self.sndbuf or self.congestion or self.source_address) and self.nodelay
+
+    @property
+    def family(self) -> Optional[int]:
+        """Семейство адресов, к которому привязывает source_address (None — любое)."""
+        return address_family(self.source_address) if self.source_address else None
+
+    @property
+    def family_name(self) -> str:
+        return {socket.AF_INET: 'IPv4', socket.AF_INET6: 'IPv6'}.get(self.family, '')
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, SocketProfile) and self.to_result() == other.to_result()
+
+    def __hash__(self) -> int:
+        return hash(tuple(sorted(self.to_result().items())))
+
+    def __getstate__(self):
+        # передаётся в дочерние процессы движка multiprocess
+        return self.to_result()
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _warn(self, message: str) -> None:
+        # одна и та же ошибка опции повторялась бы на каждом соединении
+        if not self._warned:
+            self._warned = True
+            logger.warning(message)
+
+    def apply(self, sock: socket.socket) -> None:
+        """Выставить опции сокету до connect(); неподдерживаемые опции пропускаются с предупреждением."""
+        if self.rcvbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        if self.sndbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+        if self.nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.congestion:
+            if not hasattr(socket, 'TCP_CONGESTION'):
+                self._warn('tcp_congestion поддерживается только на Linux — настройка пропущена')
+            else:
+                try:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CONGESTION, self.congestion.encode('ascii'))
+                except OSError as e:
+                    self._warn(f'Алгоритм {self.congestion!r} недоступен ({e}); доступны: '
+                               f'{", ".join(available_congestion()) or "неизвестно"}')
+        if self.source_address:
+            sock.bind((self.source_address, 0))
+
+    def create_socket(self, family: int) -> socket.socket:
+        """Новый TCP-сокет семейства family с применённым профилем."""
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            self.apply(sock)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def to_result(self) -> dict:
+        """Параметры профиля (поле `socket_profile` результата)."""
+        return {
+            'rcvbuf': self.rcvbuf,
+            'sndbuf': self.sndbuf,
+            'nodelay': self.nodelay,
+            'congestion': self.congestion,
+            'source_address': self.source_address,
+        }
+
+    def describe(self) -> str:
+        parts = []
+        if self.rcvbuf:
+            parts.append(f'SO_RCVBUF {self.rcvbuf // 1024} КиБ')
+        if self.sndbuf:
+            parts.append(f'SO_SNDBUF {self.sndbuf // 1024} КиБ')
+        if self.congestion:
+            parts.append(f'congestion {self.congestion}')
+        if self.source_address:
+            parts.append(f'адрес {self.source_address}')
+        if not self.nodelay:
+            parts.append('Nagle включён')
+        return ', '.join(parts) or 'системные значения'
+
+
+def profile_from_settings(settings) -> Optional[SocketProfile]:
+    """SocketProfile по настройкам или None, если все значения по умолчанию."""
+    profile = SocketProfile.from_settings(settings)
+    return None if profile.is_default else profile
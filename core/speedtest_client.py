@@ -1,7 +1,14 @@
 # coding: utf-8
+import copy
 import logging
 from datetime import datetime
+import os
+import queue
 import threading
+import time
+import timeit
+from urllib.parse import urlsplit
+from urllib.request import Request
 
 import speedtest
 
@@ -9,8 +16,191 @@ logger = logging.getLogger(__name__)
 
 try:
     from .settings import get_settings
+    from .sampling import ThroughputSampler, MeteredOpener, summarize_samples, DEFAULT_INTERVAL_MS
+    from .adaptive import AdaptiveHook, STOP_CANCELED, phase_duration
+    from .server_probe import rank_servers, probe_settings, DEFAULT_CANDIDATES
+    from .http_cache import CachingOpener, get_document_cache
+    from .http_session import get_session
+    from .payload import ZeroCopyUploadData, SinkDownloader
+    from .memory_monitor import PeakMemoryTracker
+    from .loaded_latency import LatencyMonitor, monitor_from_settings
+    from .udp_probe import probe_from_settings as udp_probe_from_settings
+    from .tcp_info import TcpInfoMonitor, monitor_from_settings as tcp_info_from_settings
+    from .socket_profile import SocketProfile, profile_from_settings
+    from .multi_server import multi_server_count
+    from .latency_sampler import sampler_from_settings as latency_sampler_from_settings, ping_from_result
+    from .latency_sampler import describe as describe_latency
+    from .bidirectional import (
+        PHASE_BIDIRECTIONAL, bidirectional_enabled, merge_samples, run_both, summarize as summarize_bidirectional,
+    )
+    from .bidirectional import describe as describe_bidirectional
 except ImportError:
     from core.settings import get_settings  # type: ignore
+    from core.sampling import ThroughputSampler, MeteredOpener, summarize_samples, DEFAULT_INTERVAL_MS  # type: ignore
+    from core.adaptive import AdaptiveHook, STOP_CANCELED, phase_duration  # type: ignore
+    from core.server_probe import rank_servers, probe_settings, DEFAULT_CANDIDATES  # type: ignore
+    from core.http_cache import CachingOpener, get_document_cache  # type: ignore
+    from core.http_session import get_session  # type: ignore
+    from core.payload import ZeroCopyUploadData, SinkDownloader  # type: ignore
+    from core.memory_monitor import PeakMemoryTracker  # type: ignore
+    from core.loaded_latency import LatencyMonitor, monitor_from_settings  # type: ignore
+    from core.udp_probe import probe_from_settings as udp_probe_from_settings  # type: ignore
+    from core.tcp_info import TcpInfoMonitor, monitor_from_settings as tcp_info_from_settings  # type: ignore
+    from core.socket_profile import SocketProfile, profile_from_settings  # type: ignore
+    from core.multi_server import multi_server_count  # type: ignore
+    from core.latency_sampler import (  # type: ignore
+        sampler_from_settings as latency_sampler_from_settings, ping_from_result,
+    )
+    from core.latency_sampler import describe as describe_latency  # type: ignore
+    from core.bidirectional import (  # type: ignore
+        PHASE_BIDIRECTIONAL, bidirectional_enabled, merge_samples, run_both, summarize as summarize_bidirectional,
+    )
+    from core.bidirectional import describe as describe_bidirectional  # type: ignore
+
+
+# Документы speedtest.net, которые при `custom_server_url` запрашиваются у своего сервера
+_CUSTOM_SERVER_DOCUMENTS = ('speedtest-config.php', 'speedtest-servers-static.php', 'speedtest-servers.php')
+
+
+def custom_server_base(settings) -> str:
+    """Базовый URL своего сервера из настройки `custom_server_url` (без завершающего /) или ''."""
+    url = str(settings.get('custom_server_url', '') or '').strip().rstrip('/')
+    if url and '://' not in url:
+        url = f'http://{url}'
+    return url
+
+
+class _CustomServerOpener:
+    # Перенаправляет запросы конфигурации и каталога серверов speedtest.net на свой сервер
+    # (core/local_server.py): каталог содержит только его, поэтому и тест идёт к нему.
+
+    def __init__(self, opener, base_url: str):
+        self._opener = opener
+        self._base = base_url
+
+    def open(self, request, *args, **kwargs):
+        if isinstance(request, Request):
+            parts = urlsplit(request.full_url)
+            name = parts.path.rsplit('/', 1)[-1]
+            if (parts.hostname or '').endswith('speedtest.net') and name in _CUSTOM_SERVER_DOCUMENTS:
+                request.full_url = f'{self._base}/{name}' + (f'?{parts.query}' if parts.query else '')
+        return self._opener.open(request, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._opener, name)
+
+
+class _NextGenSpeedtest(speedtest.Speedtest):
+    # Speedtest, работающий через общую HTTP-сессию процесса (core/http_session.py) и берущий
+    # конфигурацию и каталог серверов из дискового кэша (core/http_cache.py).
+    # Speedtest.__init__ вызывает get_config сразу после build_opener, поэтому opener
+    # подменяется здесь, до первого запроса. При zero_copy тела upload-запросов — срезы
+    # общего буфера (core/payload.py) вместо заранее созданных строк HTTPUploaderData,
+    # при sink download читается readinto в переиспользуемые буферы. При server_base конфигурация
+    # и каталог берутся у своего сервера вместо speedtest.net.
+
+    def __init__(self, document_cache=None, pooled: bool = False, zero_copy: bool = False, sink: bool = False,
+                 server_base: str = '', **kwargs):
+        self.document_cache = document_cache
+        self._server_base = server_base
+        self._pooled = pooled
+        self._zero_copy = zero_copy
+        self._sink = sink
+        super().__init__(**kwargs)
+
+    def get_config(self):
+        if self._pooled:
+            self._pooled = False
+            self._opener = get_session().opener(self._timeout, speedtest.build_user_agent())
+        if self._server_base and not isinstance(self._opener, _CustomServerOpener):
+            self._opener = _CustomServerOpener(self._opener, self._server_base)
+        if self.document_cache is not None and not isinstance(self._opener, CachingOpener):
+            self._opener = CachingOpener(self._opener, self.document_cache)
+        return super().get_config()
+
+    def _run_transfers(self, make_thread, count: int, max_threads: int, callback) -> tuple[int, float]:
+        # Производитель/потребитель потоков передачи, как в Speedtest.download/upload.
+        # make_thread(i, start) создаёт поток с целочисленным result (переданные байты).
+        # Возвращает (байты, длительность фазы в секундах).
+        in_flight = {'threads': 0}
+        finished = []
+
+        def producer(q):
+            for i in range(count):
+                thread = make_thread(i, start)
+                while in_flight['threads'] >= max_threads:
+                    time.sleep(0.001)
+                thread.start()
+                q.put(thread, True)
+                in_flight['threads'] += 1
+                callback(i, count, start=True)
+
+        def consumer(q):
+            while len(finished) < count:
+                thread = q.get(True)
+                while thread.is_alive():
+                    thread.join(timeout=0.001)
+                in_flight['threads'] -= 1
+                finished.append(thread.result)
+                callback(thread.i, count, end=True)
+
+        q = queue.Queue(max_threads)
+        prod_thread = threading.Thread(target=producer, args=(q,))
+        cons_thread = threading.Thread(target=consumer, args=(q,))
+        start = timeit.default_timer()
+        prod_thread.start()
+        cons_thread.start()
+        prod_thread.join()
+        cons_thread.join()
+        return sum(finished), timeit.default_timer() - start
+
+    def download(self, callback=speedtest.do_nothing, threads=None):
+        if not self._sink:
+            return super().download(callback=callback, threads=threads)
+        # Алгоритм Speedtest.download, но тело ответа читается readinto в буферы из пула
+        # (SinkDownloader) и только считается — без bytes-объекта на каждый блок
+        base = os.path.dirname(self.best['url'])
+        urls = [f'{base}/random{size}x{size}.jpg'
+                for size in self.config['sizes']['download'] for _ in range(self.config['counts']['download'])]
+        requests = [speedtest.build_request(url, bump=i, secure=self._secure) for i, url in enumerate(urls)]
+        length = self.config['length']['download']
+
+        def make_thread(i, start):
+            return SinkDownloader(i, requests[i], start, length, opener=self._opener,
+                                  shutdown_event=self._shutdown_event)
+
+        received, elapsed = self._run_transfers(make_thread, len(requests),
+                                                threads or self.config['threads']['download'], callback)
+        self.results.bytes_received = received
+        self.results.download = (received / elapsed) * 8.0
+        if self.results.download > 100000:
+            self.config['threads']['upload'] = 8
+        return self.results.download
+
+    def upload(self, callback=speedtest.do_nothing, pre_allocate=True, threads=None):
+        if not self._zero_copy:
+            return super().upload(callback=callback, pre_allocate=pre_allocate, threads=threads)
+        # Алгоритм Speedtest.upload без изменений, отличаются только тела запросов:
+        # ZeroCopyUploadData вместо HTTPUploaderData
+        sizes = [size for size in self.config['sizes']['upload'] for _ in range(self.config['counts']['upload'])]
+        length = self.config['length']['upload']
+        requests = []
+        for size in sizes[:self.config['upload_max']]:
+            data = ZeroCopyUploadData(size, 0, length, shutdown_event=self._shutdown_event)
+            requests.append((speedtest.build_request(self.best['url'], data, secure=self._secure,
+                                                     headers={'Content-length': size}), size))
+
+        def make_thread(i, start):
+            request, size = requests[i]
+            return speedtest.HTTPUploader(i, request, start, size, length, opener=self._opener,
+                                          shutdown_event=self._shutdown_event)
+
+        sent, elapsed = self._run_transfers(make_thread, len(requests),
+                                            threads or self.config['threads']['upload'], callback)
+        self.results.bytes_sent = sent
+        self.results.upload = (sent / elapsed) * 8.0
+        return self.results.upload
+
 
 class SpeedtestClient:
     # Обёртка над speedtest-cli для получения ping/down/up и информации о сервере
@@ -56,9 +246,19 @@ class SpeedtestClient:
                 {"secure": True},
                 {"secure": False},
             ]
+            server_base = custom_server_base(self.settings)
+            # у своего сервера конфигурация и каталог другие — кэш speedtest.net для них не годится
+            cache = (get_document_cache(self.settings)
+                     if self.settings.get('cache_enabled', True) and not server_base else None)
+            pooled = bool(self.settings.get('http_pool', True))
+            zero_copy = bool(self.settings.get('zero_copy_upload', True))
+            sink = bool(self.settings.get('download_sink', True))
             for kwargs in variants:
                 try:
-                    return speedtest.Speedtest(**kwargs)
+                    # настоящее событие остановки: нужно для отмены и адаптивного завершения фаз
+                    return _NextGenSpeedtest(document_cache=cache, pooled=pooled, zero_copy=zero_copy,
+                                             sink=sink, server_base=server_base, shutdown_event=threading.Event(),
+                                             **kwargs)
                 except Exception as e:  # сохраняем и пробуем далее
                     nonlocal last_err
                     last_err = e
@@ -80,26 +280,210 @@ class SpeedtestClient:
         assert last_err is not None
         raise last_err
 
-    def perform_test(self, cancel_event: threading.Event | None = None, server_id_override: int | None = None):
-        logger.info('Инициализация клиента Speedtest...')
-        s = self._create_speedtest()
+    def _create_sampler(self, on_sample=None, on_stop=None) -> tuple[ThroughputSampler, AdaptiveHook]:
+        # Счётчик поинтервальных отсчётов с шагом из настроек и хук адаптивной длительности фаз.
+        # on_stop(phase, reason) вызывается, когда адаптивный контроллер решил завершить фазу.
+        interval_ms = int(self.settings.get('sample_interval_ms', DEFAULT_INTERVAL_MS) or DEFAULT_INTERVAL_MS)
+        hook = AdaptiveHook(self.settings, interval_ms, on_sample=on_sample, on_stop=on_stop)
+        return ThroughputSampler(interval_ms, on_sample=hook), hook
 
-        # Монитор отмены: если cancel_event установлен, прервать текущий сетевой этап speedtest
-        cancel_monitor = None
-        if cancel_event is not None:
-            def _watch_cancel():
-                cancel_event.wait()
-                try:
-                    # внутренний флаг библиотеки speedtest-cli, останавливает download/upload
-                    s._shutdown_event.set()
-                    logger.info('Отмена: прерываю текущий сетевой этап...')
-                except Exception:
-                    pass
+    def _measure_udp(self, cancel_event: threading.Event | None = None) -> dict:
+        # Джиттер, потери и переупорядочивание по UDP (core/udp_probe.py), если задан `udp_endpoint`.
+        # Возвращает поля результата `jitter_ms`, `packet_loss_pct`, `udp`; при недоступном echo — пусто.
+        try:
+            probe = udp_probe_from_settings(self.settings)
+            if probe is None:
+                return {}
+            logger.info(f'UDP-замер джиттера и потерь ({probe.host}:{probe.port})...')
+            udp = probe.run(cancel_event)
+        except (OSError, ValueError) as e:
+            logger.warning(f'UDP-замер не выполнен: {e}')
+            return {}
+        logger.info(f"UDP: джиттер {udp['jitter_ms']:.2f} мс, потери {udp['loss_pct']:.2f}%, "
+                    f"переупорядочено {udp['reordered']} из {udp['received']}")
+        return {'jitter_ms': udp['jitter_ms'], 'packet_loss_pct': udp['loss_pct'], 'udp': udp}
 
-            cancel_monitor = threading.Thread(target=_watch_cancel, name='st-cancel-watch', daemon=True)
-            cancel_monitor.start()
+    def _measure_latency(self, s: "speedtest.Speedtest", best: dict,
+                         cancel_event: threading.Event | None = None) -> dict:
+        # Гистограммы задержки простоя (core/latency_sampler.py) до сервера теста и ближайших кандидатов.
+        # Возвращает поля результата `latency` и `ping_ms` (медиана до сервера теста); при выключенном замере — пусто.
+        others = [sv for sv in s.closest if sv.get('id') != best.get('id')]
+        try:
+            sampler = latency_sampler_from_settings(self.settings, [best] + others)
+            if sampler is None:
+                return {}
+            logger.info(f"Замер задержки: по {sampler.samples} ({', '.join(sampler.methods)}), "
+                        f"серверов: {len(sampler.servers)}...")
+            t0 = time.perf_counter()
+            data = sampler.run(cancel_event)
+        except (OSError, ValueError) as e:
+            logger.warning(f'Замер задержки не выполнен: {e}')
+            return {}
+        logger.info(f'Задержка ({(time.perf_counter() - t0) * 1000:.0f} мс): {describe_latency(data)}')
+        fields = {'latency': data}
+        ping = ping_from_result(data, probe_settings(self.settings)['method'])
+        if ping is not None:
+            fields['ping_ms'] = ping
+        return fields
+
+    def _start_latency_monitor(self, best: dict, cancel_event: threading.Event | None = None):
+        # Фоновый замер задержки под нагрузкой (core/loaded_latency.py) с замерами простоя до download;
+        # None, если выключен в настройках
+        monitor = monitor_from_settings(self.settings, best)
+        if monitor is None:
+            return None
+        monitor.start()
+        monitor.measure_idle(cancel_event=cancel_event)
+        return monitor
+
+    def _start_tcp_info(self, on_tcp_info=None) -> TcpInfoMonitor | None:
+        # Опрос TCP_INFO сокетов передачи (core/tcp_info.py): сокеты приходят от наблюдателя общей
+        # HTTP-сессии; None — выключено в настройках или не Linux
+        interval_ms = int(self.settings.get('sample_interval_ms', DEFAULT_INTERVAL_MS) or DEFAULT_INTERVAL_MS)
+        monitor = tcp_info_from_settings(self.settings, interval_ms, on_sample=on_tcp_info)
+        if monitor is None:
+            return None
+        get_session().add_socket_observer(monitor.watch)
+        monitor.start()
+        return monitor
+
+    def _stop_tcp_info(self, monitor: TcpInfoMonitor | None) -> None:
+        if monitor is not None:
+            get_session().remove_socket_observer(monitor.watch)
+            monitor.stop()
 
-        # выбрать сервер: приоритет у параметра server_id_override, иначе из настроек
+    def _socket_profile(self) -> SocketProfile | None:
+        # Профиль опций сокетов (core/socket_profile.py) для пула общей HTTP-сессии; движки async
+        # и multiprocess передают его своим соединениям сами. None — системные значения
+        profile = profile_from_settings(self.settings)
+        get_session().set_socket_profile(profile)
+        if profile is not None:
+            logger.info(f'Опции сокетов: {profile.describe()}')
+        return profile
+
+    def _run_phase(self, s: "speedtest.Speedtest", phase: str, sampler: ThroughputSampler, hook: AdaptiveHook,
+                   cancel_event: threading.Event | None = None, latency: LatencyMonitor | None = None,
+                   tcp_info: TcpInfoMonitor | None = None) -> float:
+        # Выполнить фазу download/upload speedtest-cli с отсчётами, замером задержки под нагрузкой и TCP_INFO.
+        # В адаптивном режиме фаза обрывается через _shutdown_event, а скорость считается без разгона.
+        ctl = hook.begin(phase)
+        # бюджет времени адаптивного режима заменяет фиксированную длительность из конфигурации
+        s.config['length'][phase] = phase_duration(ctl, s.config['length'][phase])
+        sampler.start_phase(phase)
+        for monitor in (latency, tcp_info):
+            if monitor is not None:
+                monitor.set_phase(phase)
+        try:
+            bps = s.download() if phase == 'download' else s.upload()
+        finally:
+            for monitor in (latency, tcp_info):
+                if monitor is not None:
+                    monitor.set_phase(None)
+            sampler.stop_phase()
+        if ctl is None:
+            return bps
+        if cancel_event is not None and cancel_event.is_set():
+            ctl.finish(STOP_CANCELED)
+            return bps
+        ctl.finish()
+        s._shutdown_event.clear()
+        info = ctl.summary()
+        logger.info(
+            f"Адаптивный режим: {phase} — {info['stop_reason']}, {info['duration_ms'] / 1000:.1f} с, "
+            f"{info['bytes_used'] / 1e6:.1f} МБ, разгон {info['warmup_ms']} мс"
+        )
+        return info['measured_bps']
+
+    def _run_bidirectional(self, run, cancel_event: threading.Event | None = None,
+                           latency: LatencyMonitor | None = None,
+                           tcp_info: TcpInfoMonitor | None = None) -> tuple[float, float]:
+        # Одновременная фаза download + upload (core/bidirectional.py): run() возвращает скорости направлений.
+        # Замеры задержки и TCP_INFO идут в отдельную фазу bidirectional
+        if cancel_event is not None and cancel_event.is_set():
+            raise RuntimeError('Отменено пользователем')
+        logger.info('Одновременный тест download + upload...')
+        for monitor in (latency, tcp_info):
+            if monitor is not None:
+                monitor.set_phase(PHASE_BIDIRECTIONAL)
+        try:
+            return run()
+        finally:
+            for monitor in (latency, tcp_info):
+                if monitor is not None:
+                    monitor.set_phase(None)
+
+    def _direction_speedtest(self, s: "speedtest.Speedtest", best: dict,
+                             sampler: ThroughputSampler) -> "speedtest.Speedtest":
+        # Отдельный экземпляр Speedtest для направления одновременной фазы: у download и upload speedtest-cli
+        # общие results и _shutdown_event, поэтому на одном экземпляре направления мешали бы друг другу.
+        # Конфигурация (с длительностями фаз) и сервер — как у основного экземпляра
+        st = self._create_speedtest()
+        st.config.update(copy.deepcopy(s.config))
+        st._best.update(best)
+        st.results.server = best
+        st.results.ping = s.results.ping
+        st._opener = MeteredOpener(st._opener, sampler)
+        return st
+
+    def _probe_candidates(self) -> int:
+        return int(self.settings.get('probe_candidates', DEFAULT_CANDIDATES) or DEFAULT_CANDIDATES)
+
+    def _best_server(self, s: "speedtest.Speedtest") -> dict:
+        # Лучший сервер по параллельному замеру задержки (core/server_probe.py).
+        # Заполняет те же поля, что и Speedtest.get_best_server; если ни один замер не удался —
+        # откат на последовательный выбор speedtest-cli.
+        if not s.closest:
+            s.get_closest_servers(limit=self._probe_candidates())
+        t0 = time.perf_counter()
+        ranked = rank_servers(s.closest, top=1, **probe_settings(self.settings))
+        if not ranked:
+            logger.warning('Параллельный замер задержки не дал результата, последовательный выбор speedtest-cli...')
+            return s.get_best_server()
+        latency, best = ranked[0]
+        logger.info(f'Замер задержки {len(s.closest)} серверов: {(time.perf_counter() - t0) * 1000:.0f} мс')
+        best['latency'] = latency
+        s.results.ping = latency
+        s.results.server = best
+        s._best.update(best)
+        return best
+
+    def _fastest_servers(self, s: "speedtest.Speedtest", count: int, exclude=(),
+                         cancel_event: threading.Event | None = None) -> list[tuple[float, dict]]:
+        # count ближайших по задержке серверов каталога (тот же, что у list_servers), кроме exclude
+        s.get_servers([])
+        s.closest = []  # get_closest_servers дописывает к уже выбранным
+        s.get_closest_servers(limit=max(self._probe_candidates(), count) + len(exclude))
+        excluded = {int(x) for x in exclude}
+        candidates = [sv for sv in s.closest if int(sv.get('id', 0) or 0) not in excluded]
+        return rank_servers(candidates, top=count, cancel_event=cancel_event, **probe_settings(self.settings))
+
+    def fastest_server_ids(self, count: int, exclude=(), cancel_event: threading.Event | None = None) -> list[int]:
+        # ID count ближайших по задержке серверов (параллельный замер), кроме exclude
+        ranked = self._fastest_servers(self._create_speedtest(), count, exclude, cancel_event)
+        return [int(sv['id']) for _, sv in ranked]
+
+    def _multi_servers(self, s: "speedtest.Speedtest", best: dict,
+                       cancel_event: threading.Event | None = None) -> list[dict]:
+        # Серверы теста при multi_server_count > 1 (core/multi_server.py): лучший и ещё K-1 ближайших.
+        # Выбранный вручную сервер остаётся первым, остальные добираются из полного каталога.
+        count = multi_server_count(self.settings)
+        if count <= 1:
+            return [best]
+        logger.info(f'Подбор ещё {count - 1} серверов для теста на нескольких серверах...')
+        extra = []
+        for latency, sv in self._fastest_servers(s, count - 1, exclude=(best.get('id'),), cancel_event=cancel_event):
+            sv['latency'] = latency
+            extra.append(sv)
+        if len(extra) < count - 1:
+            logger.warning(f'Доступно серверов: {len(extra) + 1} из {count}')
+        for sv in extra:
+            logger.info(f"Дополнительный сервер: {sv.get('sponsor')} — {sv.get('name')}, {sv.get('country')} "
+                        f"({sv.get('host')}) [ID {sv.get('id')}], {sv['latency']:.1f} мс")
+        return [best] + extra
+
+    def _select_server(self, s: "speedtest.Speedtest", server_id_override: int | None = None) -> dict:
+        # Выбрать сервер для теста и вернуть его описание (словарь speedtest-cli).
+        # Приоритет у параметра server_id_override, иначе — сервер из настроек, иначе — лучший по ping.
         server_id = server_id_override if server_id_override is not None else self.settings.get('server_id', None)
         if server_id:
             try:
@@ -131,7 +515,7 @@ class SpeedtestClient:
             logger.info('Подтверждение выбранного сервера...')
         else:
             logger.info('Выбор лучшего сервера...')
-        best = s.get_best_server()
+        best = self._best_server(s)
         sponsor = best.get('sponsor')
         name = best.get('name')
         cc = best.get('country')
@@ -141,28 +525,103 @@ class SpeedtestClient:
             logger.info(f"Выбран сервер: {sponsor} — {name}, {cc} ({host}) [ID {sid_best}]")
         else:
             logger.info(f"Лучший сервер: {sponsor} — {name}, {cc} ({host}) [ID {sid_best}]")
+        return best
+
+    def perform_test(self, cancel_event: threading.Event | None = None, server_id_override: int | None = None,
+                     on_sample=None, on_tcp_info=None):
+        # on_sample(phase, t_ms, bytes, interval_s) — живые поинтервальные отсчёты (вызывается из фонового потока)
+        # on_tcp_info(phase, t_ms, rows) — живые отсчёты TCP_INFO по потокам (core/tcp_info.py)
+        logger.info('Инициализация клиента Speedtest...')
+        socket_profile = self._socket_profile()
+        s = self._create_speedtest()
+        sampler, hook = self._create_sampler(on_sample, on_stop=lambda _phase, _reason: s._shutdown_event.set())
+        s._opener = MeteredOpener(s._opener, sampler)
+        # экземпляры Speedtest теста: основной и экземпляры направлений одновременной фазы
+        speedtests = [s]
+
+        # Монитор отмены: если cancel_event установлен, прервать текущий сетевой этап speedtest
+        cancel_monitor = None
+        if cancel_event is not None:
+            def _watch_cancel():
+                cancel_event.wait()
+                try:
+                    # внутренний флаг библиотеки speedtest-cli, останавливает download/upload
+                    for st in list(speedtests):
+                        st._shutdown_event.set()
+                    logger.info('Отмена: прерываю текущий сетевой этап...')
+                except Exception:
+                    pass
+
+            cancel_monitor = threading.Thread(target=_watch_cancel, name='st-cancel-watch', daemon=True)
+            cancel_monitor.start()
+
+        best = self._select_server(s, server_id_override)
+        if multi_server_count(self.settings) > 1:
+            logger.warning('Тест на нескольких серверах поддерживают движки async и multiprocess — '
+                           'выполняется тест к одному серверу')
+        sponsor = best.get('sponsor')
+        name = best.get('name')
+        cc = best.get('country')
+        host = best.get('host')
+        sid_best = best.get('id')
 
         # Проверить отмену перед началом download
         if cancel_event is not None and cancel_event.is_set():
             raise RuntimeError('Отменено пользователем')
 
-        logger.info('Тест загрузки (download)...')
-        d_bps = s.download()
+        idle_latency = self._measure_latency(s, best, cancel_event)
+        udp = self._measure_udp(cancel_event)
+        latency = self._start_latency_monitor(best, cancel_event)
+        tcp_info = self._start_tcp_info(on_tcp_info)
+        try:
+            logger.info('Тест загрузки (download)...')
+            d_bps = self._run_phase(s, 'download', sampler, hook, cancel_event, latency, tcp_info)
+
+            # Проверить отмену перед началом upload
+            if cancel_event is not None and cancel_event.is_set():
+                raise RuntimeError('Отменено пользователем')
+
+            logger.info('Тест отдачи (upload)...')
+            with PeakMemoryTracker() as upload_memory:
+                u_bps = self._run_phase(s, 'upload', sampler, hook, cancel_event, latency, tcp_info)
+
+            bidirectional = None
+            bidir_samplers = (ThroughputSampler(sampler.interval_ms), ThroughputSampler(sampler.interval_ms))
+            if bidirectional_enabled(self.settings):
+                # у каждого направления свой экземпляр Speedtest и свой счётчик отсчётов
+                down, up = (self._direction_speedtest(s, best, phase_sampler) for phase_sampler in bidir_samplers)
+                speedtests.extend((down, up))
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RuntimeError('Отменено пользователем')
+
+                def _direction(st: "speedtest.Speedtest", phase_sampler: ThroughputSampler, phase: str) -> float:
+                    phase_sampler.start_phase(phase)
+                    try:
+                        return st.download() if phase == 'download' else st.upload()
+                    finally:
+                        phase_sampler.stop_phase()
+
+                bidirectional = self._run_bidirectional(
+                    lambda: run_both(lambda: _direction(down, bidir_samplers[0], 'download'),
+                                     lambda: _direction(up, bidir_samplers[1], 'upload')),
+                    cancel_event, latency, tcp_info)
+        finally:
+            if latency is not None:
+                latency.stop()
+            self._stop_tcp_info(tcp_info)
 
-        # Проверить отмену перед началом upload
         if cancel_event is not None and cancel_event.is_set():
             raise RuntimeError('Отменено пользователем')
 
-        logger.info('Тест отдачи (upload)...')
-        u_bps = s.upload()
-
         ping_ms = s.results.ping
 
         result = {
             'timestamp': datetime.now().isoformat(timespec='seconds'),
             'ping_ms': float(ping_ms),
+            **idle_latency,
             'download_bps': float(d_bps),
             'upload_bps': float(u_bps),
+            **udp,
             'server': {
                 'id': sid_best,
                 'sponsor': sponsor,
@@ -170,7 +629,27 @@ class SpeedtestClient:
                 'country': cc,
                 'host': host,
             },
+            'samples': sampler.to_result(),
         }
+        merge_samples(result['samples'], *bidir_samplers)
+        result['throughput_stats'] = summarize_samples(result['samples'])
+        if hook.enabled:
+            result['adaptive'] = hook.summary()
+        if upload_memory.to_result():
+            result['upload_memory'] = upload_memory.to_result()
+        if latency is not None:
+            result['loaded_latency'] = latency.to_result()
+            logger.info(f'Задержка под нагрузкой: {latency.describe()}')
+        if tcp_info is not None:
+            result['tcp_info'] = tcp_info.to_result()
+            logger.info(f'TCP_INFO: {tcp_info.describe()}')
+        if socket_profile is not None:
+            result['socket_profile'] = socket_profile.to_result()
+        if bidirectional is not None:
+            result['bidirectional'] = summarize_bidirectional((d_bps, u_bps), bidirectional,
+                                                              result.get('loaded_latency'))
+            logger.info(f"Одновременный тест: {describe_bidirectional(result['bidirectional'])}")
+        logger.debug(f'HTTP-сессия: {get_session().describe()}')
         logger.info('Тест завершён успешно')
         return result
 
@@ -0,0 +1,271 @@
+# coding: utf-8
+"""
+Хранилище истории в SQLite (`storage_backend: sqlite`).
+
+Тот же API, что у JSONL-истории core/storage.py, но запросы — по индексам вместо чтения файла:
+
+- последние N записей — обратный обход по первичному ключу;
+- число записей — счётчик в таблице meta, который ведут триггеры вставки и удаления;
+- выборки по времени, серверу и движку — индексы по timestamp, server_id и engine;
+- лимит `max_history_records` удаляет записи по первичному ключу, без перезаписи.
+
+База работает в режиме WAL (чтение истории не блокирует запись результата). Запись целиком
+хранится в колонке data (JSON), ключевые поля продублированы в колонках для индексов и
+агрегатов (stats() считает их в SQL). При первом открытии существующий results.jsonl
+переносится потоково пачками executemany в одной транзакции и переименовывается в
+results.jsonl.migrated; при возврате к JSONL записи выгружаются обратно (core/storage.py).
+"""
+import json
+import logging
+import sqlite3
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    from .history_columns import COLUMNS, METRICS, PERCENTILES, percentile_rank, row_values
+except ImportError:
+    from core.history_columns import COLUMNS, METRICS, PERCENTILES, percentile_rank, row_values  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки вставки при переносе JSONL
+MIGRATE_BATCH = 1000
+
+_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT,
+        server_id INTEGER,
+        engine TEXT,
+        ping_ms REAL,
+        download_bps REAL,
+        upload_bps REAL,
+        data TEXT NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_results_timestamp ON results(timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_results_server ON results(server_id)',
+    'CREATE INDEX IF NOT EXISTS idx_results_engine ON results(engine)',
+    # перцентили в stats(): ORDER BY ... LIMIT 1 OFFSET k идёт по индексу, без сортировки таблицы
+    'CREATE INDEX IF NOT EXISTS idx_results_ping ON results(ping_ms)',
+    'CREATE INDEX IF NOT EXISTS idx_results_download ON results(download_bps)',
+    'CREATE INDEX IF NOT EXISTS idx_results_upload ON results(upload_bps)',
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+    "INSERT OR IGNORE INTO meta(key, value) VALUES ('count', 0)",
+    '''CREATE TRIGGER IF NOT EXISTS results_count_insert AFTER INSERT ON results
+        BEGIN UPDATE meta SET value = value + 1 WHERE key = 'count'; END''',
+    '''CREATE TRIGGER IF NOT EXISTS results_count_delete AFTER DELETE ON results
+        BEGIN UPDATE meta SET value = value - 1 WHERE key = 'count'; END''',
+)
+
+_INSERT = ('INSERT INTO results(timestamp, server_id, engine, ping_ms, download_bps, upload_bps, data) '
+           'VALUES (?, ?, ?, ?, ?, ?, ?)')
+
+
+def _row(result: Dict) -> tuple:
+    # Параметры вставки: индексируемые поля и запись целиком
+    server = result.get('server') or {}
+    try:
+        server_id = int(server['id']) if server.get('id') is not None else None
+    except (TypeError, ValueError):
+        server_id = None
+
+    def _num(key: str) -> Optional[float]:
+        value = result.get(key)
+        return float(value) if isinstance(value, (int, float)) else None
+
+    return (
+        str(result.get('timestamp', '')),
+        server_id,
+        result.get('engine') or 'python',
+        _num('ping_ms'),
+        _num('download_bps'),
+        _num('upload_bps'),
+        json.dumps(result, ensure_ascii=False),
+    )
+
+
+class SqliteResultStore:
+    """История результатов в файле SQLite.
+
+    Args:
+        path: Путь к файлу базы
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # запись — из потока UI, чтение истории — из него же или из фоновых задач
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            # в WAL режим NORMAL не теряет целостность, а fsync — только на контрольных точках
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            with self._conn:
+                for statement in _SCHEMA:
+                    self._conn.execute(statement)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def append(self, result: Dict, max_records: Optional[int] = None) -> None:
+        """Добавить запись и применить лимит."""
+        self.append_many([result], max_records)
+
+    def append_many(self, results: Iterable[Dict], max_records: Optional[int] = None) -> int:
+        """Добавить записи одной транзакцией (executemany) и применить лимит; вернуть их число."""
+        rows = [_row(r) for r in results]
+        with self._lock, self._conn:
+            self._conn.executemany(_INSERT, rows)
+            if max_records is not None:
+                self._trim(max_records)
+        return len(rows)
+
+    def _trim(self, max_records: int) -> None:
+        # Удалить всё старше max_records-й с конца записи (поиск по первичному ключу)
+        self._conn.execute(
+            'DELETE FROM results WHERE id <= (SELECT id FROM results ORDER BY id DESC LIMIT 1 OFFSET ?)',
+            (max(0, int(max_records)),))
+
+    def count(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT value FROM meta WHERE key = 'count'").fetchone()[0])
+
+    def load(self, limit: Optional[int] = None) -> List[Dict]:
+        """Записи от старых к новым; при limit — последние limit."""
+        with self._lock:
+            if limit:
+                rows = self._conn.execute('SELECT data FROM results ORDER BY id DESC LIMIT ?', (int(limit),)).fetchall()
+                rows.reverse()
+            else:
+                rows = self._conn.execute('SELECT data FROM results ORDER BY id').fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def page(self, start: int, count: int) -> List[Dict]:
+        """Записи с номерами start..start+count-1 от старых к новым."""
+        if start < 0 or count <= 0:
+            return []
+        with self._lock:
+            rows = self._conn.execute('SELECT data FROM results ORDER BY id LIMIT ? OFFSET ?',
+                                      (int(count), int(start))).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def stats(self) -> Dict:
+        """Агрегаты METRICS в SQL, как history_columns.summarize(): COUNT/AVG/MIN/MAX и перцентили по индексам."""
+        result = {}
+        with self._lock:
+            for name in METRICS:
+                # имена колонок — из METRICS, не из ввода
+                n, mean, low, high = self._conn.execute(
+                    f'SELECT COUNT({name}), AVG({name}), MIN({name}), MAX({name}) FROM results').fetchone()
+                if not n:
+                    result[name] = {'count': 0}
+                    continue
+                entry = {'count': n, 'mean': mean, 'min': low, 'max': high}
+                for p in PERCENTILES:
+                    entry[f'p{p}'] = self._conn.execute(
+                        f'SELECT {name} FROM results WHERE {name} IS NOT NULL ORDER BY {name} LIMIT 1 OFFSET ?',
+                        (percentile_rank(n, p),)).fetchone()[0]
+                result[name] = entry
+        return result
+
+    def metric_columns(self) -> Dict[str, array]:
+        """Числовые колонки от старых к новым в раскладке core/history_columns.py (NULL — NaN, -1).
+
+        Читает всю таблицу — для своих расчётов по всем записям; агрегаты считает stats().
+        """
+        columns = {name: array(code) for name, code in COLUMNS}
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT timestamp, ping_ms, download_bps, upload_bps, server_id FROM results ORDER BY id')
+            for timestamp, ping, download, upload, server_id in rows:
+                values = row_values({'timestamp': timestamp, 'ping_ms': ping, 'download_bps': download,
+                                     'upload_bps': upload, 'server': {'id': server_id}})
+                for (name, _), value in zip(COLUMNS, values):
+                    columns[name].append(value)
+        return columns
+
+    def iter_newest(self, batch: int = 256) -> Iterator[Dict]:
+        """Записи от новых к старым, порциями по batch строк по первичному ключу."""
+        return self._iter_data(True, batch)
+
+    def iter_oldest(self, batch: int = 1000) -> Iterator[str]:
+        """JSON записей (строки, без разбора) от старых к новым, порциями по batch строк."""
+        return self._iter_data(False, batch, parse=False)
+
+    def _iter_data(self, newest_first: bool, batch: int, parse: bool = True) -> Iterator:
+        order, compare = ('DESC', '<') if newest_first else ('ASC', '>')
+        last_id = None
+        while True:
+            with self._lock:
+                if last_id is None:
+                    rows = self._conn.execute(
+                        f'SELECT id, data FROM results ORDER BY id {order} LIMIT ?', (batch,)).fetchall()
+                else:
+                    rows = self._conn.execute(
+                        f'SELECT id, data FROM results WHERE id {compare} ? ORDER BY id {order} LIMIT ?',
+                        (last_id, batch)).fetchall()
+            if not rows:
+                return
+            for row_id, data in rows:
+                yield json.loads(data) if parse else data
+            last_id = rows[-1][0]
+
+    def query(self, start: Optional[str] = None, end: Optional[str] = None, server_id: Optional[int] = None,
+              engine: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Записи по диапазону времени [start, end] (ISO-строки), серверу и движку, от старых к новым."""
+        where, params = [], []
+        if start is not None:
+            where.append('timestamp >= ?')
+            params.append(start)
+        if end is not None:
+            where.append('timestamp <= ?')
+            params.append(end)
+        if server_id is not None:
+            where.append('server_id = ?')
+            params.append(int(server_id))
+        if engine is not None:
+            where.append('engine = ?')
+            params.append(engine)
+        sql = 'SELECT data FROM results'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY timestamp DESC, id DESC'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        rows.reverse()
+        return [json.loads(data) for (data,) in rows]
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM results')
+            self._conn.execute("UPDATE meta SET value = 0 WHERE key = 'count'")
+
+    def checkpoint(self) -> None:
+        """Перенести WAL в основной файл и усечь журнал (в простое)."""
+        with self._lock:
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def migrate_jsonl(self, records: Iterator[Dict], max_records: Optional[int] = None) -> int:
+        """Потоково перенести записи (от старых к новым) пачками по MIGRATE_BATCH в одной транзакции."""
+        total = 0
+        with self._lock, self._conn:
+            batch: List[tuple] = []
+            for record in records:
+                batch.append(_row(record))
+                if len(batch) >= MIGRATE_BATCH:
+                    self._conn.executemany(_INSERT, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                self._conn.executemany(_INSERT, batch)
+                total += len(batch)
+            if max_records is not None:
+                self._trim(max_records)
+        return total
@@ -1,109 +1,599 @@
 # coding: utf-8
+"""
+История результатов: JSON Lines в Documents/SpeedtestNextGen/data/results.jsonl
+с индексом смещений и колоночным кэшем, либо база SQLite (core/sqlite_storage.py).
+"""
 import json
-from typing import List, Dict, Optional
+import logging
+import os
+import shutil
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
 
 # Данные должны храниться там же, где и настройки: Documents/SpeedtestNextGen/
 try:
     from .settings import documents_dir, APP_FOLDER_NAME, get_settings
+    from .sqlite_storage import SqliteResultStore
+    from .history_columns import HistoryColumns, summarize
 except ImportError:
     from core.settings import documents_dir, APP_FOLDER_NAME, get_settings  # type: ignore
+    from core.sqlite_storage import SqliteResultStore  # type: ignore
+    from core.history_columns import HistoryColumns, summarize  # type: ignore
+
+logger = logging.getLogger(__name__)
 
 # Папка данных внутри каталога приложения в Документах
 APP_DATA_DIR = documents_dir() / APP_FOLDER_NAME
 DATA_DIR = APP_DATA_DIR / 'data'
+# Записи дописываются в конец за O(1); лимит `max_history_records` не переписывает файл,
+# а сдвигает голову — байтовое смещение первой живой записи
 RESULTS_FILE = DATA_DIR / 'results.jsonl'
+# Голова, число живых записей и размер файла истории; при расхождении с файлом пересобирается
+META_FILE = DATA_DIR / 'results.meta.json'
+# Байтовые смещения начала каждой записи (и отрезанных): сдвиг головы и страницы истории
+# без прохода по файлу
+INDEX_FILE = DATA_DIR / 'results.idx'
+# Колоночный кэш числовых полей (core/history_columns.py) с нумерацией строк индекса
+COLUMNS_DIR = DATA_DIR / 'results.cols'
+SQLITE_FILE = DATA_DIR / 'results.sqlite3'
+
+BACKEND_JSONL = 'jsonl'
+BACKEND_SQLITE = 'sqlite'
 
 # Максимальное количество записей по умолчанию
 DEFAULT_MAX_RECORDS = 1000
+# Сжатие переписывает файл, когда отрезанная часть не меньше порога или четверти файла
+COMPACT_MIN_BYTES = 1024 * 1024
+# Блок обратного чтения файла истории
+TAIL_BLOCK = 64 * 1024
+
+# Индекс локальный, поэтому порядок байт — платформы (как у array.tofile)
+_INDEX_MAGIC = b'SNGIDX1\0'
+# сигнатура, размер файла истории, всего смещений, номер первой живой записи
+_INDEX_HEADER = struct.Struct('=8sQQQ')
+_OFFSET = struct.Struct('=Q')
 
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+_sqlite_store: Optional[SqliteResultStore] = None
+# Запись, чтение и сжатие истории идут из разных потоков (GUI, поток теста, сжатие в QThreadPool)
+_lock = threading.RLock()
+
+
+def _locked(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _file_size() -> int:
+    try:
+        return RESULTS_FILE.stat().st_size
+    except OSError:
+        return 0
+
+
+def _index_head(size: int) -> int:
+    """Голова по индексу results.idx, если он описывает начало текущего файла; иначе 0.
+
+    Файл истории только дописывается, поэтому индекс, отставший от размера файла (запись
+    прервалась до обновления индекса), всё ещё верно указывает голову.
+    """
+    try:
+        with open(INDEX_FILE, 'rb') as f:
+            magic, indexed, total, first = _INDEX_HEADER.unpack(f.read(_INDEX_HEADER.size))
+            if (magic != _INDEX_MAGIC or indexed > size or first > total
+                    or os.fstat(f.fileno()).st_size != _INDEX_HEADER.size + total * _OFFSET.size):
+                return 0
+            head = _read_offsets(f, first, 1)[0] if first < total else indexed
+    except (OSError, struct.error, IndexError):
+        return 0
+    if head <= 0 or head > size:
+        return 0
+    # голова стоит на начале строки: перед ней — перевод строки
+    with open(RESULTS_FILE, 'rb') as f:
+        f.seek(head - 1)
+        return head if f.read(1) == b'\n' else 0
+
+
+def _scan_meta() -> Dict:
+    # Пересобрать meta одним проходом: голова — из индекса (отрезанные лимитом записи остаются
+    # отрезанными), без индекса — начало файла, лимит применится при следующей записи
+    size = _file_size()
+    head = _index_head(size) if size else 0
+    count = 0
+    if RESULTS_FILE.exists():
+        with open(RESULTS_FILE, 'rb') as f:
+            f.seek(head)
+            for line in f:
+                if line.strip():
+                    count += 1
+    return {'head': head, 'count': count, 'size': size}
+
+
+def _write_meta(meta: Dict) -> None:
+    tmp = META_FILE.with_suffix('.tmp')
+    tmp.write_text(json.dumps(meta), encoding='utf-8')
+    os.replace(tmp, META_FILE)
+
+
+def _load_meta() -> Dict:
+    try:
+        meta = json.loads(META_FILE.read_text(encoding='utf-8'))
+        if meta['size'] == _file_size() and 0 <= meta['head'] <= meta['size']:
+            return meta
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    meta = _scan_meta()
+    _write_meta(meta)
+    return meta
+
+
+def _max_records() -> int:
+    try:
+        return int(get_settings().get('max_history_records', DEFAULT_MAX_RECORDS))
+    except Exception:
+        return DEFAULT_MAX_RECORDS
+
+
+def _scan_offsets() -> array:
+    # Смещения начала всех непустых строк файла истории
+    offsets = array('Q')
+    pos = 0
+    if RESULTS_FILE.exists():
+        with open(RESULTS_FILE, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    offsets.append(pos)
+                pos += len(line)
+    return offsets
+
+
+def _write_index(offsets: array, size: int, first: int) -> None:
+    tmp = INDEX_FILE.with_suffix('.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, size, len(offsets), first))
+        offsets.tofile(f)
+    os.replace(tmp, INDEX_FILE)
+
+
+def _read_offsets(f, start: int, count: int) -> array:
+    # count смещений начиная с номера start из открытого файла индекса
+    f.seek(_INDEX_HEADER.size + start * _OFFSET.size)
+    offsets = array('Q')
+    offsets.frombytes(f.read(count * _OFFSET.size))
+    return offsets
+
+
+def _load_index(meta: Dict) -> Dict:
+    """Заголовок индекса {'total', 'first'}, согласованный с meta; иначе индекс пересобирается."""
+    try:
+        with open(INDEX_FILE, 'rb') as f:
+            magic, size, total, first = _INDEX_HEADER.unpack(f.read(_INDEX_HEADER.size))
+            valid = (magic == _INDEX_MAGIC and size == meta['size'] and first <= total
+                     and total - first == meta['count']
+                     and os.fstat(f.fileno()).st_size == _INDEX_HEADER.size + total * _OFFSET.size)
+            if valid:
+                head = _read_offsets(f, first, 1)[0] if first < total else size
+                if head == meta['head']:
+                    return {'total': total, 'first': first}
+    except (OSError, struct.error, IndexError):
+        pass
+    offsets = _scan_offsets()
+    first = bisect_left(offsets, meta['head'])
+    _write_index(offsets, meta['size'], first)
+    if len(offsets) - first != meta['count']:
+        # meta расходится с файлом: число записей берётся из индекса
+        meta['count'] = len(offsets) - first
+        _write_meta(meta)
+    return {'total': len(offsets), 'first': first}
+
+
+def _iter_indexed_records() -> Iterator[Dict]:
+    # Все непустые строки файла по порядку индекса (и отрезанные); неразборчивые — пустой записью
+    if not RESULTS_FILE.exists():
+        return
+    with open(RESULTS_FILE, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except Exception:
+                record = {}
+            yield record if isinstance(record, dict) else {}
+
+
+def _load_columns(index: Dict) -> HistoryColumns:
+    """Колоночный кэш, согласованный с индексом; иначе он пересобирается по файлу."""
+    columns = HistoryColumns(COLUMNS_DIR)
+    if columns.length() != index['total']:
+        rows = columns.rebuild(_iter_indexed_records())
+        logger.info(f'Колоночный кэш истории пересобран: {rows} строк')
+    return columns
+
 
+def _advance_head(meta: Dict, index: Dict, f, max_records: int) -> None:
+    """Сдвинуть голову за лишние старые записи: новое смещение головы берётся из индекса f."""
+    excess = meta['count'] - max_records
+    if excess <= 0:
+        return
+    index['first'] += excess
+    meta['count'] -= excess
+    if index['first'] < index['total']:
+        meta['head'] = _read_offsets(f, index['first'], 1)[0]
+    else:
+        meta['head'] = meta['size']
+
+
+def _iter_jsonl() -> Iterator[Dict]:
+    # Живые записи JSONL-истории от старых к новым
+    if not RESULTS_FILE.exists():
+        return
+    meta = _load_meta()
+    with open(RESULTS_FILE, 'rb') as f:
+        f.seek(meta['head'])
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except Exception:
+                pass
+
+
+def _reverse_lines(head: int, end: int) -> Iterator[bytes]:
+    """Непустые строки файла между head и end от последней к первой: чтение блоками с конца."""
+    with open(RESULTS_FILE, 'rb') as f:
+        pos = end
+        rest = b''
+        while pos > head:
+            step = min(TAIL_BLOCK, pos - head)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + rest).split(b'\n')
+            # первая строка блока может начинаться в предыдущем блоке
+            rest = lines[0]
+            for line in reversed(lines[1:]):
+                if line.strip():
+                    yield line
+        # голова всегда стоит на начале строки, поэтому остаток — целая запись
+        if rest.strip():
+            yield rest
+
+
+def _iter_jsonl_reversed() -> Iterator[Dict]:
+    # Живые записи JSONL-истории от новых к старым
+    if not RESULTS_FILE.exists():
+        return
+    meta = _load_meta()
+    for line in _reverse_lines(meta['head'], meta['size']):
+        try:
+            yield json.loads(line)
+        except Exception:
+            pass
+
+
+def _migrate_jsonl(store: SqliteResultStore) -> None:
+    # Одноразовый перенос results.jsonl в SQLite; файл остаётся рядом как results.jsonl.migrated
+    if not RESULTS_FILE.exists() or _file_size() == 0:
+        return
+    count = store.migrate_jsonl(_iter_jsonl(), _max_records())
+    RESULTS_FILE.replace(RESULTS_FILE.with_name(RESULTS_FILE.name + '.migrated'))
+    META_FILE.unlink(missing_ok=True)
+    INDEX_FILE.unlink(missing_ok=True)
+    HistoryColumns(COLUMNS_DIR).remove()
+    logger.info(f'История перенесена в SQLite: {count} записей')
+
+
+def _export_sqlite() -> None:
+    """Вернуть историю из SQLite в JSONL после переключения `storage_backend` обратно.
+
+    Записи базы дописываются к results.jsonl (meta, индекс и колонки пересоберутся по размеру
+    файла), база остаётся рядом как results.sqlite3.migrated.
+    """
+    global _sqlite_store
+    store = _sqlite_store if _sqlite_store is not None and _sqlite_store.path == SQLITE_FILE else None
+    _sqlite_store = None
+    if store is None:
+        store = SqliteResultStore(SQLITE_FILE)
+    try:
+        count = store.count()
+        if count:
+            tmp = RESULTS_FILE.with_suffix('.export.tmp')
+            with open(tmp, 'wb') as dst:
+                if RESULTS_FILE.exists():
+                    with open(RESULTS_FILE, 'rb') as src:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                for data in store.iter_oldest():
+                    dst.write((data + '\n').encode('utf-8'))
+            os.replace(tmp, RESULTS_FILE)
+    finally:
+        store.close()
+    SQLITE_FILE.replace(SQLITE_FILE.with_name(SQLITE_FILE.name + '.migrated'))
+    for suffix in ('-wal', '-shm'):
+        SQLITE_FILE.with_name(SQLITE_FILE.name + suffix).unlink(missing_ok=True)
+    logger.info(f'История возвращена из SQLite в JSONL: {count} записей')
+
+
+def _sqlite() -> Optional[SqliteResultStore]:
+    """SQLite-хранилище, если выбрано настройкой `storage_backend`, иначе None (JSONL).
+
+    Переключение в любую сторону переносит историю: JSONL → SQLite при первом открытии базы,
+    SQLite → JSONL при первом обращении после возврата к jsonl.
+    """
+    global _sqlite_store
+    try:
+        backend = str(get_settings().get('storage_backend', BACKEND_JSONL) or BACKEND_JSONL).lower()
+    except Exception:
+        backend = BACKEND_JSONL
+    if backend != BACKEND_SQLITE:
+        if SQLITE_FILE.exists():
+            _export_sqlite()
+        return None
+    if _sqlite_store is None or _sqlite_store.path != SQLITE_FILE:
+        _sqlite_store = SqliteResultStore(SQLITE_FILE)
+        _migrate_jsonl(_sqlite_store)
+    return _sqlite_store
+
+
+@_locked
 def append_result(result: Dict) -> None:
     # Проверка анонимного режима
     settings = get_settings()
     if settings.get('anonymous_mode', False):
         # В анонимном режиме не сохраняем историю
         return
-    
+
+    store = _sqlite()
+    if store is not None:
+        store.append(result, _max_records())
+        return
+
     RESULTS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(RESULTS_FILE, 'a', encoding='utf-8') as f:
-        f.write(json.dumps(result, ensure_ascii=False) + '\n')
-    
-    # Проверка и применение лимита записей
-    _apply_records_limit()
+    meta = _load_meta()
+    index = _load_index(meta)
+    try:
+        columns: Optional[HistoryColumns] = _load_columns(index)
+    except OSError as e:
+        # кэш необязателен: при ошибке он пересоберётся при следующем обращении
+        logger.warning(f'Колоночный кэш истории недоступен: {e}')
+        columns = None
+    # двоичный режим: смещения головы — в байтах, без преобразования переводов строк
+    line = (json.dumps(result, ensure_ascii=False) + '\n').encode('utf-8')
+    offset = meta['size']
+    with open(RESULTS_FILE, 'ab') as f:
+        f.write(line)
+    meta['size'] += len(line)
+    meta['count'] += 1
+    index['total'] += 1
+
+    with open(INDEX_FILE, 'r+b') as f:
+        f.seek(0, os.SEEK_END)
+        f.write(_OFFSET.pack(offset))
+        # Лимит записей: сдвиг головы вместо перезаписи файла
+        try:
+            _advance_head(meta, index, f, _max_records())
+        except OSError:
+            # Не прерываем работу приложения при ошибке лимита
+            pass
+        f.seek(0)
+        f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, meta['size'], index['total'], index['first']))
+    _write_meta(meta)
+    if columns is not None:
+        try:
+            columns.append(result)
+        except OSError as e:
+            logger.warning(f'Колоночный кэш истории не обновлён: {e}')
 
 
+@_locked
 def load_results(limit: Optional[int] = None) -> List[Dict]:
-    if not RESULTS_FILE.exists():
+    store = _sqlite()
+    if store is not None:
+        return store.load(limit)
+    if limit:
+        # разбираются только последние limit строк
+        items = list(islice(_iter_jsonl_reversed(), limit))
+        items.reverse()
+        return items
+    return list(_iter_jsonl())
+
+
+@_locked
+def load_results_page(start: int, count: int) -> List[Dict]:
+    """Записи с номерами start..start+count-1 (0 — самая старая), для постраничного вида истории.
+
+    Смещения страницы берутся из индекса, из файла истории читается только сама страница.
+    """
+    store = _sqlite()
+    if store is not None:
+        return store.page(start, count)
+    if start < 0 or count <= 0 or not RESULTS_FILE.exists():
         return []
-    items: List[Dict] = []
-    with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
+    meta = _load_meta()
+    index = _load_index(meta)
+    begin = index['first'] + start
+    if begin >= index['total']:
+        return []
+    count = min(count, index['total'] - begin)
+    with open(INDEX_FILE, 'rb') as f:
+        offsets = _read_offsets(f, begin, count)
+        end = _read_offsets(f, begin + count, 1)[0] if begin + count < index['total'] else meta['size']
+    with open(RESULTS_FILE, 'rb') as f:
+        f.seek(offsets[0])
+        chunk = f.read(end - offsets[0])
+    items = []
+    for line in chunk.split(b'\n'):
+        if line.strip():
             try:
                 items.append(json.loads(line))
             except Exception:
                 pass
-    if limit:
-        return items[-limit:]
     return items
 
 
+@contextmanager
+def metric_columns() -> Iterator[Dict]:
+    """Числовые колонки живых записей от старых к новым: {имя: последовательность}.
+
+    Имена — history_columns.COLUMNS (timestamp — секунды Unix, NaN — нет значения). Для JSONL это
+    отображённые в память файлы кэша, действительные только внутри блока with.
+    """
+    with _lock:
+        store = _sqlite()
+        if store is not None:
+            yield store.metric_columns()
+            return
+        meta = _load_meta()
+        index = _load_index(meta)
+        with _load_columns(index).mapped(index['first']) as columns:
+            yield columns
+
+
+@_locked
+def history_stats() -> Dict:
+    """Агрегаты истории по пингу и скоростям: {метрика: {count, mean, min, max, p50, p90, p99}}."""
+    store = _sqlite()
+    if store is not None:
+        return store.stats()
+    with metric_columns() as columns:
+        return summarize(columns)
+
+
+def iter_results_newest_first() -> Iterator[Dict]:
+    """Записи истории от новых к старым; файл (или таблица) читается лениво по мере обхода.
+
+    Генератор не держит блокировку истории: обход, начатый до записи или сжатия, видит
+    состояние файла на момент первого чтения.
+    """
+    store = _sqlite()
+    if store is not None:
+        return store.iter_newest()
+    return _iter_jsonl_reversed()
+
+
+@_locked
+def query_results(start: Optional[str] = None, end: Optional[str] = None, server_id: Optional[int] = None,
+                  engine: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+    """Записи за период [start, end] (ISO-строки timestamp), по серверу и движку, от старых к новым.
+
+    У SQLite — выборка по индексам, у JSONL — проход по файлу; limit оставляет последние записи.
+    """
+    store = _sqlite()
+    if store is not None:
+        return store.query(start, end, server_id, engine, limit)
+    items = []
+    for r in _iter_jsonl():
+        ts = str(r.get('timestamp', ''))
+        if (start is not None and ts < start) or (end is not None and ts > end):
+            continue
+        if server_id is not None and (r.get('server') or {}).get('id') != server_id:
+            continue
+        if engine is not None and (r.get('engine') or 'python') != engine:
+            continue
+        items.append(r)
+    # как у SQLite: порядок по времени
+    items.sort(key=lambda r: str(r.get('timestamp', '')))
+    return items[-limit:] if limit else items
+
+
+@_locked
 def clear_results() -> None:
+    store = _sqlite()
+    if store is not None:
+        store.clear()
+        return
     if RESULTS_FILE.exists():
-        RESULTS_FILE.write_text('', encoding='utf-8')
+        RESULTS_FILE.write_bytes(b'')
+    _write_meta({'head': 0, 'count': 0, 'size': 0})
+    _write_index(array('Q'), 0, 0)
+    HistoryColumns(COLUMNS_DIR).clear()
 
 
-def _apply_records_limit() -> None:
-    """Применить лимит записей, удаляя старые результаты если превышен лимит."""
-    try:
-        settings = get_settings()
-        max_records = int(settings.get('max_history_records', DEFAULT_MAX_RECORDS))
-        
+def _copy_range(src, dst, length: int) -> None:
+    # Скопировать length байт с текущей позиции src
+    while length > 0:
+        block = src.read(min(length, 1024 * 1024))
+        if not block:
+            break
+        dst.write(block)
+        length -= len(block)
+
+
+def compact_results(force: bool = False) -> bool:
+    """Вернуть место отрезанных записей: переписать файл с головы (без разбора JSON).
+
+    Без force файл переписывается, только когда отрезанная часть не меньше COMPACT_MIN_BYTES
+    или четверти файла. Вызывается в фоне, когда приложение простаивает. Основная часть файла
+    копируется без блокировки истории: запись и чтение ждут только дописывания хвоста,
+    появившегося за время копирования, и замены файла, индекса и колонок.
+
+    Returns:
+        True, если файл переписан
+    """
+    with _lock:
+        store = _sqlite()
+        if store is not None:
+            # у SQLite место освобождается само; в простое журнал WAL переносится в базу
+            store.checkpoint()
+            return False
         if not RESULTS_FILE.exists():
-            return
-        
-        # Загрузить все записи
-        items: List[Dict] = []
-        with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    items.append(json.loads(line))
-                except Exception:
-                    pass
-        
-        # Если превышен лимит, оставить только последние max_records записей
-        if len(items) > max_records:
-            items = items[-max_records:]
-            
-            # Перезаписать файл с ограниченным количеством записей
-            with open(RESULTS_FILE, 'w', encoding='utf-8') as f:
-                for item in items:
-                    f.write(json.dumps(item, ensure_ascii=False) + '\n')
-    except Exception:
-        # Не прерываем работу приложения при ошибке лимита
-        pass
+            return False
+        meta = _load_meta()
+        head, copied = meta['head'], meta['size']
+        if head == 0 or (not force and head < COMPACT_MIN_BYTES and head * 4 < copied):
+            return False
+        inode = RESULTS_FILE.stat().st_ino
+    tmp = RESULTS_FILE.with_suffix('.tmp')
+    # файл только дописывается, поэтому байты [head, copied) за время копирования не меняются
+    with open(RESULTS_FILE, 'rb') as src, open(tmp, 'wb') as dst:
+        src.seek(head)
+        _copy_range(src, dst, copied - head)
+    with _lock:
+        meta = _load_meta()
+        # историю очистили, сжали или перенесли в SQLite, пока шло копирование
+        if (_sqlite() is not None or not RESULTS_FILE.exists() or RESULTS_FILE.stat().st_ino != inode
+                or meta['size'] < copied or meta['head'] < head):
+            tmp.unlink(missing_ok=True)
+            return False
+        index = _load_index(meta)
+        with open(RESULTS_FILE, 'rb') as src, open(tmp, 'ab') as dst:
+            src.seek(copied)
+            _copy_range(src, dst, meta['size'] - copied)
+        with open(INDEX_FILE, 'rb') as f:
+            live = _read_offsets(f, index['first'], index['total'] - index['first'])
+        os.replace(tmp, RESULTS_FILE)
+        size = _file_size()
+        _write_meta({'head': meta['head'] - head, 'count': meta['count'], 'size': size})
+        _write_index(array('Q', (offset - head for offset in live)), size, 0)
+        columns = HistoryColumns(COLUMNS_DIR)
+        if columns.length() == index['total']:
+            columns.drop_front(index['first'])
+        else:
+            # пересоберётся при следующем обращении
+            columns.remove()
+    return True
 
 
+@_locked
 def get_total_records_count() -> int:
     """Получить общее количество записей в истории."""
+    store = _sqlite()
+    if store is not None:
+        return store.count()
     if not RESULTS_FILE.exists():
         return 0
-    
-    count = 0
     try:
-        with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    count += 1
-    except Exception:
-        pass
-    
-    return count
-
+        return _load_meta()['count']
+    except OSError:
+        return 0
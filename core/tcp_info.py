@@ -0,0 +1,240 @@
+# coding: utf-8
+"""
+Телеметрия TCP по потокам передачи (Linux, getsockopt TCP_INFO).
+
+Когда тест показывает низкую скорость, по одной цифре не понять, кто виноват: клиент, сервер
+или путь. TcpInfoMonitor раз в интервал читает struct tcp_info каждого сокета передачи движка
+python (сокеты приходят из пула общей HTTP-сессии, core/http_session.py) и копит ряды RTT,
+rttvar, окна перегрузки, повторных передач и delivery rate ядра.
+
+В результат попадает компактная сводка по каждому потоку (`tcp_info`), сырые ряды отдаются
+живыми отсчётами в UI (on_sample) и доступны через series(). На других ОС и при выключенном
+пуле соединений (`http_pool`) телеметрии нет.
+"""
+import logging
+import socket
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+try:
+    from .loaded_latency import percentile
+except ImportError:
+    from core.loaded_latency import percentile  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# struct tcp_info из linux/tcp.h до delivery_rate включительно (ядро 4.9+): 8 полей u8, 24 u32
+# (tcpi_rto … tcpi_total_retrans), 4 u64 (pacing_rate … bytes_received), 6 u32 (segs_out … data_segs_out),
+# u64 delivery_rate. Старые ядра возвращают префикс — недостающие поля не заполняются.
+_TCP_INFO = struct.Struct('=8B24I4Q6IQ')
+_FIELDS = (
+    'state', 'ca_state', 'retransmits', 'probes', 'backoff', 'options', 'wscale', 'app_limited',
+    'rto', 'ato', 'snd_mss', 'rcv_mss', 'unacked', 'sacked', 'lost', 'retrans', 'fackets',
+    'last_data_sent', 'last_ack_sent', 'last_data_recv', 'last_ack_recv',
+    'pmtu', 'rcv_ssthresh', 'rtt', 'rttvar', 'snd_ssthresh', 'snd_cwnd', 'advmss', 'reordering',
+    'rcv_rtt', 'rcv_space', 'total_retrans',
+    'pacing_rate', 'max_pacing_rate', 'bytes_acked', 'bytes_received',
+    'segs_out', 'segs_in', 'notsent_bytes', 'min_rtt', 'data_segs_in', 'data_segs_out',
+    'delivery_rate',
+)
+# Минимальный ответ ядра, с которым есть смысл работать: до tcpi_total_retrans
+_MIN_LENGTH = 8 + 24 * 4
+
+TCP_INFO_SUPPORTED = sys.platform.startswith('linux') and hasattr(socket, 'TCP_INFO')
+
+# Поля строки сырого ряда потока
+SERIES_FIELDS = ('t_ms', 'rtt_ms', 'rttvar_ms', 'cwnd', 'retransmits', 'delivery_rate_bps', 'notsent_bytes')
+DEFAULT_INTERVAL_MS = 100
+
+
+def read_tcp_info(sock) -> Optional[dict]:
+    """struct tcp_info сокета словарём (rtt/rttvar/min_rtt — в мкс, rate — байт/с) или None."""
+    if not TCP_INFO_SUPPORTED:
+        return None
+    try:
+        raw = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, _TCP_INFO.size)
+    except (OSError, ValueError):
+        return None
+    if len(raw) < _MIN_LENGTH:
+        return None
+    values = _TCP_INFO.unpack(raw.ljust(_TCP_INFO.size, b'\0'))
+    info = dict(zip(_FIELDS, values))
+    if len(raw) < _TCP_INFO.size:
+        info['delivery_rate'] = None
+    return info
+
+
+def _row(t_ms: int, info: dict) -> list:
+    # строка сырого ряда в порядке SERIES_FIELDS
+    rate = info.get('delivery_rate')
+    return [
+        t_ms,
+        round(info['rtt'] / 1000.0, 3),
+        round(info['rttvar'] / 1000.0, 3),
+        info['snd_cwnd'],
+        info['total_retrans'],
+        rate * 8 if rate is not None else None,
+        info.get('notsent_bytes'),
+    ]
+
+
+def summarize_stream(rows: List[list], mss: int) -> dict:
+    """Сводка ряда одного потока: RTT, rttvar, окно перегрузки, повторные передачи, delivery rate."""
+    rtts = [r[1] for r in rows if r[1] > 0]
+    rates = [r[5] for r in rows if r[5]]
+    data: dict = {
+        'samples': len(rows),
+        'mss': mss,
+        'cwnd': {'max': max(r[3] for r in rows), 'last': rows[-1][3]},
+        # счётчик ядра накопительный за жизнь соединения, а соединения пула переживают фазы
+        'retransmits': rows[-1][4] - rows[0][4],
+    }
+    if rtts:
+        data['rtt_ms'] = {'min': min(rtts), 'p50': percentile(rtts, 50), 'max': max(rtts)}
+        data['rttvar_ms'] = percentile([r[2] for r in rows], 50)
+    if rates:
+        data['delivery_rate_bps'] = {'p50': percentile(rates, 50), 'max': max(rates)}
+    return data
+
+
+class TcpInfoMonitor:
+    """Периодический опрос TCP_INFO сокетов передачи с разбивкой по фазам.
+
+    Сокеты регистрируются через watch() (наблюдатель общей HTTP-сессии), опрос идёт
+    только внутри фазы (set_phase).
+
+    Args:
+        interval_ms: Период опроса
+        on_sample: Колбэк живых отсчётов (phase, t_ms, rows) — rows: {номер потока: строка SERIES_FIELDS}
+    """
+
+    def __init__(self, interval_ms: int = DEFAULT_INTERVAL_MS,
+                 on_sample: Optional[Callable[[str, int, Dict[int, list]], None]] = None):
+        self.interval_ms = max(10, int(interval_ms))
+        self._on_sample = on_sample
+        self._sockets: Dict[int, tuple] = {}     # id(sock) -> (номер потока, сокет)
+        self._series: Dict[str, Dict[int, List[list]]] = {}
+        self._mss: Dict[int, int] = {}
+        self._phase: Optional[str] = None
+        self._phase_start = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, sock) -> None:
+        """Начать опрашивать сокет (повторная регистрация того же сокета ничего не меняет)."""
+        with self._lock:
+            if id(sock) not in self._sockets:
+                self._sockets[id(sock)] = (len(self._mss), sock)
+                self._mss[len(self._mss)] = 0
+
+    def set_phase(self, phase: Optional[str]) -> None:
+        """Начать учитывать опросы в фазе phase (None — приостановить опрос)."""
+        with self._lock:
+            self._phase = phase
+            self._phase_start = time.perf_counter()
+            if phase is not None:
+                self._series.setdefault(phase, {})
+
+    def poll(self) -> None:
+        """Один опрос всех зарегистрированных сокетов."""
+        with self._lock:
+            phase = self._phase
+            t_ms = int((time.perf_counter() - self._phase_start) * 1000)
+            sockets = list(self._sockets.items())
+        if phase is None:
+            return
+        rows: Dict[int, list] = {}
+        closed = []
+        for key, (stream, sock) in sockets:
+            info = read_tcp_info(sock) if sock.fileno() >= 0 else None
+            if info is None:
+                closed.append(key)
+                continue
+            rows[stream] = _row(t_ms, info)
+            self._mss[stream] = info['snd_mss']
+        with self._lock:
+            for key in closed:
+                self._sockets.pop(key, None)
+            if self._phase != phase:
+                return
+            series = self._series[phase]
+            for stream, row in rows.items():
+                series.setdefault(stream, []).append(row)
+        if rows and self._on_sample is not None:
+            self._on_sample(phase, t_ms, rows)
+
+    def _loop(self) -> None:
+        step = self.interval_ms / 1000.0
+        while not self._stop.wait(step):
+            self.poll()
+
+    def start(self) -> None:
+        """Запустить фоновый опрос."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='tcp-info', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Остановить фоновый опрос."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        with self._lock:
+            self._phase = None
+            self._sockets.clear()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_exc):
+        self.stop()
+
+    # --- результат ---
+
+    def series(self) -> Dict[str, Dict[int, List[list]]]:
+        """Сырые ряды: {фаза: {номер потока: [строки SERIES_FIELDS]}}."""
+        with self._lock:
+            return {phase: {s: list(rows) for s, rows in streams.items()} for phase, streams in self._series.items()}
+
+    def to_result(self) -> dict:
+        """Поле `tcp_info` результата: сводка по каждому потоку каждой фазы."""
+        data: dict = {'interval_ms': self.interval_ms}
+        for phase, streams in self.series().items():
+            summaries = []
+            for stream, rows in sorted(streams.items()):
+                if rows:
+                    summaries.append(dict(stream=stream, **summarize_stream(rows, self._mss.get(stream, 0))))
+            if summaries:
+                data[phase] = summaries
+        return data
+
+    def describe(self) -> str:
+        """Краткая сводка для лога: потоки, медиана RTT и повторные передачи по фазам."""
+        parts = []
+        for phase, streams in self.to_result().items():
+            if not isinstance(streams, list):
+                continue
+            rtts = [s['rtt_ms']['p50'] for s in streams if 'rtt_ms' in s]
+            retrans = sum(s['retransmits'] for s in streams)
+            rtt = f', RTT p50 {percentile(rtts, 50):.1f} мс' if rtts else ''
+            parts.append(f'{phase}: {len(streams)} потоков{rtt}, повторных передач {retrans}')
+        return '; '.join(parts) or 'нет отсчётов'
+
+
+def monitor_from_settings(settings, interval_ms: int, on_sample=None) -> Optional[TcpInfoMonitor]:
+    """TcpInfoMonitor по настройкам (`tcp_info`, `http_pool`) или None (выключено или не Linux)."""
+    if not TCP_INFO_SUPPORTED or not settings.get('tcp_info', True):
+        return None
+    if not settings.get('http_pool', True):
+        logger.debug('Телеметрия TCP_INFO недоступна без общего пула соединений (http_pool)')
+        return None
+    return TcpInfoMonitor(interval_ms, on_sample=on_sample)
@@ -0,0 +1,343 @@
+# coding: utf-8
+"""
+UDP-замер джиттера, потерь и переупорядочивания пакетов.
+
+HTTP-движки видят только TCP, который прячет потери повторными передачами, поэтому
+проблемы качества голоса и видеосвязи по ним не видны. UdpProbe отправляет на UDP
+echo-сервер пакеты с порядковым номером и временем отправки с заданной частотой и по
+вернувшимся пакетам считает:
+
+- джиттер по RFC 3550 (A.8): J += (|D(i-1, i)| - J) / 16, где D — разница времени
+  прохождения соседних по приходу пакетов (здесь время прохождения — RTT, оба отсчёта
+  берутся по часам клиента, поэтому синхронизация часов не нужна);
+- потери — пакеты, не вернувшиеся за `timeout` после окончания отправки;
+- переупорядочивание — пакеты, пришедшие после пакета с большим номером;
+- дубликаты и распределение RTT.
+
+Серверы speedtest.net UDP echo не предоставляют, поэтому адрес задаётся настройкой
+`udp_endpoint`. Для проверки на loopback и для развёртывания на своём хосте есть
+встроенный UdpEchoServer:
+
+    python -m core.udp_probe serve --host 0.0.0.0 --port 9000
+    python -m core.udp_probe probe 127.0.0.1:9000 --rate 50 --duration 5
+"""
+import argparse
+import heapq
+import json
+import logging
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from typing import List, Optional, Tuple
+
+try:
+    from .loaded_latency import percentile
+    from .socket_profile import address_family
+except ImportError:
+    from core.loaded_latency import percentile  # type: ignore
+    from core.socket_profile import address_family  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SNGU'
+# magic, токен прогона, номер пакета, время отправки (нс, часы клиента)
+HEADER = struct.Struct('!4sIIQ')
+
+DEFAULT_PORT = 9000
+DEFAULT_RATE_PPS = 50       # 20 мс между пакетами, как у голосовых кодеков
+DEFAULT_DURATION = 5.0
+DEFAULT_PAYLOAD = 172       # RTP-пакет G.711 на 20 мс: 160 байт звука + 12 байт заголовка
+DEFAULT_TIMEOUT = 1.0       # сколько ждать опоздавшие пакеты после окончания отправки
+MAX_DATAGRAM = 65507
+# Коэффициент сглаживания джиттера RFC 3550
+JITTER_GAIN = 1.0 / 16.0
+
+
+def parse_endpoint(endpoint: str, default_port: int = DEFAULT_PORT) -> Tuple[str, int]:
+    """Разобрать `host:port`, `[v6]:port` или `host` в (host, port)."""
+    endpoint = str(endpoint or '').strip()
+    if endpoint.startswith('['):
+        host, _, rest = endpoint[1:].partition(']')
+        port = rest.lstrip(':')
+    elif endpoint.count(':') == 1:
+        host, port = endpoint.split(':')
+    else:
+        host, port = endpoint, ''
+    if not host:
+        raise ValueError(f'Некорректный адрес UDP echo: {endpoint!r}')
+    return host, int(port) if port else default_port
+
+
+class UdpProbe:
+    """Один прогон UDP-замера.
+
+    Args:
+        host: Адрес UDP echo-сервера
+        port: Порт UDP echo-сервера
+        rate_pps: Частота отправки, пакетов в секунду
+        duration: Длительность отправки, сек
+        payload_size: Размер пакета (не меньше заголовка)
+        timeout: Ожидание опоздавших пакетов после окончания отправки, сек
+        source_address: Локальный адрес сокета ('' — выбирает ОС)
+    """
+
+    def __init__(self, host: str, port: int = DEFAULT_PORT, rate_pps: float = DEFAULT_RATE_PPS,
+                 duration: float = DEFAULT_DURATION, payload_size: int = DEFAULT_PAYLOAD,
+                 timeout: float = DEFAULT_TIMEOUT, source_address: str = ''):
+        self.host = host
+        self.port = int(port)
+        self.rate_pps = max(1.0, float(rate_pps))
+        self.duration = max(0.1, float(duration))
+        self.payload_size = min(MAX_DATAGRAM, max(HEADER.size, int(payload_size)))
+        self.timeout = max(0.05, float(timeout))
+        self.source_address = source_address
+        self._token = int.from_bytes(os.urandom(4), 'big')
+
+    def _packet(self, seq: int, template: bytearray) -> bytearray:
+        HEADER.pack_into(template, 0, MAGIC, self._token, seq, time.perf_counter_ns())
+        return template
+
+    def run(self, cancel_event: threading.Event | None = None) -> dict:
+        """Выполнить замер и вернуть поле `udp` результата.
+
+        Raises:
+            ConnectionError: echo-сервер не ответил ни на один пакет
+        """
+        family = address_family(self.source_address) if self.source_address else None
+        # при заданном source_address — адрес сервера того же семейства (IPv4 или IPv6)
+        family, stype, proto, _, addr = socket.getaddrinfo(self.host, self.port, family=family or 0,
+                                                           type=socket.SOCK_DGRAM)[0]
+        count = max(1, int(round(self.rate_pps * self.duration)))
+        step = 1.0 / self.rate_pps
+        template = bytearray(self.payload_size)
+        buf = bytearray(MAX_DATAGRAM)
+        seen = bytearray(count)
+        rtts: List[float] = []
+        jitter = 0.0
+        prev_transit: Optional[float] = None
+        sent = duplicates = reordered = refused = 0
+        highest = -1
+
+        with socket.socket(family, stype, proto) as sock:
+            if self.source_address:
+                sock.bind((self.source_address, 0))
+            sock.connect(addr)
+            start = time.perf_counter()
+            next_send = start
+            deadline = start + count * step + self.timeout
+            while True:
+                now = time.perf_counter()
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                if sent < count and now >= next_send:
+                    try:
+                        sock.send(self._packet(sent, template))
+                    except ConnectionRefusedError:
+                        refused += 1
+                    sent += 1
+                    next_send = start + sent * step
+                    continue
+                received = len(rtts)
+                if now >= deadline or (sent == count and received == count):
+                    break
+                wake = next_send if sent < count else deadline
+                sock.settimeout(max(0.0005, wake - now))
+                try:
+                    n = sock.recv_into(buf)
+                except socket.timeout:
+                    continue
+                except ConnectionRefusedError:
+                    # ICMP port unreachable на предыдущую отправку
+                    refused += 1
+                    continue
+                arrived = time.perf_counter_ns()
+                if n < HEADER.size:
+                    continue
+                magic, token, seq, sent_ns = HEADER.unpack_from(buf)
+                if magic != MAGIC or token != self._token or seq >= count:
+                    continue
+                if seen[seq]:
+                    duplicates += 1
+                    continue
+                seen[seq] = 1
+                if seq < highest:
+                    reordered += 1
+                highest = max(highest, seq)
+                transit = (arrived - sent_ns) / 1e6
+                rtts.append(transit)
+                if prev_transit is not None:
+                    jitter += (abs(transit - prev_transit) - jitter) * JITTER_GAIN
+                prev_transit = transit
+
+        if sent and not rtts:
+            reason = 'порт закрыт' if refused else 'нет ответа'
+            raise ConnectionError(f'UDP echo {self.host}:{self.port} недоступен ({reason})')
+        lost = sent - len(rtts)
+        data = {
+            'endpoint': f'{self.host}:{self.port}',
+            'rate_pps': self.rate_pps,
+            'payload_bytes': self.payload_size,
+            'sent': sent,
+            'received': len(rtts),
+            'lost': lost,
+            'loss_pct': round(100.0 * lost / sent, 2) if sent else 0.0,
+            'duplicates': duplicates,
+            'reordered': reordered,
+            'reorder_pct': round(100.0 * reordered / len(rtts), 2) if rtts else 0.0,
+            'jitter_ms': round(jitter, 3),
+        }
+        if rtts:
+            data['rtt_ms'] = {
+                'min': round(min(rtts), 3),
+                'p50': round(percentile(rtts, 50), 3),
+                'p90': round(percentile(rtts, 90), 3),
+                'p99': round(percentile(rtts, 99), 3),
+                'max': round(max(rtts), 3),
+            }
+        return data
+
+
+def probe_from_settings(settings) -> Optional[UdpProbe]:
+    """UdpProbe по настройкам (`udp_endpoint`, `udp_rate_pps`, `udp_duration`, `udp_payload_bytes`,
+    `source_address`) или None."""
+    endpoint = str(settings.get('udp_endpoint', '') or '').strip()
+    if not endpoint:
+        return None
+    host, port = parse_endpoint(endpoint)
+    return UdpProbe(
+        host, port,
+        rate_pps=float(settings.get('udp_rate_pps', DEFAULT_RATE_PPS) or DEFAULT_RATE_PPS),
+        duration=float(settings.get('udp_duration', DEFAULT_DURATION) or DEFAULT_DURATION),
+        payload_size=int(settings.get('udp_payload_bytes', DEFAULT_PAYLOAD) or DEFAULT_PAYLOAD),
+        source_address=str(settings.get('source_address', '') or '').strip(),
+    )
+
+
+class UdpEchoServer:
+    """UDP echo-сервер: возвращает каждый пакет отправителю без изменений.
+
+    Используется как контекстный менеджер (фоновый поток) или через serve_forever().
+    С профилем канала (core/shaping.py) пакеты теряются с вероятностью `loss` и возвращаются
+    с задержкой `delay ± jitter` (поэтому возможна и перестановка).
+
+    Args:
+        host: Адрес прослушивания
+        port: Порт (0 — выбрать свободный)
+        profile: Профиль канала (ShapingProfile) или None
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, profile=None):
+        self.profile = profile if profile is not None and profile.enabled else None
+        family = socket.AF_INET6 if ':' in host else socket.AF_INET
+        self._sock = socket.socket(family, socket.SOCK_DGRAM)
+        self._sock.bind((host, port))
+        self._sock.settimeout(0.2)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.packets = 0
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._sock.getsockname()[:2]
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.address
+        return f'[{host}]:{port}' if ':' in host else f'{host}:{port}'
+
+    def serve_forever(self) -> None:
+        buf = bytearray(MAX_DATAGRAM)
+        view = memoryview(buf)
+        profile = self.profile
+        # отложенные ответы: (время отправки, номер, данные, адрес)
+        pending: list = []
+        seq = 0
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            while pending and pending[0][0] <= now:
+                _, _, data, peer = heapq.heappop(pending)
+                try:
+                    self._sock.sendto(data, peer)
+                except OSError:
+                    pass
+            self._sock.settimeout(min(0.2, max(0.0005, pending[0][0] - now)) if pending else 0.2)
+            try:
+                n, peer = self._sock.recvfrom_into(buf)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._stop.is_set():
+                    break
+                continue
+            self.packets += 1
+            if profile is None:
+                try:
+                    self._sock.sendto(view[:n], peer)
+                except OSError:
+                    pass
+                continue
+            if profile.drop():
+                continue
+            seq += 1
+            heapq.heappush(pending, (time.perf_counter() + profile.sample_delay(), seq, bytes(view[:n]), peer))
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='udp-echo', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._sock.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='UDP echo-сервер и замер джиттера/потерь')
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help='Запустить UDP echo-сервер')
+    serve.add_argument('--host', default='0.0.0.0')
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--shape', default='', help='Профиль канала: delay=20,jitter=5,loss=0.5 (core/shaping.py)')
+    probe = sub.add_parser('probe', help='Замерить джиттер и потери до echo-сервера')
+    probe.add_argument('endpoint', help='host:port echo-сервера')
+    probe.add_argument('--rate', type=float, default=DEFAULT_RATE_PPS, help='Пакетов в секунду')
+    probe.add_argument('--duration', type=float, default=DEFAULT_DURATION, help='Длительность, сек')
+    probe.add_argument('--size', type=int, default=DEFAULT_PAYLOAD, help='Размер пакета, байт')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        try:
+            from .shaping import ShapingProfile
+        except ImportError:
+            from core.shaping import ShapingProfile  # type: ignore
+        try:
+            profile = ShapingProfile.parse(args.shape)
+        except ValueError as e:
+            parser.error(str(e))
+        server = UdpEchoServer(args.host, args.port, profile)
+        print(f'UDP echo: {server.endpoint}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+        return 0
+
+    host, port = parse_endpoint(args.endpoint)
+    result = UdpProbe(host, port, rate_pps=args.rate, duration=args.duration, payload_size=args.size).run()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
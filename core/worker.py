@@ -1,6 +1,7 @@
 # coding: utf-8
 import logging
-from threading import Event
+import time
+from threading import Event, Lock
 
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
 
@@ -8,12 +9,104 @@ from .speedtest_client import SpeedtestClient
 from .settings import get_settings
 try:
     from .ookla_client import OoklaCliClient
+    from .async_engine import AsyncSpeedtestClient
+    from .mp_engine import MultiProcessSpeedtestClient
+    from .http_session import get_session
+    from .multipath import MultipathTest, multipath_from_settings
+    from .sampling import concat_samples, summarize_samples
+    from .storage import append_result
 except ImportError:  # fallback при локальном запуске
     from core.ookla_client import OoklaCliClient  # type: ignore
+    from core.async_engine import AsyncSpeedtestClient  # type: ignore
+    from core.mp_engine import MultiProcessSpeedtestClient  # type: ignore
+    from core.http_session import get_session  # type: ignore
+    from core.multipath import MultipathTest, multipath_from_settings  # type: ignore
+    from core.sampling import concat_samples, summarize_samples  # type: ignore
+    from core.storage import append_result  # type: ignore
 
 logger = logging.getLogger(__name__)
 
 
+def create_client(engine: str):
+    # Создать клиент измерения по имени движка: 'python' | 'async' | 'multiprocess' | 'ookla'
+    engine = str(engine or 'python').lower()
+    if engine == 'ookla':
+        return OoklaCliClient()
+    if engine == 'async':
+        return AsyncSpeedtestClient()
+    if engine == 'multiprocess':
+        return MultiProcessSpeedtestClient()
+    return SpeedtestClient()
+
+
+def _save_result(result: dict) -> None:
+    # Сохранение в историю в потоке теста: запись может ждать сжатия истории, GUI — нет
+    try:
+        append_result(result)
+    except Exception as e:
+        logger.error(f'Не удалось сохранить результат в историю: {e}')
+
+
+class _SampleThrottle:
+    # Прореживание живых отсчётов для UI: не чаще одного сигнала за period_ms.
+    # В сигнал уходит средняя скорость за накопленное окно: {'phase', 't_ms', 'bytes', 'bps'}.
+
+    def __init__(self, signal, period_ms: int):
+        self._signal = signal
+        self._period = max(0.0, period_ms / 1000.0)
+        self._lock = Lock()
+        self._phase = None
+        self._bytes = 0
+        self._window = 0.0
+        self._last_emit = 0.0
+
+    def __call__(self, phase: str, t_ms: int, nbytes: int, interval_s: float):
+        with self._lock:
+            if phase != self._phase:
+                self._phase = phase
+                self._bytes = 0
+                self._window = 0.0
+            self._bytes += nbytes
+            self._window += interval_s
+            now = time.monotonic()
+            if now - self._last_emit < self._period:
+                return
+            bps = (self._bytes * 8.0 / self._window) if self._window > 0 else 0.0
+            payload = {'phase': phase, 't_ms': t_ms, 'bytes': self._bytes, 'bps': bps}
+            self._bytes = 0
+            self._window = 0.0
+            self._last_emit = now
+        self._signal.emit(payload)
+
+
+class _TcpInfoThrottle:
+    # Прореживание живых отсчётов TCP_INFO (core/tcp_info.py) для UI: не чаще одного сигнала за period_ms.
+    # В сигнал уходят сырые строки потоков и агрегат по ним:
+    # {'phase', 't_ms', 'streams', 'rtt_ms' (медиана), 'cwnd', 'retransmits', 'delivery_rate_bps' (суммы), 'rows'}.
+
+    def __init__(self, signal, period_ms: int):
+        self._signal = signal
+        self._period = max(0.0, period_ms / 1000.0)
+        self._last_emit = 0.0
+
+    def __call__(self, phase: str, t_ms: int, rows: dict):
+        now = time.monotonic()
+        if now - self._last_emit < self._period:
+            return
+        self._last_emit = now
+        rtts = sorted(r[1] for r in rows.values() if r[1] > 0)
+        self._signal.emit({
+            'phase': phase,
+            't_ms': t_ms,
+            'streams': len(rows),
+            'rtt_ms': rtts[len(rtts) // 2] if rtts else None,
+            'cwnd': sum(r[3] for r in rows.values()),
+            'retransmits': sum(r[4] for r in rows.values()),
+            'delivery_rate_bps': sum(r[5] or 0 for r in rows.values()),
+            'rows': rows,
+        })
+
+
 class SpeedtestWorker(QObject):
     
     # Фоновый исполнитель для запуска speedtest без блокировки GUI.
@@ -22,6 +115,8 @@ class SpeedtestWorker(QObject):
     stageChanged = pyqtSignal(str)       # init | servers | best | download | upload | saving | done | canceled | error
     log = pyqtSignal(str)
     resultReady = pyqtSignal(dict)
+    sampleReady = pyqtSignal(dict)       # живой отсчёт скорости: phase | t_ms | bytes | bps (не чаще live_update_ms)
+    tcpInfoReady = pyqtSignal(dict)      # живой отсчёт TCP_INFO движка python (см. _TcpInfoThrottle)
     error = pyqtSignal(str)
     finished = pyqtSignal()
 
@@ -29,6 +124,8 @@ class SpeedtestWorker(QObject):
         super().__init__()
         self._cancel_event = Event()
         self._settings = get_settings()
+        self._throttle = _SampleThrottle(self.sampleReady, int(self._settings.get('live_update_ms', 250) or 0))
+        self._tcp_throttle = _TcpInfoThrottle(self.tcpInfoReady, int(self._settings.get('live_update_ms', 250) or 0))
 
     def _format_speed(self, bps: float) -> str:
         units = self._settings.get('units', 'Mbps')
@@ -49,16 +146,38 @@ class SpeedtestWorker(QObject):
             return True
         return False
 
+    def _run_multipath(self, multipath: MultipathTest):
+        # Тест по нескольким путям (core/multipath.py): запись каждого пути и запись сравнения с общим test_id
+        self.stageChanged.emit('download')
+        records = multipath.run(cancel_event=self._cancel_event, on_sample=self._throttle,
+                                on_tcp_info=self._tcp_throttle)
+        if self._check_cancel():
+            return
+        self.stageChanged.emit('saving')
+        logger.info(f'Итог по путям (test_id {multipath.test_id}): {multipath.describe(records)}')
+        for record in records:
+            _save_result(record)
+            self.resultReady.emit(record)
+        self.stageChanged.emit('done')
+        self.finished.emit()
+
     @pyqtSlot()
     def run(self):
         try:
-            # Выбор движка: 'python' | 'ookla'
+            multipath = multipath_from_settings(create_client, self._settings)
+            if multipath is not None:
+                self._run_multipath(multipath)
+                return
+            # Выбор движка: 'python' | 'async' | 'multiprocess' | 'ookla'
             engine = str(self._settings.get('engine', 'python')).lower()
+            client = create_client(engine)
             if engine == 'ookla':
-                client = OoklaCliClient()
                 logger.info('Движок: Ookla CLI')
+            elif engine == 'async':
+                logger.info('Движок: Python asyncio')
+            elif engine == 'multiprocess':
+                logger.info('Движок: Python multiprocessing')
             else:
-                client = SpeedtestClient()
                 logger.info('Движок: Python speedtest-cli')
 
             self.stageChanged.emit('init')
@@ -77,7 +196,9 @@ class SpeedtestWorker(QObject):
                 return
 
             self.stageChanged.emit('download')
-            result = client.perform_test(cancel_event=self._cancel_event)  # включает download и upload
+            # включает download и upload; живые отсчёты уходят в sampleReady
+            result = client.perform_test(cancel_event=self._cancel_event, on_sample=self._throttle,
+                                         on_tcp_info=self._tcp_throttle)
 
             if self._check_cancel():
                 return
@@ -96,14 +217,20 @@ class SpeedtestWorker(QObject):
                 sid = s.get('id', '-')
                 ts = result.get('timestamp', '-')
 
+                udp = ''
+                if result.get('jitter_ms') is not None:
+                    udp += f" | Jitter {float(result['jitter_ms']):.1f} ms"
+                if result.get('packet_loss_pct') is not None:
+                    udp += f" | Loss {float(result['packet_loss_pct']):.1f}%"
                 logger.info(
-                    f"Итог: Ping {ping:.0f} ms | Download {self._format_speed(d_bps)} | "
+                    f"Итог: Ping {ping:.0f} ms{udp} | Download {self._format_speed(d_bps)} | "
                     f"Upload {self._format_speed(u_bps)} | Сервер: {sponsor} — {name}, {country} "
                     f"({host}) [ID {sid}] | {ts}"
                 )
             except Exception:
                 # не срываем пайплайн, если форматирование не удалось
                 pass
+            _save_result(result)
             self.resultReady.emit(result)
 
             self.stageChanged.emit('done')
@@ -129,6 +256,8 @@ class PreciseSpeedtestWorker(QObject):
     stageChanged = pyqtSignal(str)       # init | servers | best | download | upload | saving | done | canceled | error
     log = pyqtSignal(str)
     resultReady = pyqtSignal(dict)       # средний результат по 3 прогонкам
+    sampleReady = pyqtSignal(dict)       # живой отсчёт скорости текущего прогона
+    tcpInfoReady = pyqtSignal(dict)      # живой отсчёт TCP_INFO текущего прогона
     error = pyqtSignal(str)
     finished = pyqtSignal()
 
@@ -136,6 +265,8 @@ class PreciseSpeedtestWorker(QObject):
         super().__init__()
         self._cancel_event = Event()
         self._settings = get_settings()
+        self._throttle = _SampleThrottle(self.sampleReady, int(self._settings.get('live_update_ms', 250) or 0))
+        self._tcp_throttle = _TcpInfoThrottle(self.tcpInfoReady, int(self._settings.get('live_update_ms', 250) or 0))
 
     @pyqtSlot()
     def cancel(self):
@@ -165,7 +296,18 @@ class PreciseSpeedtestWorker(QObject):
                 if len(picked) >= 3:
                     return picked[:3]
 
-        # 2) если не хватило — добираем из общего списка
+        # 2) если не хватило — добираем ближайшими по задержке (параллельный замер)
+        try:
+            client = SpeedtestClient()
+            for sid in client.fastest_server_ids(3 - len(picked), exclude=seen, cancel_event=self._cancel_event):
+                picked.append(sid)
+                seen.add(sid)
+        except Exception as e:
+            logger.warning(f'Не удалось замерить задержку до серверов: {e}')
+        if len(picked) >= 3:
+            return picked[:3]
+
+        # 3) если и так не хватило — добираем из общего списка
         try:
             client = SpeedtestClient()
             servers = client.list_servers(limit=300)
@@ -207,13 +349,10 @@ class PreciseSpeedtestWorker(QObject):
                 self.stageChanged.emit('servers')
                 logger.info(f'[{idx+1}/3] Тест на сервере ID={sid}...')
                 # Измеряем выбранным движком
-                engine = str(self._settings.get('engine', 'python')).lower()
-                if engine == 'ookla':
-                    runner = OoklaCliClient()
-                else:
-                    runner = SpeedtestClient()
+                runner = create_client(self._settings.get('engine', 'python'))
                 self.stageChanged.emit('download')
-                res = runner.perform_test(cancel_event=self._cancel_event, server_id_override=sid)
+                res = runner.perform_test(cancel_event=self._cancel_event, server_id_override=sid,
+                                          on_sample=self._throttle, on_tcp_info=self._tcp_throttle)
                 results.append(res)
 
             if self._check_cancel():
@@ -223,13 +362,10 @@ class PreciseSpeedtestWorker(QObject):
             while len(results) < 3 and not self._cancel_event.is_set():
                 self.stageChanged.emit('servers')
                 logger.info(f'[{len(results)+1}/3] Тест с автоматическим выбором сервера...')
-                engine = str(self._settings.get('engine', 'python')).lower()
-                if engine == 'ookla':
-                    runner = OoklaCliClient()
-                else:
-                    runner = SpeedtestClient()
+                runner = create_client(self._settings.get('engine', 'python'))
                 self.stageChanged.emit('download')
-                res = runner.perform_test(cancel_event=self._cancel_event, server_id_override=None)
+                res = runner.perform_test(cancel_event=self._cancel_event, server_id_override=None,
+                                          on_sample=self._throttle, on_tcp_info=self._tcp_throttle)
                 results.append(res)
 
             if self._check_cancel():
@@ -251,8 +387,18 @@ class PreciseSpeedtestWorker(QObject):
                 'upload_bps': u_avg,
                 'aggregate': True,
                 'samples': len(results),
+                # отсчёты прогонов подряд, в формате поля samples одиночного теста
+                'sample_series': concat_samples([r.get('samples') for r in results]),
             }
-
+            avg_result['throughput_stats'] = summarize_samples(avg_result['sample_series'])
+            # джиттер и потери — только по прогонам, где UDP-замер был
+            for key in ('jitter_ms', 'packet_loss_pct'):
+                vals = [float(r[key]) for r in results if r.get(key) is not None]
+                if vals:
+                    avg_result[key] = sum(vals) / len(vals)
+
+            logger.info(f'HTTP-сессия точного теста: {get_session().describe()}')
+            _save_result(avg_result)
             self.resultReady.emit(avg_result)
             self.stageChanged.emit('done')
             self.finished.emit()
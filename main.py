@@ -3,6 +3,7 @@ import os
 import sys
 import platform
 import logging
+import multiprocessing
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import QApplication
@@ -27,6 +28,17 @@ def get_version():
 
 
 def main():
+    # Дочерние процессы движка multiprocess в собранном exe не должны запускать приложение заново
+    multiprocessing.freeze_support()
+
+    # Режим локального сервера speedtest (без UI, на любой ОС): python -m fluent_speedtest serve ...
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        try:
+            from .core.local_server import main as serve_main
+        except ImportError:
+            from core.local_server import main as serve_main  # type: ignore
+        sys.exit(serve_main(sys.argv[2:]))
+
     # Проверка ОС (только Windows 10/11)
     if platform.system().lower() != 'windows':
         print('Это приложение поддерживается только на Windows 10/11.')
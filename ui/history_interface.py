@@ -17,6 +17,11 @@ except ImportError:
     from core.settings import get_settings  # type: ignore
 
 
+def _optional(value, fmt: str) -> str:
+    # Необязательное числовое поле результата (нет у старых записей и без UDP-замера)
+    return '' if value is None else format(float(value), fmt)
+
+
 class HistoryInterface(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent=parent)
@@ -31,7 +36,7 @@ class HistoryInterface(QWidget):
         self.title.setAlignment(Qt.AlignHCenter)
 
         self.table = TableWidget(self)
-        self.table.setColumnCount(7)
+        self.table.setColumnCount(9)
         # Заголовки будут выставляться динамически в зависимости от единиц измерения
         self._update_headers()
 
@@ -80,6 +85,8 @@ class HistoryInterface(QWidget):
             'Ping (ms)',
             f'Download ({units})',
             f'Upload ({units})',
+            'Jitter (ms)',
+            'Потери (%)',
             'Провайдер',
             'Город',
             'Хост',
@@ -111,6 +118,8 @@ class HistoryInterface(QWidget):
                 QTableWidgetItem(f"{r.get('ping_ms', 0):.0f}"),
                 QTableWidgetItem(f"{d_val:.2f}"),
                 QTableWidgetItem(f"{u_val:.2f}"),
+                QTableWidgetItem(_optional(r.get('jitter_ms'), '.1f')),
+                QTableWidgetItem(_optional(r.get('packet_loss_pct'), '.1f')),
                 QTableWidgetItem(str(s.get('sponsor', ''))),
                 QTableWidgetItem(str(s.get('name', ''))),
                 QTableWidgetItem(str(s.get('host', ''))),
@@ -160,6 +169,8 @@ class HistoryInterface(QWidget):
                     'Ping (ms)',
                     f'Download ({units})',
                     f'Upload ({units})',
+                    'Jitter (ms)',
+                    'Потери (%)',
                     'Провайдер',
                     'Город',
                     'Страна',
@@ -184,6 +195,8 @@ class HistoryInterface(QWidget):
                         f"{r.get('ping_ms', 0):.0f}",
                         f"{d_val:.2f}",
                         f"{u_val:.2f}",
+                        _optional(r.get('jitter_ms'), '.1f'),
+                        _optional(r.get('packet_loss_pct'), '.1f'),
                         str(s.get('sponsor', '')),
                         str(s.get('name', '')),
                         str(s.get('country', '')),
@@ -239,6 +252,8 @@ class HistoryInterface(QWidget):
                 'Ping (ms)',
                 f'Download ({units})',
                 f'Upload ({units})',
+                'Jitter (ms)',
+                'Потери (%)',
                 'Провайдер',
                 'Город',
                 'Страна',
@@ -268,10 +283,12 @@ class HistoryInterface(QWidget):
                 ws.cell(row=row_idx, column=2, value=float(r.get('ping_ms', 0)))
                 ws.cell(row=row_idx, column=3, value=round(d_val, 2))
                 ws.cell(row=row_idx, column=4, value=round(u_val, 2))
-                ws.cell(row=row_idx, column=5, value=str(s.get('sponsor', '')))
-                ws.cell(row=row_idx, column=6, value=str(s.get('name', '')))
-                ws.cell(row=row_idx, column=7, value=str(s.get('country', '')))
-                ws.cell(row=row_idx, column=8, value=str(s.get('host', '')))
+                ws.cell(row=row_idx, column=5, value=r.get('jitter_ms'))
+                ws.cell(row=row_idx, column=6, value=r.get('packet_loss_pct'))
+                ws.cell(row=row_idx, column=7, value=str(s.get('sponsor', '')))
+                ws.cell(row=row_idx, column=8, value=str(s.get('name', '')))
+                ws.cell(row=row_idx, column=9, value=str(s.get('country', '')))
+                ws.cell(row=row_idx, column=10, value=str(s.get('host', '')))
             
             # Автоподбор ширины колонок
             for column in ws.columns:
@@ -60,10 +60,54 @@ class SettingsInterface(QWidget):
         self.engineLabel = BodyLabel('Движок теста:')
         self.engineBox = ComboBox(self)
         self.engineBox.addItem('Python (speedtest-cli)', userData='python')
+        self.engineBox.addItem('Python asyncio (многопоточный)', userData='async')
+        self.engineBox.addItem('Python multiprocessing (процесс на ядро)', userData='multiprocess')
         self.engineBox.addItem('Ookla CLI (speedtest.exe)', userData='ookla')
         self.engineRow.addWidget(self.engineLabel)
         self.engineRow.addWidget(self.engineBox)
 
+        # Количество потоков asyncio-движка (и multiprocess)
+        self.asyncStreamsRow = QHBoxLayout()
+        self.asyncStreamsLabel = BodyLabel('Параллельных потоков (asyncio/multiprocess):')
+        self.asyncStreamsBox = ComboBox(self)
+        self.asyncStreamsBox.addItems(['1', '2', '4', '8', '16', '32'])
+        self.asyncStreamsRow.addWidget(self.asyncStreamsLabel)
+        self.asyncStreamsRow.addWidget(self.asyncStreamsBox)
+
+        # Автоподбор потоков и размера запросов (async)
+        self.autotuneRow = QHBoxLayout()
+        self.autotuneLabel = BodyLabel('Автоподбор потоков и размера запросов (asyncio):')
+        self.autotuneSwitch = SwitchButton(self)
+        self.autotuneSwitch.setOnText('Вкл')
+        self.autotuneSwitch.setOffText('Выкл')
+        self.autotuneRow.addWidget(self.autotuneLabel)
+        self.autotuneRow.addWidget(self.autotuneSwitch)
+
+        # Адаптивная длительность фаз (python/async/multiprocess)
+        self.adaptiveRow = QHBoxLayout()
+        self.adaptiveLabel = BodyLabel('Адаптивная длительность (стоп при стабилизации):')
+        self.adaptiveSwitch = SwitchButton(self)
+        self.adaptiveSwitch.setOnText('Вкл')
+        self.adaptiveSwitch.setOffText('Выкл')
+        self.adaptiveRow.addWidget(self.adaptiveLabel)
+        self.adaptiveRow.addWidget(self.adaptiveSwitch)
+
+        # Свой сервер legacy-протокола (python -m fluent_speedtest serve) вместо speedtest.net
+        self.customServerRow = QHBoxLayout()
+        self.customServerLabel = BodyLabel('Свой сервер теста (URL):')
+        self.customServerEdit = LineEdit(self)
+        self.customServerEdit.setPlaceholderText('не задан — серверы speedtest.net')
+        self.customServerRow.addWidget(self.customServerLabel)
+        self.customServerRow.addWidget(self.customServerEdit, 1)
+
+        # UDP echo для замера джиттера и потерь (python/async/multiprocess)
+        self.udpEndpointRow = QHBoxLayout()
+        self.udpEndpointLabel = BodyLabel('UDP echo для джиттера/потерь (host:port):')
+        self.udpEndpointEdit = LineEdit(self)
+        self.udpEndpointEdit.setPlaceholderText('не задан — замер выключен')
+        self.udpEndpointRow.addWidget(self.udpEndpointLabel)
+        self.udpEndpointRow.addWidget(self.udpEndpointEdit, 1)
+
         # Путь к speedtest.exe
         self.ooklaPathRow = QHBoxLayout()
         self.ooklaPathLabel = BodyLabel('Путь к speedtest.exe:')
@@ -142,6 +186,11 @@ class SettingsInterface(QWidget):
         self.vBox.addLayout(self.logLevelRow)
         self.vBox.addLayout(self.logBufferRow)
         self.vBox.addLayout(self.engineRow)
+        self.vBox.addLayout(self.asyncStreamsRow)
+        self.vBox.addLayout(self.autotuneRow)
+        self.vBox.addLayout(self.adaptiveRow)
+        self.vBox.addLayout(self.customServerRow)
+        self.vBox.addLayout(self.udpEndpointRow)
         self.vBox.addLayout(self.ooklaPathRow)
         self.vBox.addLayout(self.ooklaTimeoutRow)
         self.vBox.addStretch(1)
@@ -158,6 +207,20 @@ class SettingsInterface(QWidget):
             self.engineBox.setCurrentIndex(idx)
         else:
             self.engineBox.setCurrentIndex(0)
+        # async streams
+        streams_val = str(int(self.settings.get('async_streams', 8) or 8))
+        if streams_val in ['1', '2', '4', '8', '16', '32']:
+            self.asyncStreamsBox.setCurrentText(streams_val)
+        else:
+            self.asyncStreamsBox.setCurrentText('8')
+        # autotune
+        self.autotuneSwitch.setChecked(bool(self.settings.get('autotune_mode', False)))
+        # adaptive mode
+        self.adaptiveSwitch.setChecked(bool(self.settings.get('adaptive_mode', False)))
+        # custom server
+        self.customServerEdit.setText(str(self.settings.get('custom_server_url', '') or ''))
+        # udp echo
+        self.udpEndpointEdit.setText(str(self.settings.get('udp_endpoint', '') or ''))
         # ookla path
         self.ooklaPathEdit.setText(str(self.settings.get('ookla_path', '') or ''))
         # ookla timeout
@@ -220,6 +283,11 @@ class SettingsInterface(QWidget):
         except Exception:
             pass
         self.ooklaTimeoutBox.currentTextChanged.connect(self.on_ookla_timeout_changed)
+        self.asyncStreamsBox.currentTextChanged.connect(self.on_async_streams_changed)
+        self.adaptiveSwitch.checkedChanged.connect(self.on_adaptive_changed)
+        self.autotuneSwitch.checkedChanged.connect(self.on_autotune_changed)
+        self.udpEndpointEdit.editingFinished.connect(self.on_udp_endpoint_changed)
+        self.customServerEdit.editingFinished.connect(self.on_custom_server_changed)
 
     def _info(self, text: str):
         InfoBar.success(title='Готово', content=text, orient=Qt.Horizontal, position=InfoBarPosition.TOP, parent=self)
@@ -245,6 +313,14 @@ class SettingsInterface(QWidget):
         for w in (self.ooklaPathLabel, self.ooklaPathEdit, self.ooklaBrowseBtn,
                   self.ooklaTimeoutLabel, self.ooklaTimeoutBox):
             w.setVisible(show)
+        for w in (self.asyncStreamsLabel, self.asyncStreamsBox):
+            w.setVisible(engine in ('async', 'multiprocess'))
+        for w in (self.autotuneLabel, self.autotuneSwitch):
+            w.setVisible(engine == 'async')
+        for w in (self.adaptiveLabel, self.adaptiveSwitch):
+            w.setVisible(engine in ('python', 'async', 'multiprocess'))
+        for w in (self.udpEndpointLabel, self.udpEndpointEdit, self.customServerLabel, self.customServerEdit):
+            w.setVisible(engine in ('python', 'async', 'multiprocess'))
 
     def on_engine_changed(self, _idx: int):
         data = self.engineBox.currentData()
@@ -273,6 +349,34 @@ class SettingsInterface(QWidget):
         self.settings.set('ookla_timeout', val)
         self._info('Таймаут Ookla сохранён')
 
+    def on_async_streams_changed(self, v: str):
+        try:
+            val = int(v)
+        except Exception:
+            val = 8
+        self.settings.set('async_streams', val)
+        self._info('Количество потоков сохранено')
+
+    def on_adaptive_changed(self, checked: bool):
+        self.settings.set('adaptive_mode', checked)
+        status = 'включена' if checked else 'выключена'
+        self._info(f'Адаптивная длительность {status}')
+
+    def on_autotune_changed(self, checked: bool):
+        self.settings.set('autotune_mode', checked)
+        status = 'включён' if checked else 'выключен'
+        self._info(f'Автоподбор потоков {status}')
+
+    def on_custom_server_changed(self):
+        url = self.customServerEdit.text().strip()
+        self.settings.set('custom_server_url', url)
+        self._info('Тест пойдёт на свой сервер' if url else 'Тест пойдёт на серверы speedtest.net')
+
+    def on_udp_endpoint_changed(self):
+        endpoint = self.udpEndpointEdit.text().strip()
+        self.settings.set('udp_endpoint', endpoint)
+        self._info('UDP-замер включён' if endpoint else 'UDP-замер выключен')
+
     def on_accent_color_changed(self, _idx: int):
         data = self.accentColorBox.currentData()
         color = str(data or 'blue')
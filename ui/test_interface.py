@@ -2,7 +2,7 @@
 import logging
 from datetime import datetime
 
-from PyQt5.QtCore import Qt, QThread
+from PyQt5.QtCore import Qt, QThread, QTimer, QRunnable, QThreadPool
 from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QFrame, QLabel
 
@@ -48,18 +48,36 @@ except ImportError:
 
 try:
     from ..core.worker import SpeedtestWorker, PreciseSpeedtestWorker
-    from ..core.storage import append_result
+    from ..core.storage import compact_results
     from ..core.settings import get_settings
     from ..core.logging_system import get_logger, LogCategory
 except ImportError:
     # Запуск без пакета: импорт из локальной папки
     from core.worker import SpeedtestWorker, PreciseSpeedtestWorker  # type: ignore
-    from core.storage import append_result  # type: ignore
+    from core.storage import compact_results  # type: ignore
     from core.settings import get_settings  # type: ignore
     from core.logging_system import get_logger, LogCategory  # type: ignore
 
 logger = logging.getLogger(__name__)
 
+# Через сколько после окончания теста сжимать файл истории (если новый тест не начат)
+COMPACT_DELAY_MS = 5000
+
+
+class _CompactHistoryTask(QRunnable):
+    """Сжатие истории в пуле потоков: копирование файла не блокирует GUI."""
+
+    def __init__(self, logger):
+        super().__init__()
+        self._logger = logger
+
+    def run(self):
+        try:
+            if compact_results():
+                self._logger.info("Файл истории сжат")
+        except Exception as e:
+            self._logger.error(f"Ошибка сжатия истории: {e}")
+
 
 class TestInterface(QWidget):
     def __init__(self, emitter=None, parent=None):
@@ -105,6 +123,11 @@ class TestInterface(QWidget):
         self.buttonsRow.addWidget(self.clearLogsBtn)
         self.buttonsRow.addStretch(1)
 
+        # живая телеметрия TCP_INFO движка python (core/tcp_info.py)
+        self.tcpInfoLabel = QLabel(self)
+        self.tcpInfoLabel.setAlignment(Qt.AlignHCenter)
+        self.tcpInfoLabel.setVisible(False)
+
         self.logView = LogViewClass(self)
         self.logView.setPlaceholderText('Логи выполнения будут отображаться здесь...')
         self.logView.setMinimumHeight(180)
@@ -113,6 +136,7 @@ class TestInterface(QWidget):
         self.vBox.addWidget(self.ring, 0, Qt.AlignHCenter)
         self.vBox.addLayout(self.buttonsRow)
         self.vBox.addWidget(self.cardContainer)
+        self.vBox.addWidget(self.tcpInfoLabel)
         self.vBox.addWidget(self.logView)
 
         # worker/thread
@@ -181,6 +205,7 @@ class TestInterface(QWidget):
         self.stopBtn.setEnabled(True)
         self.ring.show()
         self.cardContainer.setVisible(False)
+        self.tcpInfoLabel.setVisible(False)
 
         self.thread = QThread(self)
         self.worker = SpeedtestWorker()
@@ -191,6 +216,8 @@ class TestInterface(QWidget):
         self.worker.stageChanged.connect(self._on_stage_changed)
         self.worker.log.connect(self._append_log)
         self.worker.resultReady.connect(self._on_result)
+        self.worker.sampleReady.connect(self._on_sample)
+        self.worker.tcpInfoReady.connect(self._on_tcp_info)
         self.worker.error.connect(self._on_error)
         self.worker.finished.connect(self._on_finished)
 
@@ -211,6 +238,7 @@ class TestInterface(QWidget):
         self.stopBtn.setEnabled(True)
         self.ring.show()
         self.cardContainer.setVisible(False)
+        self.tcpInfoLabel.setVisible(False)
 
         self.thread = QThread(self)
         self.worker = PreciseSpeedtestWorker()
@@ -224,6 +252,8 @@ class TestInterface(QWidget):
         except Exception:
             pass
         self.worker.resultReady.connect(self._on_result)
+        self.worker.sampleReady.connect(self._on_sample)
+        self.worker.tcpInfoReady.connect(self._on_tcp_info)
         self.worker.error.connect(self._on_error)
         self.worker.finished.connect(self._on_finished)
 
@@ -243,10 +273,29 @@ class TestInterface(QWidget):
         self.logView.clear()
         self._info('Логи очищены')
 
-    def _on_result(self, result: dict):
-        # сохранение результата
-        append_result(result)
+    def _on_sample(self, sample: dict):
+        # живое обновление карточки текущей фазы во время передачи
+        card = {'download': self.cardDownload, 'upload': self.cardUpload}.get(sample.get('phase'))
+        if card is None:
+            return
+        card.update_value(self._format_speed(float(sample.get('bps', 0.0))))
+        self.cardContainer.setVisible(True)
+
+    def _on_tcp_info(self, info: dict):
+        # сводка TCP_INFO по всем потокам текущей фазы; сырые строки потоков — в info['rows']
+        rtt = info.get('rtt_ms')
+        parts = [f"TCP ({info.get('phase')}): потоков {info.get('streams', 0)}"]
+        if rtt is not None:
+            parts.append(f'RTT {rtt:.1f} ms')
+        parts.append(f"cwnd {info.get('cwnd', 0)}")
+        parts.append(f"повторных передач {info.get('retransmits', 0)}")
+        if info.get('delivery_rate_bps'):
+            parts.append(f"delivery rate {self._format_speed(float(info['delivery_rate_bps']))}")
+        self.tcpInfoLabel.setText(' · '.join(parts))
+        self.tcpInfoLabel.setVisible(True)
 
+    def _on_result(self, result: dict):
+        # результат уже сохранён в историю потоком теста (core/worker.py)
         # обновление UI значений
         ping = result.get('ping_ms', 0)
         d_bps = result.get('download_bps', 0.0)
@@ -300,6 +349,14 @@ class TestInterface(QWidget):
             self.preciseBtn.setEnabled(True)
             self.stopBtn.setDisabled(True)
             self.ring.hide()
+            QTimer.singleShot(COMPACT_DELAY_MS, self._compact_history)
+
+    def _compact_history(self):
+        # Сжатие истории, пока приложение простаивает: новый тест откладывает его до своего окончания
+        # Само сжатие — в фоне; файл копируется без блокировки истории (core/storage.py)
+        if self.worker is not None:
+            return
+        QThreadPool.globalInstance().start(_CompactHistoryTask(self.ui_logger))
 
 
 class ResultCard(QFrame):